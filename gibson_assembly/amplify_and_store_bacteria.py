@@ -5,12 +5,13 @@ From protocol: https://www.addgene.org/plasmid-protocols/create-glycerol-stock/
 """
 
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
 from autoprotocol.protocol import Container, Ref
 import utils
 from utils import (ul, expid, init_inventory_well, touchdown,
                    dead_volume)
+from protocol_writer import dump_protocol
+from plate_reader import best_well
 
 p = Protocol()
 
@@ -78,8 +79,9 @@ if __name__ == '__main__':
         "src_bacteria_plate"  : "ct18zdk7bp43ew", # inventory; Original source of bacteria
     }
     
-    #highest flourescence reading well
-    BEST_WELL_ID = 'B7'
+    #highest flourescence / OD600 well of the pick experiment's readings (see plate_reader),
+    #B7 until they have been fetched with: python plate_reader.py fetch RUN_ID PROJECT_ID ../readings/sfgfp_puc19_gibson_pick_v1
+    BEST_WELL_ID = best_well("../readings/sfgfp_puc19_gibson_pick_v1", default='B7')
     
     if "--test" in sys.argv:
         test_inv =  {
@@ -97,5 +99,4 @@ if __name__ == '__main__':
     # ---------------------------------------------------------------
     # Output protocol
     #
-    jprotocol = json.dumps(p.as_dict(), indent=2)
-    print(jprotocol)    
\ No newline at end of file
+    dump_protocol(p)    
\ No newline at end of file
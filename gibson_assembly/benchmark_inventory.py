@@ -0,0 +1,136 @@
+"""Load benchmark for inventory initialization against the local stand-in server
+
+Drives utils.init_inventory_well (one well at a time), utils.init_inventory_wells
+(batched) and the batched path with a warm container cache at 10/100/1000 wells and
+reports p50/p99 request latency and throughput.  Everything runs against
+stand_in_server.py so the numbers can be reproduced offline.
+
+Usage:
+    python benchmark_inventory.py --latency 50 --jitter 20 --wells 10 100 1000
+
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy
+from autoprotocol.protocol import Protocol
+import utils
+from container_cache import ContainerCache
+from stand_in_server import StandInServer, make_recording
+
+ORG_NAME = 'stand_in'
+
+
+def _make_wells(num_wells, wells_per_container):
+    """num_wells wells spread over 96-pcr plates with wells_per_container wells used on each"""
+    p = Protocol()
+    wells = []
+    for i in range(int(numpy.ceil(num_wells / float(wells_per_container)))):
+        plate = p.ref('plate_{}'.format(i), id='ct_bench_{}'.format(i), cont_type='96-pcr', storage='cold_20')
+        wells.extend(plate.wells_from(0, min(wells_per_container, num_wells - len(wells))))
+    return wells
+
+
+def _timed(fn, latencies):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_serial(wells, max_workers):
+    latencies = []
+    init_inventory_well = _timed(utils.init_inventory_well, latencies)
+    for well in wells:
+        init_inventory_well(well, headers={}, org_name=ORG_NAME)
+    return latencies
+
+
+def run_batched(wells, max_workers):
+    latencies = []
+    fetch_container = utils._fetch_container
+    utils._fetch_container = _timed(fetch_container, latencies)
+    try:
+        utils.init_inventory_wells(wells, headers={}, org_name=ORG_NAME, max_workers=max_workers)
+    finally:
+        utils._fetch_container = fetch_container
+    return latencies
+
+
+MODES = [('serial', run_serial, False),
+         ('batched', run_batched, False),
+         ('batched+cache', run_batched, True)]
+
+
+def benchmark(server, num_wells, wells_per_container, max_workers, repeat):
+    """Run every mode repeat times, returns a list of result dicts"""
+    server.recordings.update({'ct_bench_{}'.format(i): make_recording('ct_bench_{}'.format(i))
+                              for i in range(int(numpy.ceil(num_wells / float(wells_per_container))))})
+    results = []
+    for name, run, use_cache in MODES:
+        cache_dir = tempfile.mkdtemp()
+        utils.container_cache = ContainerCache(cache_dir, ttl=3600) if use_cache else None
+        if use_cache:
+            #warm the cache, only the cached lookups are measured
+            run(_make_wells(num_wells, wells_per_container), max_workers)
+
+        latencies, walls, errors = [], [], 0
+        requests_before = server.request_count
+        for _ in range(repeat):
+            wells = _make_wells(num_wells, wells_per_container)
+            start = time.perf_counter()
+            try:
+                latencies.extend(run(wells, max_workers))
+            except Exception:
+                errors += 1
+            walls.append(time.perf_counter() - start)
+        shutil.rmtree(cache_dir)
+
+        latencies = numpy.array(latencies) * 1000
+        results.append({'mode': name,
+                        'wells': num_wells,
+                        'requests': (server.request_count - requests_before) // repeat,
+                        'p50_ms': numpy.percentile(latencies, 50) if len(latencies) else numpy.nan,
+                        'p99_ms': numpy.percentile(latencies, 99) if len(latencies) else numpy.nan,
+                        'wall_s': numpy.median(walls),
+                        'wells_per_s': num_wells / numpy.median(walls),
+                        'errors': errors})
+    return results
+
+
+def print_results(results, out=sys.stdout):
+    header = '{:<14} {:>6} {:>9} {:>9} {:>9} {:>9} {:>11} {:>7}'
+    row = '{mode:<14} {wells:>6d} {requests:>9d} {p50_ms:>9.2f} {p99_ms:>9.2f} {wall_s:>9.3f} {wells_per_s:>11.1f} {errors:>7d}'
+    out.write(header.format('mode', 'wells', 'requests', 'p50 ms', 'p99 ms', 'wall s', 'wells/s', 'errors') + '\n')
+    for result in results:
+        out.write(row.format(**result) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--wells', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--wells-per-container', type=int, default=8)
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=20, help='server milliseconds per response')
+    parser.add_argument('--jitter', type=float, default=10, help='up to this many extra random milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with a 500')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--test', action='store_true', help='use ../test_mode_auth.json (read by utils)')
+    args = parser.parse_args()
+
+    server = StandInServer(('localhost', 0), latency=args.latency/1000.0, jitter=args.jitter/1000.0,
+                           error_rate=args.error_rate, seed=args.seed).start()
+    utils.TSC_API_ROOT = server.api_root
+
+    results = []
+    for num_wells in args.wells:
+        results.extend(benchmark(server, num_wells, args.wells_per_container, args.max_workers, args.repeat))
+    print_results(results)
+    server.shutdown()
@@ -0,0 +1,94 @@
+"""Startup benchmark: import time of every protocol script's imports
+
+For each script in this directory the top level imports are pulled out and run in a
+fresh interpreter under `python -X importtime`, repeated a few times.  Reports the median
+wall time, the total cumulative import time and the heaviest imports per script, so a
+slow import creeping back into utils (or any script) shows up.
+
+Usage:
+    python benchmark_startup.py [--repeat 5] [--top 3] [script.py ...]
+
+"""
+
+import os
+import ast
+import sys
+import glob
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def script_imports(path):
+    """Source of the import statements at the top level of a script (and under `if` blocks)"""
+    with open(path, 'rb') as f:
+        source = f.read().decode('latin-1')
+    tree = ast.parse(source, path)
+    lines = source.splitlines()
+    imports = []
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                imports.append('\n'.join(lines[node.lineno-1:node.end_lineno]).strip())
+            elif isinstance(node, (ast.If, ast.Try)):
+                visit(node.body)
+    visit(tree.body)
+    return '\n'.join(imports)
+
+
+def parse_importtime(stderr):
+    """{module: (self us, cumulative us)} for the top level imports in -X importtime output"""
+    top = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            top[name.strip()] = (int(self_us), int(cumulative_us))
+    return top
+
+
+def time_imports(code, repeat):
+    """Run the imports in fresh interpreters, returns (median wall seconds, median {module: cumulative us})"""
+    walls = []
+    cumulative = defaultdict(list)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=HERE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        walls.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        for name, (_, cumulative_us) in parse_importtime(result.stderr).items():
+            cumulative[name].append(cumulative_us)
+    median = lambda values: sorted(values)[len(values)//2]
+    return median(walls), {name: median(values) for name, values in cumulative.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('scripts', nargs='*', help='scripts to time (default: every script here)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=3, help='number of heaviest imports to list')
+    args = parser.parse_args()
+
+    scripts = args.scripts or sorted(glob.glob(os.path.join(HERE, '*.py')))
+    baseline, startup_modules = time_imports('pass', args.repeat)
+    print('interpreter startup: {:.1f} ms\n'.format(baseline*1000))
+    print('{:<42} {:>9} {:>11}  {}'.format('script', 'wall ms', 'imports ms', 'heaviest imports (ms)'))
+    for script in scripts:
+        name = os.path.basename(script)
+        try:
+            wall, cumulative = time_imports(script_imports(script), args.repeat)
+            #leave out what every interpreter imports anyway (site, encodings...)
+            cumulative = {module: us for module, us in cumulative.items() if module not in startup_modules}
+        except (SyntaxError, RuntimeError) as e:
+            print('{:<42} {:>9} {:>11}  {}'.format(name, '-', '-', 'failed: {}'.format(e)))
+            continue
+        heaviest = sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]
+        print('{:<42} {:>9.1f} {:>11.1f}  {}'.format(
+            name, wall*1000, sum(cumulative.values())/1000.0,
+            ', '.join('{} {:.1f}'.format(module, us/1000.0) for module, us in heaviest)))
@@ -0,0 +1,137 @@
+"""Volume benchmark: autoprotocol Unit against Microliters
+
+Times the volume operations the scripts do all the time (building volumes, comparing
+them, summing them, subtracting dead volumes) with Units and with Microliters, then
+builds a full 384-well protocol with CustomProtocol and times the volume
+bookkeeping a script does around it (a guard before each transfer,
+assert_valid_volume after, remaining volumes at the end) both ways.  Finally the
+whole protocol is validated by volume_ledger, against replaying it one Unit at a time.
+
+Usage:
+    python benchmark_volumes.py [--test] [--repeat 5] [--n 20000]
+
+"""
+
+import time
+import argparse
+from autoprotocol import Unit
+from microliters import Microliters
+from utils import ul, assert_valid_volume
+from custom_protocol import CustomProtocol
+from volume_ledger import ledger_events, check_volumes
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def micro_benchmarks(n):
+    """{name: (unit function, microliters function)} each doing n operations"""
+    volumes = [5 + (i % 200) / 10.0 for i in range(n)]
+    unit_volumes = [ul(v) for v in volumes]
+    microliter_volumes = [Microliters(v) for v in volumes]
+    unit_dead, microliter_dead = ul(3), Microliters(3)
+    return {
+        "construct": (lambda: [ul(v) for v in volumes],
+                      lambda: [Microliters(v) for v in volumes]),
+        "compare < 10uL": (lambda: [v < ul(10) for v in unit_volumes],
+                           lambda: [v < Microliters(10) for v in microliter_volumes]),
+        "sum": (lambda: sum(unit_volumes, ul(0)),
+                lambda: sum(microliter_volumes, Microliters(0))),
+        "minus dead volume": (lambda: [v - unit_dead for v in unit_volumes],
+                              lambda: [v - microliter_dead for v in microliter_volumes]),
+    }
+
+
+def build_384_well_protocol(volume, checks):
+    """Build a 384-well protocol, transferring volume(5) into every well, timing only the checks"""
+    p = CustomProtocol()
+    source = p.ref("source", cont_type="96-deep", discard=True)
+    dest = p.ref("dest", cont_type="384-pcr", discard=True)
+    for well in source.all_wells():
+        well.set_volume("1900:microliter")
+
+    check_time = 0.0
+    for i, well in enumerate(dest.all_wells()):
+        source_well = source.well(i % 96)
+        start = time.perf_counter()
+        checks["before"](volume(5), source_well)
+        check_time += time.perf_counter() - start
+        p.transfer(source_well, well, volume(5), mix_after=True)
+        start = time.perf_counter()
+        checks["after"](source_well)
+        check_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    checks["end"](dest.all_wells())
+    check_time += time.perf_counter() - start
+    return p, check_time
+
+
+def unit_replay(events):
+    """check_volumes done one Unit at a time, returns the wells that run short"""
+    net = {}
+    for _, well, delta, _ in events:
+        net[well] = net.get(well, Unit(0, "microliter")) + Unit(delta / 1000.0, "microliter")
+    volumes = {well: well.volume - change for well, change in net.items()}
+    short = set()
+    for _, well, delta, required in events:
+        volumes[well] = volumes[well] + Unit(delta / 1000.0, "microliter")
+        if required == required and volumes[well] < Unit(required / 1000.0, "microliter"):
+            short.add(well)
+    return short
+
+
+#the same checks, written the way the scripts used to (Unit) and with Microliters
+UNIT_CHECKS = {
+    "before": lambda v, source_well: v < ul(10) and source_well.volume > v,
+    "after": lambda well: well.volume >= well.container.container_type.dead_volume_ul,
+    "end": lambda wells: [well.volume - ul(2) for well in wells if well.volume == ul(5)],
+}
+MICROLITER_CHECKS = {
+    "before": lambda v, source_well: v < Microliters(10) and Microliters.of(source_well.volume) > v,
+    "after": lambda well: assert_valid_volume([well]),
+    "end": lambda wells: [Microliters.of(well.volume) - Microliters(2) for well in wells
+                          if Microliters.of(well.volume) == Microliters(5)],
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--test', action='store_true', help='accepted like every other script, unused')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--n', type=int, default=20000, help='operations per micro benchmark')
+    args = parser.parse_args()
+
+    print('{:<22} {:>10} {:>14} {:>9}'.format('operation', 'Unit ms', 'Microliters ms', 'speedup'))
+    for name, (unit_fn, microliter_fn) in micro_benchmarks(args.n).items():
+        unit_time, microliter_time = best_of(args.repeat, unit_fn), best_of(args.repeat, microliter_fn)
+        print('{:<22} {:>10.1f} {:>14.1f} {:>8.1f}x'.format(name, unit_time*1000, microliter_time*1000,
+                                                            unit_time/microliter_time))
+
+    print('\n384-well protocol')
+    print('{:<22} {:>10} {:>14}'.format('volumes', 'build ms', 'checks ms'))
+    results = {}
+    for name, volume, checks in [('Unit', ul, UNIT_CHECKS), ('Microliters', Microliters, MICROLITER_CHECKS)]:
+        builds, check_times = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _, check_time = build_384_well_protocol(volume, checks)
+            builds.append(time.perf_counter() - start)
+            check_times.append(check_time)
+        results[name] = (min(builds), min(check_times))
+        print('{:<22} {:>10.1f} {:>14.1f}'.format(name, min(builds)*1000, min(check_times)*1000))
+    print('checks speedup {:.1f}x, build speedup {:.2f}x'.format(
+        results['Unit'][1]/results['Microliters'][1], results['Unit'][0]/results['Microliters'][0]))
+
+    p, _ = build_384_well_protocol(Microliters, MICROLITER_CHECKS)
+    events = ledger_events(p.instructions)
+    ledger_time = best_of(args.repeat, lambda: check_volumes(p.instructions))
+    unit_time = best_of(args.repeat, lambda: unit_replay(events))
+    print('\nvalidating all {} volume changes: volume_ledger {:.1f} ms, Unit replay {:.1f} ms ({:.0f}x)'.format(
+        len(events), ledger_time*1000, unit_time*1000, unit_time/ledger_time))
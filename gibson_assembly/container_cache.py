@@ -0,0 +1,165 @@
+"""On-disk cache of Transcriptic container (sample) json
+
+Regenerating a protocol over and over while tuning it shouldn't cost a round trip
+to Transcriptic per container every time.  Entries are keyed by (org, container id)
+and stored one json file per container.  Stale entries are revalidated with
+ETag/If-Modified-Since, the cache is trimmed least-recently-used first once it grows
+past max_bytes, and in offline mode only cached entries are served.
+
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from microliters import Microliters
+
+DEFAULT_CACHE_DIR = '../.container_cache'
+DEFAULT_TTL = 15*60 # seconds
+DEFAULT_MAX_BYTES = 50*1024*1024
+
+
+class ContainerCache(object):
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL,
+                 max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            directory the entries are stored in, created on first write
+        ttl : int, float
+            seconds an entry is served without asking Transcriptic about it again
+        max_bytes : int
+            size the cache is trimmed back to (least recently used entries first)
+        offline : bool
+            only serve from the cache, never touch the network
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+
+    def _path(self, org_name, container_id):
+        return os.path.join(self.cache_dir, '{}__{}.json'.format(org_name, container_id))
+
+    def _read(self, org_name, container_id):
+        try:
+            with open(self._path(org_name, container_id)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, org_name, container_id, entry):
+        path = self._path(org_name, container_id)
+        with self._lock:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            tmp_path = '{}.{}.tmp'.format(path, threading.current_thread().ident)
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _touch(self, org_name, container_id):
+        """Mark an entry as recently used"""
+        try:
+            os.utime(self._path(org_name, container_id), None)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.json'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, filename))
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, filename))
+            total -= size
+
+    def get(self, org_name, container_id, fetch):
+        """Return the container json, only calling fetch when the cached entry is missing or stale
+
+        Parameters
+        ----------
+        org_name : str
+        container_id : str
+        fetch : function
+            called as fetch(extra_headers) and returns a requests.Response. extra_headers
+            holds If-None-Match/If-Modified-Since when there is an entry to revalidate
+
+        """
+        entry = self._read(org_name, container_id)
+
+        if self.offline:
+            if entry is None:
+                raise RuntimeError("Container {} is not cached and offline mode is on".format(container_id))
+            self._touch(org_name, container_id)
+            return entry['container']
+
+        if entry is not None and time.time() - entry['fetched_at'] < self.ttl:
+            self._touch(org_name, container_id)
+            return entry['container']
+
+        extra_headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                extra_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                extra_headers['If-Modified-Since'] = entry['last_modified']
+
+        response = fetch(extra_headers)
+        if entry is not None and response.status_code == 304:
+            entry['fetched_at'] = time.time()
+        else:
+            response.raise_for_status()
+            entry = {'fetched_at': time.time(),
+                     'etag': response.headers.get('ETag'),
+                     'last_modified': response.headers.get('Last-Modified'),
+                     'container': response.json()}
+        self._write(org_name, container_id, entry)
+        return entry['container']
+
+    def invalidate(self, org_name, container_id):
+        """Drop the cached entry for a container"""
+        with self._lock:
+            try:
+                os.remove(self._path(org_name, container_id))
+            except OSError:
+                pass
+
+    def invalidate_changed_volumes(self, org_name, wells):
+        """Drop entries for containers where a protocol has changed the volume of one of the wells
+
+        Once the generated protocol runs, the cached volumes no longer match the inventory.
+        Not done in offline mode, where the cache is the only source of volumes.
+
+        """
+        if self.offline:
+            return
+        changed = set()
+        for well in wells:
+            container_id = well.container.id
+            if not container_id or container_id in changed:
+                continue
+            entry = self._read(org_name, container_id)
+            if entry is None:
+                continue
+            well_data = [w for w in entry['container']['aliquots'] if w['well_idx'] == well.index]
+            cached_volume = Microliters.of(well_data[0]['volume_ul'] if well_data else 0)
+            volume = Microliters.of(well.volume if well.volume is not None else 0)
+            if volume != cached_volume:
+                changed.add(container_id)
+
+        for container_id in changed:
+            logging.info("Invalidating cached container {}, its volumes were changed".format(container_id))
+            self.invalidate(org_name, container_id)
@@ -1,7 +1,7 @@
-import json
 from autoprotocol.protocol import Protocol
 
 from utils import ul
+from protocol_writer import dump_protocol
 
 """
 This protoocol will take a tube and fill it with water
@@ -22,4 +22,4 @@ te_well = p.ref("te_tube", cont_type="micro-1.5", storage="cold_4", discard=Fals
 p.provision(inv["te"], te_well, ul(1500))
 
 
-print(json.dumps(p.as_dict(), indent=2))
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
@@ -1,6 +1,14 @@
 from autoprotocol import Unit
 from autoprotocol.protocol import Protocol
-from utils import ul
+from autoprotocol.container import Well
+from autoprotocol.instruction import Provision
+from microliters import Microliters, to_unit
+from protocol_optimizer import coalesce_pipettes, peephole_plate_handling
+from protocol_scheduler import critical_path_order, remap_time_constraints, long_step_duration, moved_instructions
+from protocol_runtime import runtime_report, format_report
+from volume_ledger import check_volumes, format_violations
+from provision_planner import provision_needs, split_provision
+from thermocycle_program import ThermocycleProgram
 
 class CustomProtocol(Protocol):
    
@@ -23,8 +31,160 @@ class CustomProtocol(Protocol):
             "noAB-amp_6-flat" : "ki17reefwqq3sq" # catalog; no antibiotic plates            
         }
         
+        # "to" entries of provisions whose volume plan_provisions still has to work out
+        self.as_needed = []
+        
         super(CustomProtocol,self).__init__()
        
+    def optimize(self):
+        """
+        Run the optimization passes in protocol_optimizer over the instructions.
+        
+        Cancelling cover/uncover and seal/unseal pairs are dropped and back-to-back
+        incubations merged, then adjacent pipette instructions are merged and adjacent
+        transfer or distribute groups from the same source share a tip where the mix
+        rules allow it.
+        Protocols with time constraints on instructions are left alone.
+        
+        Returns
+        -------
+        removed : dict
+            number of instructions, tips, plate handling steps and incubations removed
+        
+        """
+        if any(key.startswith("instruction_") for constraint in getattr(self, "time_constraints", [])
+               for end in ["from", "to"] for key in constraint[end]):
+            #time constraints point at instruction indices, removing instructions would shift them
+            return {}
+        self.instructions, removed = peephole_plate_handling(self.instructions)
+        self.instructions, pipette_removed = coalesce_pipettes(self.instructions)
+        removed.update(pipette_removed)
+        return removed
+    
+    def schedule(self, duration=long_step_duration):
+        """
+        Reorder the instructions so independent plates overlap, longest remaining path first.
+        
+        Only instructions touching the same container keep their relative order, and
+        instructions adjacent on a container stay together (see protocol_scheduler).
+        Time constraints are updated to the new positions.
+        
+        Parameters
+        ----------
+        duration : function
+            seconds an instruction takes
+        
+        Returns
+        -------
+        moved : list of Instruction
+            the fewest instructions that moved to get the new order
+        
+        """
+        order, _ = critical_path_order(self.instructions, duration)
+        moved = [self.instructions[i] for i in moved_instructions(order)]
+        self.instructions = [self.instructions[i] for i in order]
+        if getattr(self, "time_constraints", None):
+            self.time_constraints = remap_time_constraints(self.time_constraints, order)
+        return moved
+    
+    def runtime_report(self, text=False):
+        """
+        Estimated runtime of the protocol so far, see protocol_runtime.
+        
+        Parameters
+        ----------
+        text : bool
+            return the report formatted as a table instead of a dict
+        
+        Returns
+        -------
+        report : dict or str
+            total and critical path seconds, overall and per container
+        
+        """
+        report = runtime_report(self.instructions)
+        return format_report(report) if text else report
+    
+    def validate_volumes(self, initial_volumes=None):
+        """
+        Replay every instruction and check no aspiration goes below the dead volume.
+        
+        Unlike utils.assert_valid_volume this covers every well, at every step (see
+        volume_ledger).
+        
+        Parameters
+        ----------
+        initial_volumes : dict, optional
+            well -> volume before the protocol, by default derived from the final volumes
+        
+        Raises
+        ------
+        ValueError
+            listing the first instruction each short well runs out at
+        
+        """
+        violations = check_volumes(self.instructions, initial_volumes)
+        if violations:
+            raise ValueError("Not enough volume:\n" + format_violations(violations))
+    
+    def provision_as_needed(self, resource_id, dests):
+        """
+        Provision a resource into dests, as much as the rest of the protocol turns out to need.
+        
+        Until plan_provisions runs (as_dict and dump_protocol run it) each well is
+        provisioned up to its capacity, so the protocol can be built as usual.
+        
+        Parameters
+        ----------
+        resource_id : str
+            catalog id of the resource, as for provision
+        dests : Well, WellGroup, list of Well
+        
+        """
+        for dest in ([dests] if isinstance(dests, Well) else dests):
+            self._remove_cover(dest.container, "provision")
+            placeholder = Microliters.of(dest.container.container_type.well_volume_ul).unit()
+            entry = {"well": dest, "volume": placeholder}
+            dest.volume = dest.volume + placeholder if dest.volume else placeholder
+            self.as_needed.append(entry)
+            
+            if (self.instructions and self.instructions[-1].op == "provision" and
+                    self.instructions[-1].resource_id == resource_id and
+                    self.instructions[-1].to[-1]["well"].container == dest.container):
+                self.instructions[-1].to.append(entry)
+            else:
+                self.instructions.append(Provision(resource_id, [entry]))
+    
+    def plan_provisions(self):
+        """
+        Replace the placeholders of provision_as_needed with the smallest volumes that work.
+        
+        Every aspiration after the provision has to leave at least the dead volume
+        behind, and every mix needs at least the mix volume (see provision_planner).
+        
+        Returns
+        -------
+        needs : list of (Well, Microliters)
+        
+        """
+        needs = list(zip([entry["well"] for entry in self.as_needed],
+                         provision_needs(self.instructions, self.as_needed)))
+        for entry, (well, need) in zip(self.as_needed, needs):
+            well.volume = (Microliters.of(well.volume) - entry["volume"] + need).unit()
+            instruction = next(instruction for instruction in self.instructions if instruction.op == "provision"
+                               and any(to is entry for to in instruction.data["to"]))
+            to = instruction.data["to"]
+            position = next(i for i, other in enumerate(to) if other is entry)
+            to[position:position+1] = [{"well": well, "volume": volume.unit()} for volume in split_provision(need)]
+        self.as_needed = []
+        return needs
+    
+    def as_dict(self):
+        """Protocol.as_dict, with the provisions of provision_as_needed planned first"""
+        if self.as_needed:
+            self.plan_provisions()
+        return super(CustomProtocol, self).as_dict()
+    
     def ref(self, name, id=None, cont_type=None, storage=None, discard=None):
         """
         
@@ -114,6 +274,24 @@ class CustomProtocol(Protocol):
                                               storage=storage, discard=discard)
     
     
+    def thermocycle(self, ref, groups, volume="10:microliter", dataref=None, dyes=None, **melting):
+        """
+        Thermocycle ref, groups being autoprotocol groups or a ThermocycleProgram.
+        
+        The program is checked against the thermocycler's limits and the volume
+        against ref's wells (see ThermocycleProgram.validate) before it is added.
+        A ThermocycleProgram is compressed first, groups are passed on as they are.
+        
+        """
+        volume = to_unit(volume)
+        if isinstance(groups, ThermocycleProgram):
+            program = groups.compress()
+            groups = program.groups()
+        else:
+            program = ThermocycleProgram.from_groups(groups)
+        program.validate(ref, volume, dataref)
+        super(CustomProtocol, self).thermocycle(ref, groups, volume, dataref, dyes, **melting)
+    
     def transfer(self, source, dest, volume, one_source=False, one_tip=False, 
                 aspirate_speed=None, dispense_speed=None, 
                 aspirate_source=None, dispense_target=None, 
@@ -253,11 +431,11 @@ class CustomProtocol(Protocol):
         """
         
         if type(volume) == list:
-            min_volume = min(volume)
+            min_volume = min(Microliters.of(v) for v in volume)
         else:
-            min_volume = volume        
+            min_volume = Microliters.of(volume)
         
-        if min_volume < ul(10) and not mix_kwargs.get('mix_after') \
+        if min_volume < Microliters(10) and not mix_kwargs.get('mix_after') \
            and not mix_kwargs.get('ignore_mix_after_warning'):
             raise Exception('mix_after required for <10uL of solution to ensure complete transfer. \n'
                             'Ensure you have are pipetting into something big enough and set this')
@@ -265,11 +443,12 @@ class CustomProtocol(Protocol):
         if 'ignore_mix_after_warning' in mix_kwargs:
             del mix_kwargs['ignore_mix_after_warning']
             
-        super().transfer(source, dest, volume, one_source=one_source, one_tip=one_tip, 
+        mix_kwargs = {k: to_unit(v) for k, v in mix_kwargs.items()}
+        super().transfer(source, dest, to_unit(volume), one_source=one_source, one_tip=one_tip, 
               aspirate_speed=aspirate_speed, dispense_speed=dispense_speed, 
               aspirate_source=aspirate_source, dispense_target=dispense_target, 
-              pre_buffer=pre_buffer, disposal_vol=disposal_vol, 
-              transit_vol=transit_vol, blowout_buffer=blowout_buffer, 
+              pre_buffer=to_unit(pre_buffer), disposal_vol=to_unit(disposal_vol), 
+              transit_vol=to_unit(transit_vol), blowout_buffer=blowout_buffer, 
               tip_type=tip_type, new_group=new_group,**mix_kwargs)
         
     def distribute(self, source, dest, volume, allow_carryover=False,
@@ -435,7 +614,7 @@ class CustomProtocol(Protocol):
         """    
         
 
-        if volume < ul(10):
+        if Microliters.of(volume) < Microliters(10):
             for dest_well in dest:
                 self.transfer(source,dest_well,volume,mix_before=mix_before,
                               mix_after=mix_after,mix_vol=mix_vol,
@@ -446,9 +625,10 @@ class CustomProtocol(Protocol):
                               tip_type=tip_type, new_group=new_group,
                               ignore_mix_after_warning=ignore_mix_after_warning)                               
         else:
-            super().distribute(source, dest, volume, allow_carryover=allow_carryover,
-                               mix_before=mix_before, mix_vol=mix_vol, repetitions=repetitions,
+            super().distribute(source, dest, to_unit(volume), allow_carryover=allow_carryover,
+                               mix_before=mix_before, mix_vol=to_unit(mix_vol), repetitions=repetitions,
                                flowrate=flowrate, aspirate_speed=aspirate_speed,
                                aspirate_source=aspirate_source, distribute_target=distribute_target,
-                               pre_buffer=pre_buffer, disposal_vol=disposal_vol, transit_vol=transit_vol,
+                               pre_buffer=to_unit(pre_buffer), disposal_vol=to_unit(disposal_vol),
+                               transit_vol=to_unit(transit_vol),
                                blowout_buffer=blowout_buffer, tip_type=tip_type, new_group=new_group)
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""Virtual digests and the gel lanes they should give
+
+digest cuts a sequence (see restriction_sites.read_sequence for FASTA and .dna files)
+with a set of enzymes and returns the fragment sizes, largest first.  digest_screen
+does every construct x enzyme set of a batch, finding each construct's sites only once.
+
+Band positions are predicted with a log-linear migration model: within the
+resolving range of the gel's agarose percentage, the distance a band runs (0 at the
+well, 1 at the end of the lane) falls linearly with log10 of its size.  Bands closer
+than the gel resolves are merged.  score_lane compares the band sizes read off a
+gel lane (against the ladder) with the prediction.
+
+    sequence, circular = read_sequence("../puc19fsa.txt")
+    sizes = digest(sequence, ["EcoRI", "HindIII"], circular)     # [2635, 51]
+    predict_lane(sizes, "agarose(10,2%)")
+
+"""
+
+import re
+import numpy as np
+from collections import OrderedDict
+from restriction_sites import SiteIndex, find_sites
+
+# band sizes (bp) of the gel_separate ladders: ladder1 a low mass ladder, ladder2 a 1 Kb Plus style ladder
+LADDERS = {
+    'ladder1': np.array([100, 200, 400, 800, 1200, 2000]),
+    'ladder2': np.array([100, 200, 300, 400, 500, 650, 850, 1000, 1650, 2000, 3000, 4000, 5000,
+                         6000, 7000, 8000, 9000, 10000, 11000, 12000]),
+}
+
+# agarose % -> (smallest, largest) fragment resolved, bp
+RESOLVING_RANGE = OrderedDict([(0.8, (800, 12000)), (1.2, (400, 7000)), (2.0, (100, 3000)), (4.0, (25, 500))])
+
+RESOLUTION = 0.02       # bands closer than this (fraction of the lane) run together
+
+
+def parse_matrix(matrix):
+    """(lanes, agarose %) of a gel_separate matrix like "agarose(10,2%)" """
+    match = re.match(r'^agarose\((\d+),\s*([0-9.]+)%\)$', matrix)
+    if match is None:
+        raise ValueError("Can't read gel matrix {!r}".format(matrix))
+    return int(match.group(1)), float(match.group(2))
+
+
+def migration(sizes, matrix):
+    """Distance each size runs down the lane, 0 (well) to 1 (end), clipped to the resolving range"""
+    _, percent = parse_matrix(matrix)
+    closest = min(RESOLVING_RANGE, key=lambda key: abs(key - percent))
+    smallest, largest = RESOLVING_RANGE[closest]
+    sizes = np.asarray(sizes, dtype=float)
+    return np.clip((np.log10(largest) - np.log10(sizes)) / (np.log10(largest) - np.log10(smallest)), 0, 1)
+
+
+def cut_positions(sites, enzymes):
+    """Sorted top-strand cut positions of enzymes, from a find_sites result"""
+    return np.unique(np.array([site.cut for name in enzymes for site in sites[name] if site.cut is not None],
+                              dtype=int))
+
+
+def fragment_sizes(cuts, length, circular=True):
+    """Fragment sizes, largest first, of a sequence of length cut at cuts"""
+    if not len(cuts):
+        return np.array([length])
+    if circular:
+        sizes = np.diff(np.r_[cuts, cuts[0] + length])
+    else:
+        sizes = np.diff(np.r_[0, cuts, length])
+        sizes = sizes[sizes > 0]
+    return np.sort(sizes)[::-1]
+
+
+def digest(sequence, enzymes, circular=True):
+    """Fragment sizes, largest first, of sequence cut by every enzyme in enzymes"""
+    return fragment_sizes(cut_positions(find_sites(sequence, circular=circular), enzymes), len(sequence), circular)
+
+
+def digest_screen(constructs, enzyme_sets, index=None):
+    """
+    Digest every construct with every enzyme set
+
+    Parameters
+    ----------
+    constructs : dict
+        name -> (sequence, circular)
+    enzyme_sets : list of list of str
+    index : SiteIndex, optional
+        covering every enzyme in enzyme_sets, the whole catalog if not given
+
+    Returns
+    -------
+    OrderedDict
+        (construct name, tuple of enzymes) -> fragment sizes
+
+    """
+    index = SiteIndex() if index is None else index
+    results = OrderedDict()
+    for name, (sequence, circular) in constructs.items():
+        sites = index.find_sites(sequence, circular)
+        cuts = {enzyme: cut_positions(sites, [enzyme]) for enzyme in set().union(*enzyme_sets)}
+        for enzymes in enzyme_sets:
+            positions = np.unique(np.concatenate([cuts[enzyme] for enzyme in enzymes])) if enzymes else []
+            results[name, tuple(enzymes)] = fragment_sizes(positions, len(sequence), circular)
+    return results
+
+
+def predict_lane(sizes, matrix, resolution=RESOLUTION):
+    """
+    Bands a lane should show
+
+    Returns
+    -------
+    list of (migration, sizes)
+        top of the gel first, fragments running within resolution of each other in one band
+
+    """
+    sizes = np.sort(np.asarray(sizes))[::-1]
+    distances = migration(sizes, matrix)
+    bands = []
+    for size, distance in zip(sizes, distances):
+        if bands and distance - bands[-1][0] < resolution:
+            bands[-1][1].append(int(size))
+        else:
+            bands.append((float(distance), [int(size)]))
+    return bands
+
+
+def score_lane(observed_sizes, predicted_sizes, matrix, tolerance=2*RESOLUTION):
+    """
+    Compare the band sizes read off a lane with the predicted fragment sizes
+
+    Bands are compared by where they run, so sizes outside the gel's resolving range,
+    which all pile up at the top or bottom, count as the same band.
+
+    Returns
+    -------
+    dict
+        "score" (1 when every band is where it should be and nothing else shows),
+        "missing" predicted sizes without an observed band, "unexpected" observed
+        sizes that no predicted band explains
+
+    """
+    predicted = predict_lane(predicted_sizes, matrix)
+    predicted_distances = np.array([distance for distance, _ in predicted])
+    observed_distances = migration(observed_sizes, matrix) if len(observed_sizes) else np.zeros(0)
+    close = np.abs(predicted_distances[:, None] - observed_distances[None, :]) <= tolerance
+    found, explained = close.any(axis=1), close.any(axis=0)
+    return {"score": float(found.sum()) / (len(predicted) + int((~explained).sum())),
+            "missing": [size for (_, sizes), ok in zip(predicted, found) if not ok for size in sizes],
+            "unexpected": [int(size) for size, ok in zip(observed_sizes, explained) if not ok]}
+
+
+def format_lanes(lanes, matrix, ladder):
+    """Text picture of the expected gel, one column per lane (lane name -> fragment sizes), ladder first"""
+    names = [ladder] + list(lanes)
+    columns = [predict_lane(LADDERS[ladder], matrix, resolution=0)] + \
+              [predict_lane(sizes, matrix) for sizes in lanes.values()]
+    rows = 20
+    width = max(10, max(len(name) for name in names) + 1)
+    lines = [''.join('{:<{}}'.format(name, width) for name in names)]
+    for row in range(rows):
+        cells = []
+        for bands in columns:
+            here = [sizes for distance, sizes in bands if min(int(distance * rows), rows - 1) == row]
+            cells.append('{:<{}}'.format('+'.join(str(size) for sizes in here for size in sizes)[:width - 1], width))
+        lines.append(''.join(cells).rstrip())
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    from restriction_sites import read_sequence
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('sequences', nargs='+', help='FASTA or .dna files')
+    parser.add_argument('--enzymes', nargs='*', default=['EcoRI', 'HindIII'],
+                        help='enzymes of the digest, none for uncut')
+    parser.add_argument('--matrix', default='agarose(10,2%)')
+    parser.add_argument('--ladder', default='ladder2', choices=sorted(LADDERS))
+    args = parser.parse_args()
+
+    lanes = OrderedDict()
+    for path in args.sequences:
+        sequence, circular = read_sequence(path)
+        lanes[path.split('/')[-1]] = digest(sequence, args.enzymes, circular)
+        print('{}: {}'.format(path, ', '.join(str(size) for size in lanes[path.split('/')[-1]])))
+    print(format_lanes(lanes, args.matrix, args.ladder))
@@ -1,8 +1,8 @@
-from autoprotocol.protocol import Protocol
-import json
+from custom_protocol import CustomProtocol as Protocol
 import sys
 
-from utils import ul, init_inventory_well, dead_volume
+from utils import ul, init_inventory_wells, dead_volume
+from protocol_writer import dump_protocol
 
 inv = {
     'water':                                  'rs17gmh5wafm5p', # catalog: autoclave milliq h2o
@@ -38,8 +38,8 @@ def dilute_primer(source_well, destination_well, destination_volume_uL,
     """
     global inv
     
-    #@TODO: figure out how to check if a diluent tube has enough volume in it to conduct the action 
-    # (needs to account for multiple calls to this function)
+    #the diluent is provisioned straight into each destination, so there is no shared
+    #diluent tube to run out over multiple calls (--check-volumes checks the source wells)
     
     mix_volume = destination_volume_uL / 2
     source_volume_uL = ratio * destination_volume_uL
@@ -74,12 +74,11 @@ primer_wells = [p.ref('sfgfp_puc19_primer_forward_100uM', id=inv['sfgfp_puc19_pr
                 p.ref('sfgfp_puc19_primer_reverse_hindiii_100uM', id=inv['sfgfp_puc19_primer_reverse_hindiii_100uM'], 
                              cont_type="micro-1.5", storage="cold_20").well(0)]
 
-for well in primer_wells:
-    init_inventory_well(well)
+init_inventory_wells(primer_wells)
 
 for x in range(0,len(primer_wells)):
     dilute_primer(primer_wells[x], dilute_primer_wells[x], 
                   100, 0.1, 'te')
 
 
-print(json.dumps(p.as_dict(), indent=2))
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
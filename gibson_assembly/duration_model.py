@@ -0,0 +1,79 @@
+"""Estimated duration of autoprotocol instructions
+
+Works on Instruction objects as well as on the instruction dicts of emitted protocol
+json.  The per-step constants are rough workcell timings, good enough to compare
+protocol variants against each other, not to predict a run to the minute.
+
+"""
+
+from autoprotocol import Unit
+from thermocycle_program import ThermocycleProgram
+
+# seconds
+TIP_CHANGE = 15         # per pipette group: pick up a tip, drop it
+TRANSFER = 12           # per aspirate + dispense
+MIX_REPETITION = 2      # per aspirate/dispense cycle of a mix
+PLATE_READ = 60         # moving a plate into and out of a reader
+FLASH = 0.02            # per well per flash
+GEL_SETUP = 10*60       # loading the gel, on top of the run duration
+PICK = 20               # per colony picked
+IMAGE = 60
+LID = 20                # cover, uncover, seal, unseal
+DEFAULT = 60            # provision, dispense, anything without its own model
+
+# reads that default to 25 flashes if num_flashes is missing
+_READS = ["absorbance", "fluorescence", "luminescence"]
+
+
+def seconds(duration):
+    """A duration Unit or "10:minute" string in seconds"""
+    return Unit.fromstring(duration).to("second").magnitude
+
+
+def _mix_repetitions(step):
+    return sum((step.get(mix) or {}).get("repetitions", 0) for mix in ["mix_before", "mix_after"])
+
+
+def pipette_duration(groups):
+    total = 0.0
+    for group in groups:
+        total += TIP_CHANGE
+        if "transfer" in group:
+            total += sum(TRANSFER + MIX_REPETITION*_mix_repetitions(xfer) for xfer in group["transfer"])
+        elif "distribute" in group:
+            total += TRANSFER + len(group["distribute"]["to"]) * TRANSFER/2 \
+                + MIX_REPETITION*_mix_repetitions(group["distribute"])
+        elif "consolidate" in group:
+            total += len(group["consolidate"]["from"]) * TRANSFER/2 + TRANSFER \
+                + MIX_REPETITION*_mix_repetitions(group["consolidate"])
+        elif "mix" in group:
+            total += sum(MIX_REPETITION*mix.get("repetitions", 10) for mix in group["mix"])
+    return total
+
+
+def thermocycle_duration(groups):
+    """Cycles x step durations plus the ramps between steps, see ThermocycleProgram.runtime"""
+    return ThermocycleProgram.from_groups(groups).runtime()
+
+
+def instruction_duration(instruction):
+    """Estimated seconds an instruction (Instruction or json dict) takes on the workcell"""
+    data = getattr(instruction, "data", instruction)
+    op = data["op"]
+    if op == "pipette":
+        return pipette_duration(data["groups"])
+    if op == "thermocycle":
+        return thermocycle_duration(data["groups"])
+    if op in ("incubate", "spin"):
+        return seconds(data["duration"])
+    if op in _READS:
+        return PLATE_READ + len(data["wells"]) * data.get("num_flashes", 25) * FLASH
+    if op == "gel_separate":
+        return GEL_SETUP + seconds(data["duration"])
+    if op == "autopick":
+        return sum(len(group["to"]) for group in data["groups"]) * PICK
+    if op == "image_plate":
+        return IMAGE
+    if op in ("cover", "uncover", "seal", "unseal"):
+        return LID
+    return DEFAULT
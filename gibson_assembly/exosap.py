@@ -4,11 +4,11 @@ Derived from Brian Naughton @ http://blog.booleanbiotech.com/genetic_engineering
 
 """
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
-from utils import (ul, expid, init_inventory_well, touchdown,
+from utils import (ul, expid, init_inventory_wells, touchdown,
                    dead_volume)
 import numpy
+from protocol_writer import dump_protocol
 
 
 p = Protocol()
@@ -63,8 +63,7 @@ if 'run_absorbance' in options:
 
 # Initialize all existing inventory
 all_inventory_wells = [dna_to_clean_well]
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
 
 # -----------------------------------------------------
 # ExoSAP-IT PCR product cleanyup
@@ -106,4 +105,4 @@ if 'run_absorbance' in options:
                      "{}:nanometer".format(wavelength), expid("abs_{}".format(wavelength), experiment_name),
                      flashes=25)
 
-print(json.dumps(p.as_dict(), indent=2))
+dump_protocol(p)
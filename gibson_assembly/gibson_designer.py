@@ -0,0 +1,253 @@
+"""Multi-fragment Gibson assembly design
+
+design_assembly takes an ordered list of fragments, each either PCR amplified (its
+primers can carry overlap tails) or cut out of a plasmid by a restriction digest
+(its ends are fixed, see digest_fragments), and for every junction picks the
+overlap closest to a target Tm:
+
+* candidate overlaps are every window of the target lengths spanning the
+  junction, scored all at once with primer_design.window_properties; an overlap
+  next to a digested end has to be that end, since the neighbor's primer carries it
+* overlaps must be unique: every k-mer of an overlap has to occur exactly once,
+  on either strand, in the whole assembled sequence, so no junction can anneal
+  anywhere else.  The assembled sequence's k-mers are indexed once, as integers
+
+It returns the assembled sequence, the junctions and, for every PCR fragment, the
+primer tails and primers (see primer_design.design_primers).  matches_reference
+checks an assembled sequence against a reference, e.g. assembled_puc19_sfGFP.dna,
+whatever its origin and strand.
+
+    vector = digest_fragments(read_sequence("../puc19fsa.txt")[0], ["EcoRI", "HindIII"])[0]
+    assembly = design_assembly([vector, Fragment("sfgfp", insert, True)], reference=reference)
+
+"""
+
+import numpy as np
+from collections import namedtuple
+from restriction_sites import find_sites, reverse_complement
+from primer_design import window_properties, design_primers
+from utils import convert_ug_to_pmol
+
+# pcr: True if the fragment is PCR amplified (overlap tails can go on its primers), False if digested
+Fragment = namedtuple('Fragment', ['name', 'sequence', 'pcr'])
+# left_bases of the overlap are the end of the left fragment, the rest the start of the right fragment
+Junction = namedtuple('Junction', ['left', 'right', 'overlap', 'tm', 'left_bases'])
+FragmentPlan = namedtuple('FragmentPlan', ['name', 'length', 'forward_tail', 'reverse_tail', 'primers'])
+Assembly = namedtuple('Assembly', ['sequence', 'junctions', 'fragments', 'circular'])
+
+OVERLAP_LENGTHS = range(18, 41)
+OVERLAP_TM = 55.0       # C, NEBuilder wants overlaps of 15-20 bases or more melting above 48C
+UNIQUE_K = 12           # overlaps may share no k-mer of this length with the rest of the assembly
+
+_CODE = np.full(256, -1, dtype=np.int64)
+for _code, _base in enumerate('ACGT'):
+    _CODE[ord(_base)] = _code
+
+
+def kmer_codes(sequence, k=UNIQUE_K):
+    """Every k-mer of sequence as an integer, 2 bits a base"""
+    codes = _CODE[np.frombuffer(sequence.upper().encode('latin-1'), dtype=np.uint8)]
+    if (codes < 0).any():
+        raise ValueError("Fragments can only hold A, C, G and T")
+    kmers = np.zeros(max(len(codes) - k + 1, 0), dtype=np.int64)
+    for offset in range(k):
+        kmers = 4 * kmers + codes[offset:offset + len(kmers)]
+    return kmers
+
+
+def digest_fragments(sequence, enzymes, circular=True, name="vector"):
+    """
+    The fragments a digest leaves, largest first, as Fragments that can't take tails
+
+    Each fragment is the part both strands keep, between the overhangs: the Gibson
+    exonuclease removes the 5' overhangs anyway.
+
+    """
+    sites = find_sites(sequence, circular=circular)
+    cuts = sorted((min(site.cut, site.complement_cut), max(site.cut, site.complement_cut))
+                  for enzyme in enzymes for site in sites[enzyme] if site.cut is not None)
+    if not cuts:
+        raise ValueError("{} don't cut the sequence".format(', '.join(enzymes)))
+    n = len(sequence)
+    if circular:
+        pairs = [(cuts[i], cuts[i + 1] if i + 1 < len(cuts) else (cuts[0][0] + n, cuts[0][1] + n))
+                 for i in range(len(cuts))]
+    else:
+        pairs = [((0, 0), cuts[0])] + list(zip(cuts, cuts[1:])) + [(cuts[-1], (n, n))]
+    doubled = (sequence + sequence).upper() if circular else sequence.upper()
+    cores = [doubled[left[1]:right[0]] for left, right in pairs if right[0] > left[1]]
+    return [Fragment("{}_{}".format(name, i + 1) if i else name, core, False)
+            for i, core in enumerate(sorted(cores, key=len, reverse=True))]
+
+
+class _KmerIndex(object):
+    """How often each k-mer occurs on either strand of a (circular) sequence"""
+
+    def __init__(self, sequence, circular=True, k=UNIQUE_K):
+        self.k = k
+        wrapped = sequence + sequence[:k - 1] if circular else sequence
+        self.kmers, self.counts = np.unique(np.r_[kmer_codes(wrapped, k), kmer_codes(reverse_complement(wrapped), k)],
+                                            return_counts=True)
+
+    def counts_of(self, kmers):
+        positions = np.minimum(np.searchsorted(self.kmers, kmers), len(self.kmers) - 1)
+        return np.where(self.kmers[positions] == kmers, self.counts[positions], 0)
+
+
+def _junction(left, right, index, lengths, target_tm):
+    """Best Junction between fragments left and right"""
+    if not left.pcr and not right.pcr:
+        raise ValueError("{} and {} are both digested, one of them has to be PCR amplified to carry the overlap"
+                         .format(left.name, right.name))
+    flank = max(lengths)
+    context = left.sequence[-flank:] + right.sequence[:flank]
+    join = len(context) - min(flank, len(right.sequence))
+    lengths = np.asarray(list(lengths))
+    props = window_properties(context, lengths)
+    starts = np.arange(len(context))[:, None]
+    ends = starts + lengths[None, :]
+
+    if not left.pcr:
+        allowed = ends == join              # the overlap is the digested end itself
+    elif not right.pcr:
+        allowed = starts == join
+    else:
+        allowed = (starts <= join) & (ends >= join)
+
+    # an overlap is unique if none of its k-mers occurs anywhere else
+    repeated = np.r_[0, np.cumsum(index.counts_of(kmer_codes(context, index.k)) != 1)]
+    last_kmer = np.clip(ends - index.k + 1, 0, len(repeated) - 1)
+    unique = repeated[last_kmer] - repeated[np.minimum(starts, len(repeated) - 1)] == 0
+
+    penalty = np.abs(props["tm"] - target_tm) + 20 * np.clip(np.abs(props["gc"] - 0.5) - 0.1, 0, None)
+    penalty = np.where(allowed & unique & ~np.isnan(penalty), penalty, np.inf)
+    row, column = np.unravel_index(np.argmin(penalty), penalty.shape)
+    if not np.isfinite(penalty[row, column]):
+        raise ValueError("No unique overlap of {}-{} bases between {} and {}".format(
+            lengths.min(), lengths.max(), left.name, right.name))
+    length = int(lengths[column])
+    return Junction(left.name, right.name, context[row:row + length], round(float(props["tm"][row, column]), 1),
+                    int(join - row))
+
+
+def matches_reference(sequence, reference, circular=True):
+    """Whether sequence is reference, on either strand and, if circular, from any origin"""
+    sequence, reference = sequence.upper(), reference.upper()
+    if len(sequence) != len(reference):
+        return False
+    if not circular:
+        return sequence in (reference, reverse_complement(reference))
+    return reference in sequence + sequence or reverse_complement(reference) in sequence + sequence
+
+
+def design_assembly(fragments, circular=True, lengths=OVERLAP_LENGTHS, target_tm=OVERLAP_TM, reference=None,
+                    primer_tm=62.0, k=UNIQUE_K):
+    """
+    Design a Gibson assembly of fragments, joined in order
+
+    Parameters
+    ----------
+    fragments : list of Fragment
+    circular : bool
+        the last fragment is joined back to the first
+    lengths : range
+        overlap lengths to try
+    target_tm : float
+        C, overlap Tm to aim for
+    reference : str, optional
+        the sequence the assembly should give, checked with matches_reference
+    primer_tm : float
+        C, Tm of the template-binding part of the primers
+    k : int
+        overlaps may share no k-mer with the rest of the assembly
+
+    Returns
+    -------
+    Assembly
+        the assembled sequence, one Junction per junction (the one after each fragment)
+        and a FragmentPlan per fragment, with primers (a PrimerPair, None if none was
+        found or the fragment is digested)
+
+    """
+    fragments = [fragment._replace(sequence=fragment.sequence.upper()) for fragment in fragments]
+    sequence = ''.join(fragment.sequence for fragment in fragments)
+    if reference is not None and not matches_reference(sequence, reference, circular):
+        raise ValueError("The assembled sequence ({} bp) doesn't match the reference ({} bp)".format(
+            len(sequence), len(reference)))
+
+    index = _KmerIndex(sequence, circular, k)
+    neighbors = list(zip(fragments, fragments[1:] + fragments[:1]))
+    junctions = [_junction(left, right, index, lengths, target_tm)
+                 for left, right in (neighbors if circular else neighbors[:-1])]
+
+    plans = []
+    for i, fragment in enumerate(fragments):
+        before = junctions[i - 1] if i > 0 or circular else None
+        after = junctions[i] if i < len(junctions) else None
+        # tails are the bases of each overlap that lie in the neighboring fragment
+        forward_tail = before.overlap[:before.left_bases] if before else ''
+        reverse_tail = reverse_complement(after.overlap[after.left_bases:]) if after else ''
+        primers = None
+        if fragment.pcr:
+            pairs = design_primers(fragment.sequence, 0, len(fragment.sequence), target_tm=primer_tm,
+                                   forward_tail=forward_tail, reverse_tail=reverse_tail, max_tm_difference=5, top=1)
+            primers = pairs[0] if pairs else None
+        plans.append(FragmentPlan(fragment.name, len(fragment.sequence), forward_tail, reverse_tail, primers))
+    return Assembly(sequence, junctions, plans, circular)
+
+
+def fragment_volumes(lengths, ng_per_ul, vector=0, vector_pmol=0.05, insert_excess=None, max_volume=10):
+    """
+    uL of each fragment for a NEBuilder reaction, to 0.1uL (see gibson_transform_utils.do_fragment_assembly)
+
+    NEB: 0.03-0.2 pmol in all with 2 fold insert excess for 2-3 fragments, 0.2-0.5 pmol
+    of equimolar fragments for 4-6.  lengths in bp (of the PCR products, tails included).
+
+    """
+    lengths = np.asarray(lengths)
+    if insert_excess is None:
+        insert_excess = 2 if len(lengths) <= 3 else 1
+    pmol = np.full(len(lengths), vector_pmol * insert_excess)
+    pmol[vector] = vector_pmol
+    pmol_per_ul = convert_ug_to_pmol(np.asarray(ng_per_ul) / 1000.0, lengths)
+    volumes = np.round(pmol / pmol_per_ul, 1)
+    if volumes.sum() > max_volume:
+        raise ValueError("The fragments need {:.1f}uL but the reaction takes {}uL, concentrate them".format(
+            volumes.sum(), max_volume))
+    return volumes
+
+
+def format_assembly(assembly):
+    lines = ['{} bp {} assembly'.format(len(assembly.sequence), 'circular' if assembly.circular else 'linear')]
+    for junction in assembly.junctions:
+        lines.append('  {} | {}: {} ({} bp, Tm {}C)'.format(junction.left, junction.right, junction.overlap,
+                                                         len(junction.overlap), junction.tm))
+    for plan in assembly.fragments:
+        if plan.primers is None:
+            lines.append('{} ({} bp): {}'.format(plan.name, plan.length, 'digested' if not plan.forward_tail and
+                                                 not plan.reverse_tail else 'no primers found'))
+            continue
+        lines.append('{} ({} bp, product {} bp, anneal {}C)\n  forward {}\n  reverse {}'.format(
+            plan.name, plan.length, plan.primers.product_length, plan.primers.anneal,
+            plan.primers.forward, plan.primers.reverse))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    from restriction_sites import read_sequence
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('fragments', nargs='+', help='FASTA or .dna files of the PCR fragments, in order')
+    parser.add_argument('--vector', help='FASTA or .dna of a plasmid digested to take the fragments')
+    parser.add_argument('--enzymes', nargs='+', default=['EcoRI', 'HindIII'])
+    parser.add_argument('--linear', action='store_true')
+    parser.add_argument('--tm', type=float, default=OVERLAP_TM)
+    parser.add_argument('--reference', help='FASTA or .dna the assembly should give')
+    args = parser.parse_args()
+
+    fragments = [Fragment(path.split('/')[-1].rsplit('.', 1)[0], read_sequence(path)[0], True)
+                 for path in args.fragments]
+    if args.vector:
+        fragments.insert(0, digest_fragments(read_sequence(args.vector)[0], args.enzymes)[0])
+    reference = read_sequence(args.reference)[0] if args.reference else None
+    print(format_assembly(design_assembly(fragments, not args.linear, target_tm=args.tm, reference=reference)))
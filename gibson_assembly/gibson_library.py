@@ -0,0 +1,141 @@
+"""Combinatorial Gibson assembly libraries on plates
+
+gibson_transform_utils.do_gibson_assembly assembles one vector and one insert in
+one well.  gibson_library takes a vector x insert matrix instead, with the
+measured concentration and length of every fragment, and:
+
+* works out the vector, insert and water volumes of every reaction at once
+  (library_volumes): vector_pmol of vector and insert_excess times as much insert,
+  NEB's 1:2 vector:insert molar ratio, through utils.convert_ug_to_pmol over the
+  whole matrix
+* lays the reactions out across as many 96-pcr plates as they need
+* provisions the NEBuilder Master Mix and the water of a plate in one instruction
+  each, and adds every vector and every insert in one transfer each
+* runs one 50C thermocycle per plate and the 4x dilution (20uL -> 80uL) of every
+  well in bulk
+
+The dilutions are ready for transformation (see gibson_transform_utils).
+
+"""
+
+import numpy as np
+from collections import namedtuple, OrderedDict
+from itertools import product
+from utils import ul, convert_ug_to_pmol
+
+# a vector or insert: the Well holding it, ng/uL and length (bp)
+LibraryFragment = namedtuple('LibraryFragment', ['name', 'well', 'ng_per_ul', 'length'])
+LibraryReaction = namedtuple('LibraryReaction', ['name', 'vector', 'insert', 'vector_volume', 'insert_volume',
+                                                 'water_volume'])
+
+MASTER_MIX_VOLUME = 10      # uL of 2x NEBuilder Master Mix per 20uL reaction
+REACTION_VOLUME = 20
+DILUTION = 4                # NEB: dilute the assembled product 4x before transforming
+MIN_VOLUME = 0.5            # uL, smallest fragment transfer
+
+
+def library_volumes(vector_ng_per_ul, vector_lengths, insert_ng_per_ul, insert_lengths,
+                    vector_pmol=0.05, insert_excess=2):
+    """
+    uL of vector, insert and water of every vector x insert reaction
+
+    Parameters
+    ----------
+    vector_ng_per_ul, vector_lengths : array
+        one per vector
+    insert_ng_per_ul, insert_lengths : array
+        one per insert
+    vector_pmol : float
+        vector per reaction, NEB recommends 0.03-0.2 pmol of fragments in all
+    insert_excess : float
+        insert per vector, molar
+
+    Returns
+    -------
+    vector_volumes, insert_volumes, water_volumes : ndarray
+        vectors x inserts, uL to 0.1uL
+
+    """
+    # both fragments of every reaction in one call: [vector or insert, vector, insert]
+    ng_per_ul = np.stack(np.broadcast_arrays(np.asarray(vector_ng_per_ul, dtype=float)[:, None],
+                                             np.asarray(insert_ng_per_ul, dtype=float)[None, :]))
+    lengths = np.stack(np.broadcast_arrays(np.asarray(vector_lengths)[:, None], np.asarray(insert_lengths)[None, :]))
+    pmol = np.array([vector_pmol, vector_pmol * insert_excess])[:, None, None]
+    volumes = np.round(pmol / convert_ug_to_pmol(ng_per_ul / 1000.0, lengths), 1)
+
+    fragments = volumes.sum(axis=0)
+    space = REACTION_VOLUME - MASTER_MIX_VOLUME
+    if (fragments > space).any():
+        v, i = np.unravel_index(np.argmax(fragments), fragments.shape)
+        raise ValueError("Vector {} with insert {} needs {:.1f}uL of DNA but a reaction only has room for {}uL, "
+                         "concentrate them or use less vector_pmol".format(v, i, fragments[v, i], space))
+    if (volumes < MIN_VOLUME).any():
+        raise ValueError("Fragments need transfers below {}uL, dilute them".format(MIN_VOLUME))
+    return volumes[0], volumes[1], np.round(space - fragments, 1)
+
+
+def library_reactions(vectors, inserts, replicates=1, vector_pmol=0.05, insert_excess=2):
+    """Every vector x insert (x replicate) LibraryReaction, vectors and inserts lists of LibraryFragment"""
+    vector_volumes, insert_volumes, water_volumes = library_volumes(
+        [vector.ng_per_ul for vector in vectors], [vector.length for vector in vectors],
+        [insert.ng_per_ul for insert in inserts], [insert.length for insert in inserts], vector_pmol, insert_excess)
+    return [LibraryReaction("{}_{}".format(vector.name, insert.name) +
+                            ("_{}".format(replicate + 1) if replicates > 1 else ""),
+                            vector, insert, vector_volumes[v, i], insert_volumes[v, i], water_volumes[v, i])
+            for (v, vector), (i, insert), replicate in product(enumerate(vectors), enumerate(inserts),
+                                                               range(replicates))]
+
+
+def gibson_library(p, reactions, water, plate_type="96-pcr", plate_name="gibson_library", storage="cold_20"):
+    """
+    Build a plate-scale Gibson assembly into protocol p
+
+    Parameters
+    ----------
+    p : CustomProtocol
+    reactions : list of LibraryReaction
+        see library_reactions
+    water : str
+        catalog id of the water provisioned into the reactions and dilutions
+
+    Returns
+    -------
+    wells : OrderedDict
+        reaction name -> Well holding the diluted assembly
+
+    """
+    well_count = p.container_type(plate_type).well_count
+    wells = OrderedDict()
+    for plate_number, start in enumerate(range(0, len(reactions), well_count)):
+        plate_reactions = reactions[start:start + well_count]
+        name = plate_name if plate_number == 0 else "{}_{}".format(plate_name, plate_number + 1)
+        plate = p.ref(name, cont_type=plate_type, storage=storage)
+        reaction_wells = plate.wells_from(0, len(plate_reactions))
+        for well, reaction in zip(reaction_wells, plate_reactions):
+            well.name = reaction.name
+            wells[reaction.name] = well
+
+        #
+        # Master mix and water provisioned in bulk, then every vector and every insert in one transfer each
+        #
+        p.provision(p.inv["NEBuilder_Master_Mix"], reaction_wells, ul(MASTER_MIX_VOLUME))
+        watered = [(well, reaction.water_volume) for well, reaction in zip(reaction_wells, plate_reactions)
+                   if reaction.water_volume > 0]
+        if watered:
+            p.provision(water, [well for well, _ in watered], [ul(volume) for _, volume in watered])
+        p.transfer([reaction.vector.well for reaction in plate_reactions], reaction_wells,
+                   [ul(reaction.vector_volume) for reaction in plate_reactions], mix_after=True, mix_vol=ul(6))
+        p.transfer([reaction.insert.well for reaction in plate_reactions], reaction_wells,
+                   [ul(reaction.insert_volume) for reaction in plate_reactions], mix_after=True, mix_vol=ul(10))
+
+        p.seal(plate)
+        p.thermocycle(plate, [{"cycles": 1, "steps": [{"temperature": "50:celsius", "duration": "15:minute"}]}],
+                      volume=ul(REACTION_VOLUME))
+
+        #
+        # Dilute every assembly 4X according to the NEB Gibson assembly protocol (20ul->80ul)
+        #
+        p.unseal(plate)
+        p.provision(water, reaction_wells, ul(REACTION_VOLUME * (DILUTION - 1)))
+        p.mix(reaction_wells, volume=ul(40), repetitions=5)
+    return wells
@@ -31,16 +31,26 @@ def get_inventory():
 #
 
 def do_gibson_assembly(p, water_tube, clone_plate, puc19_cut_tube, sfgfp_pcroe_amp_tube):
+    do_fragment_assembly(p, water_tube, clone_plate, [puc19_cut_tube, sfgfp_pcroe_amp_tube], [2.5, 4])
+
+
+def do_fragment_assembly(p, water_tube, clone_plate, fragment_wells, volumes):
+    """
+    Gibson assembly of any number of fragments, in uL volumes (see gibson_designer.fragment_volumes)
+    """
+    # fragment volumes are to 0.1uL, so is the water that makes them up to 10uL
+    water_volume = round(10 - sum(volumes), 1)
+    assert water_volume >= 0, volumes
     #
     # Combine all the Gibson reagents in one tube and thermocycle
     #
     p.provision(p.inv["NEBuilder_Master_Mix"], clone_plate.well(0), ul(10))
-    p.transfer(water_tube,           clone_plate.well(0), ul(3.5),
-               mix_after=True, mix_vol=ul(6))
-    p.transfer(puc19_cut_tube,       clone_plate.well(0), ul(2.5),
-               mix_after=True, mix_vol=ul(6))
-    p.transfer(sfgfp_pcroe_amp_tube, clone_plate.well(0), ul(4),
-               mix_after=True, mix_vol=ul(10))
+    if water_volume > 0:
+        p.transfer(water_tube,       clone_plate.well(0), ul(water_volume),
+                   mix_after=True, mix_vol=ul(6))
+    for i, (fragment_well, volume) in enumerate(zip(fragment_wells, volumes)):
+        p.transfer(fragment_well,    clone_plate.well(0), ul(volume),
+                   mix_after=True, mix_vol=ul(10 if i == len(volumes) - 1 else 6))
 
     p.seal(clone_plate)
     p.thermocycle(clone_plate,
@@ -0,0 +1,140 @@
+"""Growth curve kinetics for every well of a plate at once
+
+OD600 readings (wells x times, e.g. PlateReadings.channel("abs") from plate_reader)
+are fitted on log OD: a straight line is fitted to every window of consecutive
+timepoints, for all wells at once per window and using only the readings each well
+has in it, and the steepest window gives each well's maximum growth rate.  The lag
+time is where that tangent crosses the first OD read, the carrying capacity is the
+highest OD reached.
+
+Usage:
+    python growth_kinetics.py READINGS_DIR [--channel abs] [--blank D1 D2] [--window 3]
+
+"""
+
+import numpy as np
+
+KINETICS = np.dtype([('well', 'U8'), ('max_growth_rate', np.float64), ('doubling_time', np.float64),
+                     ('lag_time', np.float64), ('carrying_capacity', np.float64), ('grew', np.bool_)])
+
+MIN_OD = 0.005          # ODs are clipped to this before taking logs
+
+
+def window_slopes(times, log_od, window=3):
+    """
+    Least squares slope and intercept of log_od against times over every window
+
+    Parameters
+    ----------
+    times : array
+        timepoints, hours
+    log_od : ndarray
+        wells x times
+    window : int
+        consecutive timepoints per fit, at most len(times)
+
+    Returns
+    -------
+    slopes, intercepts : ndarray
+        wells x windows, fitted on the finite readings of each window only, nan
+        where a window has fewer than two of them
+
+    """
+    times = np.asarray(times, dtype=float)
+    log_od = np.asarray(log_od, dtype=float)
+    window = min(window, len(times))
+    slopes, intercepts = [], []
+    for start in range(len(times) - window + 1):
+        y = log_od[:, start:start + window]
+        read = np.isfinite(y)
+        # each well has its own design once readings are missing: closed form sums over the read points
+        t = np.where(read, times[start:start + window], 0.)
+        y = np.where(read, y, 0.)
+        n = read.sum(axis=1)
+        st, sy = t.sum(axis=1), y.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (n * (t * y).sum(axis=1) - st * sy) / (n * (t * t).sum(axis=1) - st ** 2)
+            slope[n < 2] = np.nan
+            slopes.append(slope)
+            intercepts.append((sy - slope * st) / n)
+    return np.array(slopes).T, np.array(intercepts).T
+
+
+def fit_growth(wells, times, od, window=3, min_od_increase=0.05, min_rate=0.05):
+    """
+    Kinetics of every well
+
+    Parameters
+    ----------
+    wells : list of str
+    times : array
+        hours
+    od : ndarray
+        wells x times OD600, blank subtracted
+    window : int
+        timepoints per growth rate fit
+    min_od_increase, min_rate : float
+        a well grew if its OD rose by at least min_od_increase and its maximum
+        growth rate is at least min_rate per hour
+
+    Returns
+    -------
+    ndarray of KINETICS
+        one row per well: max_growth_rate (per hour, of ln OD), doubling_time and
+        lag_time (hours), carrying_capacity (OD) and whether it grew.  Wells that
+        didn't grow have an inf doubling_time and a nan lag_time.  Missing (nan)
+        readings are left out of the fits, and growth is measured from each
+        well's first OD read
+
+    """
+    od = np.asarray(od, dtype=float)
+    log_od = np.log(np.clip(od, MIN_OD, None))
+    log_od[np.isnan(od)] = np.nan
+    slopes, intercepts = window_slopes(times, log_od, window)
+
+    steepest = np.argmax(np.where(np.isnan(slopes), -np.inf, slopes), axis=1)
+    rows = np.arange(len(od))
+    rate, intercept = slopes[rows, steepest], intercepts[rows, steepest]
+
+    table = np.zeros(len(od), dtype=KINETICS)
+    table['well'] = wells
+    table['max_growth_rate'] = rate
+    table['carrying_capacity'] = np.nanmax(np.where(np.isnan(od), -np.inf, od), axis=1)
+    first = np.argmax(~np.isnan(od), axis=1)
+    table['grew'] = (table['carrying_capacity'] - od[rows, first] >= min_od_increase) & (rate >= min_rate)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['doubling_time'] = np.where(rate > 0, np.log(2) / rate, np.inf)
+        table['lag_time'] = np.where(rate > 0, np.maximum((log_od[rows, first] - intercept) / rate - times[0], 0),
+                                     np.nan)
+    table['doubling_time'][~table['grew']] = np.inf
+    table['lag_time'][~table['grew']] = np.nan
+    return table
+
+
+def fit_readings(readings, channel="abs", blank_wells=None, window=3, **kwargs):
+    """fit_growth over one channel of a PlateReadings, blank subtracted if blank_wells are given"""
+    if blank_wells:
+        readings = readings.subtract_blank(blank_wells)
+    return fit_growth(readings.wells, readings.times, readings.channel(channel), window, **kwargs)
+
+
+def format_kinetics(table):
+    lines = ['{:<6} {:>10} {:>10} {:>8} {:>9}  {}'.format('well', 'rate /h', 'doubling h', 'lag h', 'max OD', '')]
+    for row in table:
+        lines.append('{:<6} {:>10.3f} {:>10.2f} {:>8.2f} {:>9.3f}  {}'.format(
+            row['well'], row['max_growth_rate'], row['doubling_time'], row['lag_time'], row['carrying_capacity'],
+            '' if row['grew'] else 'no growth'))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    from plate_reader import PlateReadings
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', help='readings saved by plate_reader')
+    parser.add_argument('--channel', default='abs')
+    parser.add_argument('--blank', nargs='*', help='blank wells, subtracted first')
+    parser.add_argument('--window', type=int, default=3)
+    args = parser.parse_args()
+
+    print(format_kinetics(fit_readings(PlateReadings.load(args.path), args.channel, args.blank, args.window)))
@@ -5,10 +5,13 @@ Derived from Brian Naughton @ http://blog.booleanbiotech.com/genetic_engineering
 """
 
 import sys
-import json
+from collections import OrderedDict
 from custom_protocol import CustomProtocol as Protocol
-from utils import (ul, expid, init_inventory_well, dead_volume,
+from utils import (ul, expid, init_inventory_wells, dead_volume,
                    assert_valid_volume)
+from protocol_writer import dump_protocol
+from restriction_sites import read_sequence
+from digest import digest, format_lanes
 
 p = Protocol()
 
@@ -37,8 +40,7 @@ pUC19_well = reagent_plate.wells(["H12"])[0]
 
 # Initialize all existing inventory
 all_inventory_wells = [ecori_hindiii_well,cutsmart_well,pUC19_well]
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
 
 # Tubes and plates we use and then discard
 water_tube = p.ref("water_tube", cont_type="micro-1.5", discard=True).well(0)
@@ -51,7 +53,7 @@ puc19_cut_tube  = p.ref(expid("puc19_cut",experiment_name), cont_type="micro-1.5
 # Provisioning and diluting.
 # Diluted EcoRI can be used more than once
 #
-p.provision(inv["water"], water_tube, ul(500))
+p.provision_as_needed(inv["water"], water_tube)
 
 # -------------------------------------------------------------
 # Restriction enzyme cutting pUC19
@@ -93,6 +95,14 @@ assert all(well.volume == ul(20) + dead_volume["96-pcr"] for well in pcr_plate.w
 
 p.gel_separate(pcr_plate.wells(["D1","E1","D2"]), ul(20), "agarose(10,2%)", "ladder2", "15:minute", expid("gel",experiment_name))
 
+# Bands to expect: D1 and E1 cut, D2 uncut. --expected-gel draws them next to the ladder
+if "--expected-gel" in sys.argv:
+    pUC19, circular = read_sequence("../puc19fsa.txt")
+    expected_lanes = OrderedDict([("D1", digest(pUC19, ["EcoRI", "HindIII"], circular)),
+                                  ("E1", digest(pUC19, ["EcoRI", "HindIII"], circular)),
+                                  ("D2", digest(pUC19, [], circular))])
+    sys.stderr.write(format_lanes(expected_lanes, "agarose(10,2%)", "ladder2") + "\n")
+
 
 # ----------------------------------------------------------------------------
 # Then consolidate all cut plasmid to one tube (puc19_cut_tube).
@@ -106,4 +116,4 @@ assert_valid_volume([water_tube, ecori_hindiii_well, cutsmart_well, pUC19_well])
 # ---------------------------------------------------------------
 # Test protocol
 #
-print(json.dumps(p.as_dict(), indent=2))
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
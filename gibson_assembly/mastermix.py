@@ -0,0 +1,220 @@
+"""Mastermix solver
+
+A recipe lists, per reaction, what goes into the mastermix:
+
+    recipe = OrderedDict([
+        ('water',      {'source': inv['water'], 'fill': True}),
+        ('Q5 buffer',  {'source': q5_buffer_well, 'concentration': '1x', 'stock': '5x'}),
+        ('polymerase', {'source': q5_poly_well, 'volume': 0.25}),
+        ('dNTP',       {'source': dNTP_well, 'concentration': '200uM'}),
+    ])
+
+* 'volume' is uL per reaction
+* 'concentration' is the final concentration in the reaction; the stock concentration
+  is 'stock' or else the source well's "Molar Concentration"/"Concentration" property
+* 'fill' (at most one component, usually water) makes up the rest of the reaction
+* a source is a Well to transfer from or a catalog id to provision
+* 'mix_before' mixes a Well source before it is transferred, 'mix_vol' uL at a time
+  (half the transfer by default), for buffers and enzymes that settle
+
+solve_mastermix scales the recipe to N reactions plus overage and the tube's dead
+volume, and splits it over as many tubes as it needs.  make_mastermix emits the
+provisions, transfers and mix that make the tubes, distribute_mastermix gives every
+reaction its share.
+
+"""
+
+import re
+import math
+from collections import namedtuple, OrderedDict
+from autoprotocol.container import Well
+from microliters import Microliters
+from utils import dead_volume
+
+MastermixPlan = namedtuple('MastermixPlan', ['per_reaction', 'tubes'])
+
+_MOLAR = {'M': 1, 'mM': 1e-3, 'uM': 1e-6, 'nM': 1e-9, 'pM': 1e-12}
+
+
+def parse_concentration(concentration):
+    """('M', molar) or ('x', fold) for "10uM", "2.5 mM", "5x" or "5X" """
+    match = re.match(r'^\s*([0-9.eE+-]+)\s*([a-zA-Z]+)\s*$', str(concentration))
+    if match is None:
+        raise ValueError("Can't read concentration {!r}".format(concentration))
+    value, unit = float(match.group(1)), match.group(2)
+    if unit.lower() == 'x':
+        return 'x', value
+    if unit not in _MOLAR:
+        raise ValueError("Unknown concentration unit in {!r}".format(concentration))
+    return 'M', value * _MOLAR[unit]
+
+
+def _stock(name, spec):
+    if 'stock' in spec:
+        return spec['stock']
+    properties = getattr(spec['source'], 'properties', None) or {}
+    for key in ['Molar Concentration', 'Concentration']:
+        if key in properties:
+            return properties[key]
+    raise ValueError("No stock concentration for {}, give 'stock' or set the source well's "
+                     "'Molar Concentration' property".format(name))
+
+
+def reaction_volumes(recipe, reaction_volume, per_well_volume=0):
+    """Volume of each component per reaction
+
+    per_well_volume is what each reaction gets outside the mastermix (template...), so
+    the fill component makes the mastermix up to reaction_volume - per_well_volume.
+
+    """
+    reaction_volume = Microliters.of(reaction_volume)
+    volumes = OrderedDict()
+    fill = None
+    for name, spec in recipe.items():
+        if spec.get('fill'):
+            if fill is not None:
+                raise ValueError("Only one component can fill the reaction, {} and {} do".format(fill, name))
+            fill = name
+            volumes[name] = None
+        elif 'volume' in spec:
+            volumes[name] = Microliters.of(spec['volume'])
+        else:
+            unit, final = parse_concentration(spec['concentration'])
+            stock_unit, stock = parse_concentration(_stock(name, spec))
+            if unit != stock_unit:
+                raise ValueError("{}: can't make {} from {}".format(name, spec['concentration'], _stock(name, spec)))
+            volumes[name] = reaction_volume * (final / stock)
+
+    mastermix_volume = reaction_volume - Microliters.of(per_well_volume)
+    rest = mastermix_volume - sum([v for v in volumes.values() if v is not None], Microliters(0))
+    if rest < Microliters(0):
+        raise ValueError("Recipe adds up to more than the {} mastermix per reaction".format(mastermix_volume))
+    if fill is not None:
+        volumes[fill] = rest
+    return volumes
+
+
+def solve_mastermix(recipe, reaction_volume, num_reactions, per_well_volume=0, overage=0.1,
+                    tube_volume=1500, tube_dead_volume=15, precision=Microliters(0.1)):
+    """
+    Parameters
+    ----------
+    recipe : OrderedDict
+        component -> spec, see the module docstring
+    reaction_volume : Microliters, Unit, str or float (uL)
+    num_reactions : int
+    per_well_volume : Microliters, Unit, str or float (uL)
+        added to each reaction outside the mastermix
+    overage : float
+        extra mastermix as a fraction of what the reactions take
+    tube_volume, tube_dead_volume : float
+        uL a mastermix tube holds and leaves behind
+    precision : Microliters
+        component volumes are rounded up to a multiple of this
+
+    Returns
+    -------
+    MastermixPlan
+        per_reaction: component -> Microliters, tubes: list of (reactions, component -> Microliters)
+
+    """
+    per_reaction = reaction_volumes(recipe, reaction_volume, per_well_volume)
+    mastermix = sum(per_reaction.values(), Microliters(0)).microliters
+    per_tube = int((tube_volume - tube_dead_volume) // (mastermix * (1 + overage)))
+    if per_tube < 1:
+        raise ValueError("A {}uL tube can't hold the mastermix for even one reaction".format(tube_volume))
+    num_tubes = int(math.ceil(num_reactions / float(per_tube)))
+
+    tubes = []
+    for i in range(num_tubes):
+        count = num_reactions // num_tubes + (1 if i < num_reactions % num_tubes else 0)
+        scale = (count * mastermix * (1 + overage) + tube_dead_volume) / mastermix
+        tubes.append((count, OrderedDict(
+            (name, Microliters.from_nl(int(math.ceil(volume.nl * scale / precision.nl)) * precision.nl))
+            for name, volume in per_reaction.items())))
+    return MastermixPlan(per_reaction, tubes)
+
+
+def make_mastermix(p, recipe, reaction_volume, num_reactions, name='mastermix', per_well_volume=0,
+                   overage=0.1, tube_type='micro-1.5'):
+    """
+    Solve and make the mastermix in new tubes named name_1, name_2...
+
+    Components go in largest first, catalog components by one provision each and
+    well components by one transfer each over all tubes, then the tubes are mixed.
+    Every transfer into a tube that already holds something mixes it after, with at
+    most what the tube then holds.
+
+    Returns
+    -------
+    plan : MastermixPlan
+    tube_wells : list of Well
+
+    Raises
+    ------
+    ValueError
+        if the first (largest) component is transferred from a well at under 10uL a
+        tube, with nothing in the tube yet to mix it into
+
+    """
+    plan = solve_mastermix(recipe, reaction_volume, num_reactions, per_well_volume, overage,
+                           p.container_type(tube_type).well_volume_ul.magnitude,
+                           dead_volume[tube_type].magnitude)
+    components = [component for component in sorted(plan.per_reaction,
+                                                     key=lambda component: -plan.per_reaction[component].nl)
+                  if any(volumes[component] for _, volumes in plan.tubes)]
+    first_volume = min(volumes[components[0]] for _, volumes in plan.tubes)
+    if isinstance(recipe[components[0]]['source'], Well) and first_volume < Microliters(10):
+        raise ValueError("{} goes into the empty mastermix tubes first but is only {} a tube, transfers under "
+                         "10uL need something to mix into: add a larger component, e.g. a 'fill' of "
+                         "water".format(components[0], first_volume))
+
+    tube_wells = [p.ref("{}_{}".format(name, i+1) if len(plan.tubes) > 1 else name,
+                        cont_type=tube_type, discard=True).well(0) for i in range(len(plan.tubes))]
+
+    in_tubes = Microliters(0)
+    for component in components:
+        volumes = [volumes[component] for _, volumes in plan.tubes]
+        spec = recipe[component]
+        source = spec['source']
+        if isinstance(source, Well):
+            mix = {}
+            if spec.get('mix_before'):
+                mix.update(mix_before=True)
+                if 'mix_vol' in spec:
+                    mix.update(mix_vol_b=Microliters.of(spec['mix_vol']).unit())
+            if in_tubes:
+                in_tube = in_tubes + min(volumes)
+                mix.update(mix_after=True,
+                           mix_vol_a=min(max(in_tube / 2, Microliters(5)), in_tube, Microliters(900)).unit())
+            p.transfer(source, tube_wells, [volume.unit() for volume in volumes], **mix)
+        else:
+            p.provision(source, tube_wells, [volume.unit() for volume in volumes])
+        in_tubes = in_tubes + min(volumes)
+
+    total = min(sum(volumes.values(), Microliters(0)) for _, volumes in plan.tubes)
+    p.mix(tube_wells, volume=min(total / 2, Microliters(900)).unit(), repetitions=10)
+    return plan, tube_wells
+
+
+def distribute_mastermix(p, plan, tube_wells, wells):
+    """
+    Give each of wells its mastermix, every tube serving its share of the reactions
+
+    Under 10uL a reaction, the mastermix is transferred and mixed into what the wells
+    already hold (template...), so they can't be empty.
+
+    """
+    per_reaction = sum(plan.per_reaction.values(), Microliters(0))
+    mix = {}
+    if per_reaction < Microliters(10):
+        held = min(Microliters.of(well.volume) if well.volume is not None else Microliters(0) for well in wells)
+        if not held:
+            raise ValueError("{} of mastermix a reaction is under 10uL and needs mixing into the wells, "
+                             "add what goes in outside the mastermix first".format(per_reaction))
+        in_well = held + per_reaction
+        mix = dict(mix_after=True, mix_vol=min(max(in_well / 2, Microliters(5)), in_well).unit())
+    first = 0
+    for tube_well, (count, _) in zip(tube_wells, plan.tubes):
+        p.distribute(tube_well, wells[first:first + count], per_reaction.unit(), allow_carryover=True, **mix)
+        first += count
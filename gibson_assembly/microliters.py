@@ -0,0 +1,150 @@
+"""Lightweight fixed-point volume type
+
+Every autoprotocol Unit is a pint quantity: building one parses the unit, and
+comparing two converts between units.  Microliters stores an integer number of
+nanoliters instead, so arithmetic and comparisons are plain int operations and
+0.1 + 0.2 really is 0.3.  CustomProtocol and utils use it for their volume checks.
+Conversion back to a Unit (or a "50.0:microliter" string) happens only where the
+volume is handed to autoprotocol.
+
+"""
+
+import numbers
+
+# nanoliters per unit, for the volume units autoprotocol emits
+_NL_PER_UNIT = {"nanoliter": 1, "microliter": 1000, "milliliter": 1000000, "liter": 1000000000}
+# the same, keyed by pint's units of a Unit, which is much cheaper than str(unit.units)
+_nl_per_units = {}
+
+
+class Microliters(object):
+    """A volume, stored as an integer number of nanoliters
+
+    Microliters(50) is 50uL.  + - accept anything Microliters.of accepts, comparisons
+    are between Microliters only: compare Microliters.of(volume) < Microliters(10),
+    never a Microliters with a Unit, a string or a number (Microliters(50) != 50).
+
+    """
+
+    __slots__ = ('nl',)
+
+    def __init__(self, microliters=0):
+        self.nl = int(round(microliters * 1000))
+
+    @classmethod
+    def from_nl(cls, nl):
+        volume = cls.__new__(cls)
+        volume.nl = nl
+        return volume
+
+    @classmethod
+    def of(cls, volume):
+        """Microliters from a Microliters, a Unit, a "10:microliter" string or a number of microliters"""
+        if isinstance(volume, Microliters):
+            return volume
+        if isinstance(volume, (int, float)):
+            return cls(volume)
+        if isinstance(volume, str):
+            if ':' not in volume:
+                return cls(float(volume))
+            value, unit = volume.split(':')
+            return cls.from_nl(int(round(float(value) * _NL_PER_UNIT[unit.strip()])))
+        if isinstance(volume, numbers.Real):
+            #numpy integers and float32, after the common types
+            return cls(float(volume))
+        #a Unit, only converted by pint if it isn't in a unit we know
+        units = volume._units
+        nl_per_unit = _nl_per_units.get(units)
+        if nl_per_unit is None:
+            nl_per_unit = _nl_per_units[units] = _NL_PER_UNIT.get(str(units))
+            if nl_per_unit is None:
+                return cls(volume.to("microliter").magnitude)
+        return cls.from_nl(int(round(volume.magnitude * nl_per_unit)))
+
+    @property
+    def microliters(self):
+        return self.nl / 1000.0
+
+    def unit(self):
+        """The autoprotocol Unit for this volume"""
+        from autoprotocol import Unit
+        return Unit(self.microliters, "microliter")
+
+    def __str__(self):
+        return "{}:microliter".format(self.microliters)
+
+    def __repr__(self):
+        return "Microliters({:g})".format(self.microliters)
+
+    def __float__(self):
+        return self.microliters
+
+    def __hash__(self):
+        return hash(self.nl)
+
+    def __bool__(self):
+        return self.nl != 0
+
+    def __eq__(self, other):
+        if not isinstance(other, Microliters):
+            return NotImplemented
+        return self.nl == other.nl
+
+    def __ne__(self, other):
+        if not isinstance(other, Microliters):
+            return NotImplemented
+        return self.nl != other.nl
+
+    def __lt__(self, other):
+        if not isinstance(other, Microliters):
+            return NotImplemented
+        return self.nl < other.nl
+
+    def __le__(self, other):
+        if not isinstance(other, Microliters):
+            return NotImplemented
+        return self.nl <= other.nl
+
+    def __gt__(self, other):
+        if not isinstance(other, Microliters):
+            return NotImplemented
+        return self.nl > other.nl
+
+    def __ge__(self, other):
+        if not isinstance(other, Microliters):
+            return NotImplemented
+        return self.nl >= other.nl
+
+    def __add__(self, other):
+        return Microliters.from_nl(self.nl + Microliters.of(other).nl)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Microliters.from_nl(self.nl - Microliters.of(other).nl)
+
+    def __rsub__(self, other):
+        return Microliters.from_nl(Microliters.of(other).nl - self.nl)
+
+    def __neg__(self):
+        return Microliters.from_nl(-self.nl)
+
+    def __mul__(self, factor):
+        return Microliters.from_nl(int(round(self.nl * factor)))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        """Volume / number is a volume, volume / volume a ratio"""
+        if isinstance(other, numbers.Real):
+            return Microliters.from_nl(int(round(self.nl / other)))
+        return self.nl / Microliters.of(other).nl
+
+
+def to_unit(volume):
+    """Unit for a Microliters (or a list of them), anything else is returned as is"""
+    if isinstance(volume, Microliters):
+        return volume.unit()
+    if isinstance(volume, list):
+        return [to_unit(v) for v in volume]
+    return volume
@@ -0,0 +1,268 @@
+"""Hairpin and primer-dimer screening of oligos before they are synthesized
+
+A bad primer costs a synthesis and a failed PCR, so oligosynthesis screens every
+oligo of a submission first:
+
+* hairpins: the most stable stem (at least MIN_STEM base pairs, loop at least
+  MIN_LOOP bases) anywhere in the oligo, found for a whole batch of oligos at once from their base pairing matrices
+* 3' dimers: the longest stretch at an oligo's 3' end that is complementary to
+  any part of itself (self-dimer) or of another oligo of the batch (cross-dimer),
+  which a polymerase can extend.  Every k-mer of the batch is indexed as an
+  integer, so checking every 3' end against every oligo is a sorted lookup per k
+  instead of a pass over every pair
+
+Each structure is scored by its melting temperature from the SantaLucia
+nearest-neighbor parameters of primer_design (hairpins unimolecular, dimers at
+the PCR primer concentration), and oligos whose hairpin or 3' dimer melts at
+MAX_TM or above fail, as in Primer3's thermodynamic checks.  Dangling ends and
+mismatches are ignored, so the Tms are estimates.  Oligos with degenerate (N, R,
+K...) or other non-ACGT bases have no nearest-neighbor parameters: they are
+reported unscreened and let through rather than failed.
+
+Usage:
+    python oligo_screen.py oligos.csv        (name,sequence,... columns)
+    python oligo_screen.py SEQUENCE [SEQUENCE ...]
+
+"""
+
+import logging
+import numpy as np
+from primer_design import nearest_neighbors, initiation, R, SODIUM, PRIMER
+
+SCREEN = np.dtype([('name', 'U64'), ('hairpin_tm', np.float64), ('hairpin_stem', np.int64),
+                   ('self_dimer_tm', np.float64), ('self_dimer_length', np.int64),
+                   ('cross_dimer_tm', np.float64), ('cross_dimer_length', np.int64), ('cross_dimer_with', 'U64'),
+                   ('screened', np.bool_), ('passed', np.bool_)])
+
+MAX_TM = 47.0           # C, Primer3's default for hairpins and 3' dimers
+MIN_STEM = 4
+MIN_LOOP = 3
+MIN_DIMER = 4
+MAX_DIMER = 20          # longer 3' complementarity is reported as this long
+
+# hairpin loop dG (kcal/mol, 37C) by loop size, SantaLucia & Hicks 2004
+_LOOP_SIZES = np.array([3, 4, 5, 6, 7, 8, 9, 10, 12, 14, 16, 18, 20, 25, 30])
+_LOOP_DG = np.array([3.5, 3.5, 3.3, 4.0, 4.2, 4.3, 4.5, 4.6, 5.0, 5.1, 5.3, 5.5, 5.7, 6.1, 6.3])
+
+_CODE = np.full(256, -1, dtype=np.int64)
+for _code, _base in enumerate('ACGT'):
+    _CODE[ord(_base)], _CODE[ord(_base.lower())] = _code, _code
+
+
+def screenable(sequence):
+    """Whether sequence only holds A, C, G and T (either case), the bases the checks have parameters for"""
+    return len(sequence) > 0 and (_CODE[np.frombuffer(sequence.encode('latin-1'), dtype=np.uint8)] >= 0).all()
+
+
+def _encode(sequences):
+    """
+    codes (oligos x longest, -1 past the end; complementary bases sum to 3), the dH and
+    dS of every nearest neighbor and the initiation dH and dS of every base
+    """
+    longest = max(len(sequence) for sequence in sequences)
+    codes = np.full((len(sequences), longest), -1, dtype=np.int64)
+    dh, ds = np.zeros((2, len(sequences), max(longest - 1, 1)))
+    init_dh, init_ds = np.zeros((2, len(sequences), longest))
+    for i, sequence in enumerate(sequences):
+        codes[i, :len(sequence)] = _CODE[np.frombuffer(sequence.encode('latin-1'), dtype=np.uint8)]
+        dh[i, :len(sequence) - 1], ds[i, :len(sequence) - 1] = nearest_neighbors(sequence)
+        init_dh[i, :len(sequence)], init_ds[i, :len(sequence)] = initiation(sequence)
+    return codes, dh, ds, init_dh, init_ds
+
+
+def loop_dg(loop):
+    """dG (kcal/mol, 37C) of hairpin loops of loop bases, extrapolated logarithmically past 30"""
+    loop = np.asarray(loop, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(loop > 30, _LOOP_DG[-1] + 2.44 * R / 1000 * 310.15 * np.log(loop / 30),
+                        np.interp(loop, _LOOP_SIZES, _LOOP_DG))
+
+
+def hairpins(sequences, min_stem=MIN_STEM, min_loop=MIN_LOOP, sodium=SODIUM, batch=256):
+    """
+    Most stable hairpin of every oligo
+
+    Returns
+    -------
+    tm, stem : ndarray
+        Tm (C) and stem base pairs of each oligo's highest melting hairpin, nan and 0
+        for oligos that can't form one
+
+    """
+    tms, stems = np.full(len(sequences), np.nan), np.zeros(len(sequences), dtype=np.int64)
+    for first in range(0, len(sequences), batch):
+        codes, dh, ds = _encode(sequences[first:first + batch])[:3]
+        n, length = codes.shape
+        pairs = codes[:, :, None] + codes[:, None, :] == 3       # [oligo, a, b]: base a pairs with base b
+        # [a, b]: base pairs stacked outward from (a, b), i.e. (a-1, b+1), (a-2, b+2)..., and their dH and dS
+        run = np.zeros((n, length, length), dtype=np.int64)
+        stem_dh, stem_ds = np.zeros((2, n, length, length))
+        run[:, 0] = pairs[:, 0]
+        for a in range(1, length):
+            outer_run = np.zeros((n, length), dtype=np.int64)
+            outer_dh, outer_ds = np.zeros((2, n, length))
+            outer_run[:, :-1], outer_dh[:, :-1], outer_ds[:, :-1] = \
+                run[:, a - 1, 1:], stem_dh[:, a - 1, 1:], stem_ds[:, a - 1, 1:]
+            stacked = outer_run > 0
+            run[:, a] = pairs[:, a] * (1 + outer_run)
+            stem_dh[:, a] = pairs[:, a] * (outer_dh + np.where(stacked, dh[:, a - 1:a], 0))
+            stem_ds[:, a] = pairs[:, a] * (outer_ds + np.where(stacked, ds[:, a - 1:a], 0))
+
+        loop = np.arange(length)[None, :] - np.arange(length)[:, None] - 1        # (a, b) innermost pair
+        # the loop costs entropy only; unimolecular, so no concentration term
+        loop_ds = -1000 * loop_dg(np.maximum(loop, 0)) / 310.15
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tm = 1000 * stem_dh / (stem_ds + 0.368 * (run - 1) * np.log(sodium) + loop_ds) - 273.15
+        tm = np.where((run >= min_stem) & (loop >= min_loop)[None], tm, -np.inf).reshape(n, -1)
+        best = tm.argmax(axis=1)
+        found = np.isfinite(tm[np.arange(n), best])
+        tms[first:first + n] = np.where(found, tm[np.arange(n), best], np.nan)
+        stems[first:first + n] = np.where(found, run.reshape(n, -1)[np.arange(n), best], 0)
+    return tms, stems
+
+
+def three_prime_dimers(sequences, min_length=MIN_DIMER, max_length=MAX_DIMER, sodium=SODIUM, primer=PRIMER):
+    """
+    3' complementarity of every oligo with every oligo
+
+    Returns
+    -------
+    length, tm : ndarray
+        oligos x oligos, [i, j] the longest stretch at the 3' end of oligo i that is
+        complementary to part of oligo j, and the highest Tm (C) of such a stretch;
+        0 and nan where none is min_length long
+
+    """
+    codes, dh, ds, init_dh, init_ds = _encode(sequences)
+    n, longest = codes.shape
+    rows = np.arange(n)
+    lengths = np.array([len(sequence) for sequence in sequences])
+    length, tm = np.zeros((n, n), dtype=np.int64), np.full((n, n), np.nan)
+
+    kmers = np.zeros((n, longest), dtype=np.int64)     # [oligo, p]: k-mer starting at p, 2 bits a base
+    kmer_valid = np.ones((n, longest), dtype=bool)
+    query = np.zeros(n, dtype=np.int64)                # reverse complement of each oligo's 3' k-mer
+    query_dh, query_ds = np.zeros((2, n))
+    last = np.maximum(lengths - 1, 0)
+    for k in range(1, max_length + 1):
+        kmers[:, :longest - k + 1] = 4 * kmers[:, :longest - k + 1] + codes[:, k - 1:]
+        kmer_valid[:, :longest - k + 1] &= codes[:, k - 1:] >= 0
+        kmer_valid[:, longest - k + 1:] = False
+        base = np.maximum(lengths - k, 0)
+        query_valid = (lengths >= k) & (codes[rows, base] >= 0)
+        query = 4 * query + 3 - codes[rows, base]
+        if k > 1:
+            query_dh += dh[rows, base]
+            query_ds += ds[rows, base]
+        if k < min_length:
+            continue
+
+        # sorted, unique (k-mer, oligo) keys; each query's hits are a contiguous run of them
+        keys = np.unique(kmers[kmer_valid] * n + np.nonzero(kmer_valid)[0])
+        lo = np.searchsorted(keys, query * n)
+        hi = np.searchsorted(keys, (query + 1) * n)
+        counts = np.where(query_valid, hi - lo, 0)
+        if not counts.sum():
+            break
+        query_tm = 1000 * (query_dh + init_dh[rows, base] + init_dh[rows, last]) / \
+            (query_ds + init_ds[rows, base] + init_ds[rows, last] + 0.368 * (k - 1) * np.log(sodium)
+             + R * np.log(primer / 4)) - 273.15
+        i = np.repeat(rows, counts)
+        j = keys[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())] % n
+        length[i, j], tm[i, j] = k, np.fmax(tm[i, j], query_tm[i])
+    return length, tm
+
+
+def screen_oligos(oligos, max_tm=MAX_TM):
+    """
+    Screen a batch of oligos
+
+    Parameters
+    ----------
+    oligos : list of (name, sequence)
+    max_tm : float
+        C, oligos with a hairpin or 3' dimer melting at this or above fail
+
+    Returns
+    -------
+    ndarray of SCREEN
+        one row per oligo: its highest melting hairpin, 3' self-dimer and 3' cross-dimer
+        (with the oligo it forms with; either oligo's 3' end), whether it could be
+        screened (see screenable) and whether it passed; unscreened oligos pass
+
+    """
+    names = np.array([name for name, _ in oligos], dtype='U64')
+    table = np.zeros(len(oligos), dtype=SCREEN)
+    table['name'] = names
+    table['screened'] = [screenable(sequence) for _, sequence in oligos]
+    for field in ['hairpin_tm', 'self_dimer_tm', 'cross_dimer_tm']:
+        table[field] = np.nan
+    screened = np.nonzero(table['screened'])[0]
+    if not len(screened):
+        table['passed'] = True
+        return table
+    sequences = [oligos[i][1] for i in screened]
+    table['hairpin_tm'][screened], table['hairpin_stem'][screened] = hairpins(sequences)
+
+    length, tm = three_prime_dimers(sequences)
+    diagonal = np.arange(len(sequences))
+    table['self_dimer_tm'][screened] = tm[diagonal, diagonal]
+    table['self_dimer_length'][screened] = length[diagonal, diagonal]
+    # either 3' end of a pair can be extended
+    cross_tm = np.fmax(tm, tm.T)
+    cross_tm[diagonal, diagonal] = np.nan
+    partner = np.argmax(np.where(np.isnan(cross_tm), -np.inf, cross_tm), axis=1)
+    table['cross_dimer_tm'][screened] = cross_tm[diagonal, partner]
+    table['cross_dimer_length'][screened] = np.maximum(length[diagonal, partner], length[partner, diagonal])
+    table['cross_dimer_with'][screened] = np.where(np.isnan(cross_tm[diagonal, partner]), '',
+                                                   names[screened][partner])
+    with np.errstate(invalid='ignore'):
+        table['passed'] = ~((table['hairpin_tm'] >= max_tm) | (table['self_dimer_tm'] >= max_tm) |
+                            (table['cross_dimer_tm'] >= max_tm))
+    return table
+
+
+def _format_tm(tm, base_pairs):
+    return '-' if np.isnan(tm) else '{:.1f}C/{}'.format(tm, base_pairs)
+
+
+def format_screen(table, max_tm=MAX_TM):
+    lines = ['{:<40} {:>12} {:>12} {:>12}  {}'.format('oligo', 'hairpin', "self 3'", "cross 3'", '')]
+    for row in table:
+        failed = [check for check, tm in [('hairpin', row['hairpin_tm']), ('self-dimer', row['self_dimer_tm']),
+                                          ('cross-dimer with ' + row['cross_dimer_with'], row['cross_dimer_tm'])]
+                  if tm >= max_tm]
+        lines.append('{:<40} {:>12} {:>12} {:>12}  {}'.format(
+            row['name'], _format_tm(row['hairpin_tm'], row['hairpin_stem']),
+            _format_tm(row['self_dimer_tm'], row['self_dimer_length']),
+            _format_tm(row['cross_dimer_tm'], row['cross_dimer_length']),
+            'FAIL: ' + ', '.join(failed) if failed else
+            'ok' if row['screened'] else 'unscreened: not only A, C, G and T'))
+    return '\n'.join(lines)
+
+
+def check_oligos(oligos, max_tm=MAX_TM):
+    """screen_oligos, raising ValueError listing every oligo that failed and warning about unscreened ones"""
+    table = screen_oligos(oligos, max_tm)
+    if not table['screened'].all():
+        logging.warning("Oligos with degenerate or non-ACGT bases, not screened for hairpins or dimers: " +
+                        ", ".join(table['name'][~table['screened']]))
+    if not table['passed'].all():
+        raise ValueError("Oligos that would fold or dimerize (Tm/base pairs):\n" +
+                         format_screen(table[~table['passed']], max_tm))
+    return table
+
+
+if __name__ == '__main__':
+    import csv
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('oligos', nargs='+', help='csv with name and sequence columns, or sequences')
+    args = parser.parse_args()
+
+    if args.oligos[0].endswith('.csv'):
+        with open(args.oligos[0]) as f:
+            oligos = [(row['name'], row['sequence']) for row in csv.DictReader(f)]
+    else:
+        oligos = [('oligo_{}'.format(i + 1), sequence) for i, sequence in enumerate(args.oligos)]
+    print(format_screen(screen_oligos(oligos)))
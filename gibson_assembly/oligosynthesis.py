@@ -1,53 +1,147 @@
-import json
-from autoprotocol.protocol import Protocol
-from utils import ul
-
-inv = {
-    'te': 'rs17pwyc754v9t',           # catalog; TE
-}
-
-def get_synthesized_oligo_tube_protocol(tube_name, sequence):
-    """
-
-    Synthesize and prepare an oligo tube
-    25nm seems to be more than enough for most downstream work (25pmol seems to be all that is used for transcriptic's pcr)
-    
-    """
-    global inv
-    
-    scale = '25nm'
-    
-    p = Protocol()
-
-    dna_tube = p.ref(tube_name, 
-                       cont_type="micro-1.5",
-                       storage="cold_20", discard=False)
-    
-    dna_tube.well(0).properties = {'Molar Concentration':'100uM',
-                                   'original moles':'25nm'}
-    
-    p.oligosynthesize([{"sequence": sequence,
-                        "destination": dna_tube.well(0),
-                        "scale": scale,
-                        "purification": "standard"}]
-                      )
-    
-    #spin
-    p.spin(dna_tube, '2000:g', '30:second')
-    
-    
-    #dilute to 100uM
-    #safe min volume of 1.5uL is 20uL so we want a lot more than this so we don't lose too much
-    #how do you go from scale and desired concentration to volume --> n = CV --> V = n/C --> V = 25nmol / 100uM = 25nmol / (100E3 nmol / 1L)
-    #          = 2.5E-4 L = 250 uL
-    
-                      #convert 100uM to nM #convert to uL
-    te_volume = 25 / (100 * pow(10, 3)) * pow(10, 6) 
-    
-    #add 250uL
-    p.provision(inv["te"], dna_tube.well(0), ul(te_volume))
-
-    #spin
-    p.spin(dna_tube, '2000:g', '30:second')
-    
-    return json.dumps(p.as_dict(), indent=2)
\ No newline at end of file
+import json
+from autoprotocol.protocol import Protocol
+from utils import ul
+from oligo_screen import check_oligos
+
+inv = {
+    'te': 'rs17pwyc754v9t',           # catalog; TE
+}
+
+# nmol per synthesis scale transcriptic offers
+_scale_nmol = {'25nm': 25, '100nm': 100, '250nm': 250, '1um': 1000}
+
+def get_synthesized_oligo_tube_protocol(tube_name, sequence, screen=True):
+    """
+
+    Synthesize and prepare an oligo tube
+    25nm seems to be more than enough for most downstream work (25pmol seems to be all that is used for transcriptic's pcr)
+    Unless screen is False, raises ValueError if the oligo would form a hairpin or 3' self-dimer (see oligo_screen)
+    
+    """
+    global inv
+    
+    if screen:
+        check_oligos([(tube_name, sequence)])
+    
+    scale = '25nm'
+    
+    p = Protocol()
+
+    dna_tube = p.ref(tube_name, 
+                       cont_type="micro-1.5",
+                       storage="cold_20", discard=False)
+    
+    dna_tube.well(0).properties = {'Molar Concentration':'100uM',
+                                   'original moles':'25nm'}
+    
+    p.oligosynthesize([{"sequence": sequence,
+                        "destination": dna_tube.well(0),
+                        "scale": scale,
+                        "purification": "standard"}]
+                      )
+    
+    #spin
+    p.spin(dna_tube, '2000:g', '30:second')
+    
+    
+    #dilute to 100uM
+    #safe min volume of 1.5uL is 20uL so we want a lot more than this so we don't lose too much
+    #how do you go from scale and desired concentration to volume --> n = CV --> V = n/C --> V = 25nmol / 100uM = 25nmol / (100E3 nmol / 1L)
+    #          = 2.5E-4 L = 250 uL
+    
+                      #convert 100uM to nM #convert to uL
+    te_volume = 25 / (100 * pow(10, 3)) * pow(10, 6) 
+    
+    #add 250uL
+    p.provision(inv["te"], dna_tube.well(0), ul(te_volume))
+
+    #spin
+    p.spin(dna_tube, '2000:g', '30:second')
+    
+    return json.dumps(p.as_dict(), indent=2)
+
+
+def te_volumes_ul(scales, concentrations_uM):
+    """TE (uL) to resuspend oligos of the given scales ('25nm'...) at the given concentrations (uM)
+    
+    n = CV --> V = n/C, e.g. 25nmol / 100uM = 250uL
+    
+    """
+    import numpy
+    nmol = numpy.array([_scale_nmol[scale] for scale in scales], dtype=float)
+    return nmol / numpy.asarray(concentrations_uM, dtype=float) * 1000
+
+
+def get_synthesized_oligo_plate_protocol(oligos, plate_name='oligos', cont_type='96-flat',
+                                         purification='standard', p=None, screen=True):
+    """
+    Synthesize and resuspend many oligos on plates in one protocol
+    
+    One oligosynthesize instruction covers every oligo, then each plate is spun, gets
+    its TE in one provision and is spun again.  A new plate (plate_name_2, ...) is
+    started whenever one is full.
+    
+    Parameters
+    ----------
+    oligos : list of (name, sequence, scale, concentration in uM)
+    plate_name : str
+        name of the (first) plate
+    cont_type : str
+        a plate type that can be spun, with wells big enough for the TE
+    purification : str
+        'standard', 'page' or 'hplc'
+    p : Protocol, optional
+        protocol to add to, a new one by default
+    screen : bool
+        check the oligos for hairpins and 3' self- or cross-dimers with another oligo
+        of the batch (see oligo_screen) before anything is added to p
+    
+    Returns
+    -------
+    Protocol
+    
+    Raises
+    ------
+    ValueError
+        if screen finds an oligo that would misfold, or an oligo needs more TE than
+        a well of cont_type holds
+    
+    """
+    names, sequences, scales, concentrations = zip(*oligos)
+    if screen:
+        check_oligos(list(zip(names, sequences)))
+    te_volumes = te_volumes_ul(scales, concentrations)
+    
+    p = p or Protocol()
+    capacity = p.container_type(cont_type).well_count
+    max_volume = p.container_type(cont_type).well_volume_ul.magnitude
+    if te_volumes.max() > max_volume:
+        raise ValueError("{} needs {:g}uL of TE but {} wells hold {:g}uL, use a higher concentration or "
+                         "a smaller scale".format(names[te_volumes.argmax()], te_volumes.max(), cont_type, max_volume))
+    
+    plates = [p.ref(plate_name if i == 0 else "{}_{}".format(plate_name, i+1),
+                    cont_type=cont_type, storage="cold_20", discard=False)
+              for i in range(0, (len(oligos) + capacity - 1) // capacity)]
+    wells = [plates[i // capacity].well(i % capacity) for i in range(len(oligos))]
+    
+    for well, name, scale, concentration in zip(wells, names, scales, concentrations):
+        well.name = name
+        well.properties = {'Molar Concentration': '{:g}uM'.format(concentration),
+                           'original moles': scale}
+    
+    p.oligosynthesize([{"sequence": sequence,
+                        "destination": well,
+                        "scale": scale,
+                        "purification": purification} for well, sequence, scale in zip(wells, sequences, scales)])
+    
+    for plate in plates:
+        p.spin(plate, '2000:g', '30:second')
+    
+    for i in range(len(plates)):
+        p.provision(inv["te"], wells[i*capacity:(i+1)*capacity],
+                    [ul(volume) for volume in te_volumes[i*capacity:(i+1)*capacity]])
+    
+    for plate in plates:
+        p.spin(plate, '2000:g', '30:second')
+    
+    return p
@@ -4,11 +4,14 @@ Derived from Brian Naughton @ http://blog.booleanbiotech.com/genetic_engineering
 
 """
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
-from utils import (ul, expid, init_inventory_well, touchdown,
+from utils import (ul, expid, init_inventory_wells,
                    dead_volume)
+from collections import OrderedDict
+from mastermix import make_mastermix, distribute_mastermix
+from thermocycle_program import ThermocycleProgram
 import numpy
+from protocol_writer import dump_protocol
 
 
 p = Protocol()
@@ -71,52 +74,46 @@ dNTP_well = pcr_reagent_plate.wells(["B1"])[0]
 sfgfp_pcroe_out_tube = p.ref(expid("amplified",experiment_name), cont_type="micro-1.5", storage="cold_20").well(0)
 
 # Temporary tubes for use, then discarded (you can't set storage if you are going to discard)
-mastermix_well = p.ref("mastermix", cont_type="micro-1.5", discard=True).well(0)
 water_well =     p.ref("water",     cont_type="micro-1.5", discard=True).well(0)
 pcr_plate =      p.ref("pcr_plate", cont_type="96-pcr", discard=True)
 
 # Initialize all existing inventory
 all_inventory_wells = [template_tube] + primer_wells
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
 
 # -----------------------------------------------------
 # Provision water once, for general use
 #
-p.provision(inv["water"], water_well, ul(500))
+p.provision_as_needed(inv["water"], water_well)
 
 # -----------------------------------------------------
 # Q5 PCR protocol
 # www.neb.com/protocols/2013/12/13/pcr-using-q5-high-fidelity-dna-polymerase-m0491
 #
-# 25ul reaction (we will run it 4 times, totally 100uL of solution)
-# -------------                      4rxn total
-# Q5 reaction buffer      5    ul --> 20uL
-# Q5 polymerase           0.25 ul --> 1uL
-# 10mM dNTP               0.5  ul --> 2uL
-# 10uM forward primer     1.25 ul --> 5uL
-# 10uM reverse primer     1.25 ul --> 5uL
-# 1ng Template (1 ng/ul) 1 ul --> 4uL (1ng/ul concentration) 
-# water                   
-# -------------------------------
-# Sum                     9.25 ul --> 37uL
-# water                   15.75 uL --> 63uL
+# 25ul reaction (we will run it 4 times: 3 with template and A2 without)
+# -------------
+# Q5 reaction buffer      1x    (5x stock)
+# Q5 polymerase           0.25 ul
+# 10mM dNTP               200uM
+# 10uM forward primer     0.5uM
+# 10uM reverse primer     0.5uM
+# 1ng Template (1 ng/ul)  1 ul, added to each well after the mastermix
+# water                   to 25 ul
 #
+# make_mastermix scales this to 4 reactions plus overage and the tube's dead volume
 #
-
-# Mastermix tube will have 96ul of stuff, leaving space for 3x1ul aliquots of template
-p.transfer(water_well,                mastermix_well, ul(63))
-p.transfer(q5_buffer_well, mastermix_well, ul(20), mix_before=True, mix_vol=ul(20), mix_after=True)
-p.transfer(q5_poly_well, mastermix_well, ul(1), mix_before=True, mix_vol=ul(5), mix_after=True)
-p.transfer(dNTP_well, mastermix_well, ul(2), mix_before=True, mix_vol=ul(5), mix_after=True)
-p.transfer(primer_wells[0], mastermix_well, ul(5), mix_before=True, mix_vol=ul(10), mix_after=True)
-p.transfer(primer_wells[1], mastermix_well, ul(5), mix_before=True, mix_vol=ul(10), mix_after=True)
-p.mix(mastermix_well, volume="48:microliter", repetitions=10)
+recipe = OrderedDict([
+    ('water',      {'source': water_well, 'fill': True}),
+    ('Q5 buffer',  {'source': q5_buffer_well, 'concentration': '1x', 'stock': '5x', 'mix_before': True, 'mix_vol': 20}),
+    ('polymerase', {'source': q5_poly_well, 'volume': 0.25, 'mix_before': True, 'mix_vol': 5}),
+    ('dNTP',       {'source': dNTP_well, 'concentration': '200uM', 'stock': '10mM', 'mix_before': True, 'mix_vol': 5}),
+    ('forward',    {'source': primer_wells[0], 'concentration': '0.5uM', 'stock': '10uM', 'mix_before': True, 'mix_vol': 10}),
+    ('reverse',    {'source': primer_wells[1], 'concentration': '0.5uM', 'stock': '10uM', 'mix_before': True, 'mix_vol': 10}),
+])
+plan, (mastermix_well,) = make_mastermix(p, recipe, ul(25), 4, per_well_volume=ul(1))
 
 # Transfer mastermix to pcr_plate without template
-p.transfer(mastermix_well, pcr_plate.wells(["A1","B1","C1"]), ul(24))
-#
-p.transfer(mastermix_well, pcr_plate.wells(["A2"]),           ul(24)) # acknowledged dead volume problems
+distribute_mastermix(p, plan, [mastermix_well], pcr_plate.wells(["A1","B1","C1","A2"]))
 p.mix(pcr_plate.wells(["A1","B1","C1","A2"]), volume=ul(12), repetitions=10)
 
 # Finally add template
@@ -131,14 +128,13 @@ p.mix(pcr_plate.wells(["A1","B1","C1"]), volume=ul(12.5), repetitions=10)
 extension_time = int(max(2, numpy.ceil(template_length * (11.0/1000))))
 assert 0 < extension_time < 60, "extension time should be reasonable for PCR"
 
-cycles = [{"cycles":  1, "steps": [{"temperature": "98:celsius", "duration": "30:second"}]}] + \
-    touchdown(74.8, 59.8, [8, 25, extension_time], stepsize=1) +\
-    [{"cycles": 20, "steps": [{"temperature": "98:celsius", "duration": "8:second"},
-                              {"temperature": "59.8:celsius", "duration": "25:second"},
-                              {"temperature": "72:celsius", "duration": "{:d}:second".format(extension_time)}]},
-     {"cycles":  1, "steps": [{"temperature": "72:celsius", "duration": "2:minute"}]}]
+program = ThermocycleProgram() \
+    .hold(98, 30) \
+    .touchdown(74.8, 59.8, [8, 25, extension_time], stepsize=1) \
+    .add([(98, 8), (59.8, 25), (72, extension_time)], cycles=20) \
+    .hold(72, 120)
 p.seal(pcr_plate)
-p.thermocycle(pcr_plate, cycles, volume=ul(25))
+p.thermocycle(pcr_plate, program, volume=ul(25))
 p.unseal(pcr_plate)
 # --------------------------------------------------------
 # Run a gel
@@ -160,4 +156,4 @@ if 'run_gel' in options:
 remaining_volumes = [well.volume - dead_volume['96-pcr'] for well in pcr_plate.wells(["A1","B1","C1"])]
 p.consolidate(pcr_plate.wells(["A1","B1","C1"]), sfgfp_pcroe_out_tube, remaining_volumes, allow_carryover=True)
 
-print(json.dumps(p.as_dict(), indent=2))
+dump_protocol(p)
@@ -0,0 +1,234 @@
+"""Plate-scale Q5 PCR
+
+pcr.py runs one template with one primer pair.  plate_pcr takes a whole table of
+reactions (template x primer pair, with the template length) and:
+
+* groups reactions whose thermocycle programs are compatible (same touchdown, same
+  extension time after rounding it up to extension_step seconds) onto the same
+  plates, since a plate can only run one program; reactions with their own anneal
+  (from primer_design) touch down to it, rounded down to a whole degree
+* makes the mastermix (water, buffer, polymerase, dNTPs) for each plate in as few
+  micro-2.0 tubes as fit it, with overage and dead volume (see mastermix), and
+  distributes it
+* adds primers and templates in bulk transfers, seals and thermocycles every plate
+* optionally prepares gel samples for every reaction and runs them
+
+anneal_gradient_screen runs one template and primer pair at a gradient of annealing
+temperatures instead, to find the annealing temperature for a new primer pair in
+one run.
+
+Q5 recipe per 25uL reaction, from
+www.neb.com/protocols/2013/12/13/pcr-using-q5-high-fidelity-dna-polymerase-m0491
+
+"""
+
+import math
+import numpy as np
+from collections import namedtuple, OrderedDict
+from utils import ul, dead_volume
+from mastermix import make_mastermix, distribute_mastermix
+from thermocycle_program import ThermocycleProgram
+
+# anneal (C), optional: the primer pair's own annealing temperature, e.g. primer_design.PrimerPair.anneal
+PCRReaction = namedtuple('PCRReaction', ['name', 'template', 'forward', 'reverse', 'template_length', 'anneal'])
+PCRReaction.__new__.__defaults__ = (None,)
+
+REACTION_VOLUME = 25
+# per reaction (uL), added to each well separately from the mastermix
+PRIMER_VOLUME = 1.25
+TEMPLATE_VOLUME = 1
+
+MASTERMIX_TUBE = 'micro-2.0'
+
+
+def extension_time(template_length, step=1):
+    """Q5 extension time (s) for an amplicon, rounded up to a multiple of step"""
+    seconds = max(2, int(math.ceil(template_length * (11.0/1000))))
+    return int(math.ceil(seconds / float(step)) * step)
+
+
+def q5_touchdown_program(extension, touchdown_from=74.8, anneal=59.8, cycles=20):
+    """The ThermocycleProgram pcr.py runs: hot start, touchdown to anneal, cycles, final extension"""
+    return ThermocycleProgram() \
+        .hold(98, 30) \
+        .touchdown(touchdown_from, anneal, [8, 25, extension], stepsize=1) \
+        .add([(98, 8), (anneal, 25), (72, extension)], cycles=cycles) \
+        .hold(72, 120)
+
+
+def q5_recipe(water, reagents):
+    """Mastermix recipe (see mastermix) of water, Q5 buffer, polymerase and dNTPs"""
+    return OrderedDict([('water',      {'source': water, 'fill': True}),
+                        ('buffer',     {'source': reagents['buffer'], 'concentration': '1x', 'stock': '5x',
+                                        'mix_before': True, 'mix_vol': 20}),
+                        ('polymerase', {'source': reagents['polymerase'], 'volume': 0.25,
+                                        'mix_before': True, 'mix_vol': 5}),
+                        ('dntp',       {'source': reagents['dntp'], 'concentration': '200uM', 'stock': '10mM',
+                                        'mix_before': True, 'mix_vol': 5})])
+
+
+def gradient_temperatures(bottom, top, rows=8):
+    """Nominal annealing temperature of each plate row, row A at bottom and the last row at top"""
+    return np.linspace(bottom, top, rows)
+
+
+def group_reactions(reactions, extension_step=5, touchdown_from=74.8, anneal=59.8):
+    """{(touchdown_from, anneal, extension seconds): [reactions]}, shortest extension first"""
+    groups = OrderedDict()
+    for reaction in sorted(reactions, key=lambda reaction: reaction.template_length):
+        if reaction.anneal is None:
+            key = (touchdown_from, anneal)
+        else:
+            # a whole degree lets more reactions share a plate, and rounding down keeps every pair annealing
+            reaction_anneal = float(math.floor(reaction.anneal))
+            key = (round(reaction_anneal + touchdown_from - anneal, 1), reaction_anneal)
+        key += (extension_time(reaction.template_length, extension_step),)
+        groups.setdefault(key, []).append(reaction)
+    return groups
+
+
+def plate_pcr(p, reactions, reagents, water, plate_type="96-pcr", plate_name="pcr_plate",
+              overage=0.1, extension_step=5, touchdown_from=74.8, anneal=59.8, cycles=20,
+              storage="cold_20", gel=False, gel_volume=20, gel_product_volume=2, dataref="pcr_gel"):
+    """
+    Build a plate-scale PCR into protocol p
+
+    Parameters
+    ----------
+    p : CustomProtocol
+    reactions : list of PCRReaction
+        template, forward and reverse are Wells
+    reagents : dict
+        'buffer', 'polymerase' and 'dntp' Wells
+    water : str
+        catalog id of the water provisioned into the mastermix tubes
+    plate_type : str
+        96-pcr or 384-pcr
+    overage : float
+        extra mastermix made, as a fraction of what the reactions use
+    extension_step : int
+        extension times are rounded up to multiples of this, so more reactions share a program
+    gel : bool
+        also dilute gel_product_volume of every reaction into gel_volume and run a gel
+
+    Returns
+    -------
+    wells : OrderedDict
+        reaction name -> Well holding the product
+
+    """
+    well_count = p.container_type(plate_type).well_count
+    wells = OrderedDict()
+    plate_number = 0
+    for (program_from, program_anneal, extension), group in \
+            group_reactions(reactions, extension_step, touchdown_from, anneal).items():
+        for start in range(0, len(group), well_count):
+            plate_reactions = group[start:start + well_count]
+            plate_number += 1
+            name = plate_name if plate_number == 1 else "{}_{}".format(plate_name, plate_number)
+            plate = p.ref(name, cont_type=plate_type, storage=storage)
+            reaction_wells = plate.wells_from(0, len(plate_reactions))
+            for well, reaction in zip(reaction_wells, plate_reactions):
+                well.name = reaction.name
+                wells[reaction.name] = well
+
+            # mastermix, in as few tubes as hold it
+            plan, tube_wells = make_mastermix(p, q5_recipe(water, reagents), REACTION_VOLUME, len(plate_reactions),
+                                              name="{}_mastermix".format(name),
+                                              per_well_volume=2*PRIMER_VOLUME + TEMPLATE_VOLUME,
+                                              overage=overage, tube_type=MASTERMIX_TUBE)
+            distribute_mastermix(p, plan, tube_wells, reaction_wells)
+
+            # primers and templates, each one transfer over the whole plate
+            p.transfer([reaction.forward for reaction in plate_reactions], reaction_wells, ul(PRIMER_VOLUME),
+                       mix_after=True, mix_vol=ul(5))
+            p.transfer([reaction.reverse for reaction in plate_reactions], reaction_wells, ul(PRIMER_VOLUME),
+                       mix_after=True, mix_vol=ul(5))
+            p.transfer([reaction.template for reaction in plate_reactions], reaction_wells, ul(TEMPLATE_VOLUME),
+                       mix_after=True, mix_vol=ul(10))
+
+            p.seal(plate)
+            p.thermocycle(plate, q5_touchdown_program(extension, program_from, program_anneal, cycles),
+                          volume=ul(REACTION_VOLUME))
+            p.unseal(plate)
+
+            if gel:
+                gel_plate = p.ref("{}_gel".format(name), cont_type=plate_type, discard=True)
+                gel_wells = gel_plate.wells_from(0, len(plate_reactions))
+                # leave the dead volume behind after loading gel_volume
+                p.provision(water, gel_wells,
+                            ul(gel_volume + dead_volume[plate_type].magnitude - gel_product_volume))
+                p.transfer(reaction_wells, gel_wells, ul(gel_product_volume), mix_after=True, mix_vol=ul(10))
+                p.gel_separate(gel_wells, ul(gel_volume), "agarose(10,2%)", "ladder1", "10:minute",
+                               "{}_{}".format(dataref, plate_number))
+    return wells
+
+
+def anneal_gradient_screen(p, template, forward, reverse, template_length, reagents, water,
+                           bottom=55, top=68, plate_type="96-pcr", plate_name="gradient_pcr", column=0,
+                           overage=0.1, cycles=30, storage="cold_20", gel=True, gel_volume=20,
+                           gel_product_volume=2, dataref="gradient_gel"):
+    """
+    Screen annealing temperatures for one template and primer pair in one run
+
+    The thermocycler's gradient runs across the plate's rows, so one reaction goes
+    in every row of column, all from one mastermix holding the template and primers,
+    and the annealing step is a bottom..top gradient step.  The gel lanes are in the
+    same order, coolest first.
+
+    Parameters
+    ----------
+    p : CustomProtocol
+    template, forward, reverse : Well
+    template_length : int
+        amplicon length, for the extension time
+    reagents : dict
+        'buffer', 'polymerase' and 'dntp' Wells
+    water : str
+        catalog id of water for the mastermix and gel samples
+    bottom, top : float
+        annealing temperatures (C) at row A and at the last row
+    gel : bool
+        dilute gel_product_volume of every reaction into gel_volume and run a gel
+
+    Returns
+    -------
+    wells : OrderedDict
+        nominal annealing temperature -> Well holding the product
+
+    """
+    container_type = p.container_type(plate_type)
+    rows = container_type.well_count // container_type.col_count
+    temperatures = gradient_temperatures(bottom, top, rows)
+    extension = extension_time(template_length)
+
+    plate = p.ref(plate_name, cont_type=plate_type, storage=storage)
+    reaction_wells = [plate.well(row * container_type.col_count + column) for row in range(rows)]
+    wells = OrderedDict()
+    for well, temperature in zip(reaction_wells, temperatures):
+        well.name = "anneal_{:g}C".format(round(temperature, 1))
+        wells[round(temperature, 1)] = well
+
+    recipe = q5_recipe(water, reagents)
+    recipe['forward'] = {'source': forward, 'volume': PRIMER_VOLUME}
+    recipe['reverse'] = {'source': reverse, 'volume': PRIMER_VOLUME}
+    recipe['template'] = {'source': template, 'volume': TEMPLATE_VOLUME}
+    plan, tube_wells = make_mastermix(p, recipe, REACTION_VOLUME, rows, name="{}_mastermix".format(plate_name),
+                                      overage=overage, tube_type=MASTERMIX_TUBE)
+    distribute_mastermix(p, plan, tube_wells, reaction_wells)
+
+    program = ThermocycleProgram() \
+        .hold(98, 30) \
+        .add([(98, 8), ((bottom, top), 25), (72, extension)], cycles=cycles) \
+        .hold(72, 120)
+    p.seal(plate)
+    p.thermocycle(plate, program, volume=ul(REACTION_VOLUME))
+    p.unseal(plate)
+
+    if gel:
+        gel_plate = p.ref("{}_gel".format(plate_name), cont_type=plate_type, discard=True)
+        gel_wells = [gel_plate.well(well.index) for well in reaction_wells]
+        p.provision(water, gel_wells, ul(gel_volume + dead_volume[plate_type].magnitude - gel_product_volume))
+        p.transfer(reaction_wells, gel_wells, ul(gel_product_volume), mix_after=True, mix_vol=ul(10))
+        p.gel_separate(gel_wells, ul(gel_volume), "agarose(10,2%)", "ladder1", "10:minute", dataref)
+    return wells
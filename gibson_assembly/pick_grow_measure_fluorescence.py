@@ -3,12 +3,12 @@ v2: try again with a new plate (no blue colonies)
 v3: repeat with different emission and excitation wavelengths"""
 
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
 from autoprotocol.protocol import Container, Ref
 import utils
 from utils import (ul, expid, init_inventory_well, touchdown,
                    dead_volume)
+from protocol_writer import dump_protocol
 
 p = Protocol()
 
@@ -129,5 +129,4 @@ measure_growth_wells()
 # ---------------------------------------------------------------
 # Output protocol
 #
-jprotocol = json.dumps(p.as_dict(), indent=2)
-print(jprotocol)
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
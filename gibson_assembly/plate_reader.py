@@ -0,0 +1,235 @@
+"""Plate reader results as well x time x channel arrays
+
+Scripts like pick_grow_measure_fluorescence.py read the same wells at several
+timepoints, with datarefs named {experiment}_{channel}_{time}, e.g.
+sfgfp_puc19_gibson_pick_v1_fl2_12 and sfgfp_puc19_gibson_pick_v1_abs_12.
+PlateReadings gathers a run's datasets into one array, values[well, time, channel],
+nan where a well wasn't read, and saves it as an .npy file (plus a small json
+index) that is memory-mapped back in, so the readings are fetched once and loaded
+instantly afterwards.
+
+Run data is the json Transcriptic returns from
+https://secure.transcriptic.com/{org}/{project}/runs/{run}/data.json, a dataref ->
+dataset mapping where each plate read dataset has "data": {well: [values]}.
+
+Usage:
+    python plate_reader.py fetch RUN_ID PROJECT_ID OUT_DIR [--test]
+    python plate_reader.py load DATA_JSON OUT_DIR
+    python plate_reader.py top OUT_DIR [-k 5] [--blank D1 D2] [--time 24]
+
+"""
+
+import os
+import re
+import json
+import numpy as np
+
+# last two parts of a dataref: channel, and time if the channel was read repeatedly
+_DATAREF = re.compile(r'(?:^|_)(?P<channel>[A-Za-z0-9]+)(?:_(?P<time>\d+(?:\.\d+)?))?$')
+_WELL = re.compile(r'^[A-Za-z]+\d+$')
+
+
+def parse_dataref(dataref):
+    """(channel, time) of a dataref, time 0 if it has none"""
+    match = _DATAREF.search(dataref)
+    if match is None:
+        raise ValueError("Can't read a channel from dataref {!r}".format(dataref))
+    return match.group('channel'), float(match.group('time') or 0)
+
+
+def _plate_read(dataset):
+    """{well: mean reading} if dataset is a plate read, None otherwise"""
+    data = dataset.get("data") if isinstance(dataset, dict) else None
+    if not isinstance(data, dict) or not data or not all(_WELL.match(well) for well in data):
+        return None
+    try:
+        return {well.upper(): float(np.mean(values)) for well, values in data.items()}
+    except (TypeError, ValueError):
+        return None
+
+
+def _well_order(well):
+    match = re.match(r'^([A-Z]+)(\d+)$', well)
+    return len(match.group(1)), match.group(1), int(match.group(2))
+
+
+class PlateReadings(object):
+
+    def __init__(self, values, wells, times, channels):
+        """
+        Parameters
+        ----------
+        values : ndarray
+            wells x times x channels
+        wells : list of str
+            well names, "B7"
+        times : list of float
+        channels : list of str
+        """
+        self.values = values
+        self.wells = list(wells)
+        self.times = np.asarray(times, dtype=float)
+        self.channels = list(channels)
+        self._well_index = {well: i for i, well in enumerate(self.wells)}
+
+    @classmethod
+    def from_run_data(cls, run_data, channels=None):
+        """
+        Gather the plate reads of a run's data.json
+
+        Parameters
+        ----------
+        run_data : dict
+            dataref -> dataset
+        channels : list of str, optional
+            channels to keep, all plate reads if not given
+
+        """
+        reads = {}
+        for dataref, dataset in run_data.items():
+            readings = _plate_read(dataset)
+            if readings is None:
+                continue
+            channel, time = parse_dataref(dataref)
+            if channels is None or channel in channels:
+                reads[channel, time] = readings
+        if not reads:
+            raise ValueError("No plate reads in the run data")
+
+        wells = sorted(set(well for readings in reads.values() for well in readings), key=_well_order)
+        times = sorted(set(time for _, time in reads))
+        channels = channels or sorted(set(channel for channel, _ in reads))
+        well_index = {well: i for i, well in enumerate(wells)}
+
+        values = np.full((len(wells), len(times), len(channels)), np.nan)
+        for (channel, time), readings in reads.items():
+            rows = [well_index[well] for well in readings]
+            values[rows, times.index(time), channels.index(channel)] = list(readings.values())
+        return cls(values, wells, times, channels)
+
+    def save(self, path):
+        """Write values.npy and index.json into directory path"""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        np.save(os.path.join(path, "values.npy"), np.ascontiguousarray(self.values))
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump({"wells": self.wells, "times": self.times.tolist(), "channels": self.channels}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Readings saved to directory path, values memory-mapped"""
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode)
+        return cls(values, index["wells"], index["times"], index["channels"])
+
+    def well_indices(self, wells):
+        return np.array([self._well_index[well.upper()] for well in wells], dtype=int)
+
+    def channel(self, channel):
+        """wells x times readings of one channel"""
+        return self.values[:, :, self.channels.index(channel)]
+
+    def subtract_blank(self, blank_wells):
+        """New readings with the mean of blank_wells subtracted, per time and channel"""
+        blank = np.nanmean(self.values[self.well_indices(blank_wells)], axis=0)
+        return PlateReadings(self.values - blank, self.wells, self.times, self.channels)
+
+    def ratio(self, numerator="fl2", denominator="abs", min_denominator=0.05):
+        """
+        wells x times numerator / denominator, e.g. fluorescence per OD600
+
+        nan where the denominator is below min_denominator (no growth) or missing.
+
+        """
+        top, bottom = self.channel(numerator), self.channel(denominator)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(bottom >= min_denominator, top / bottom, np.nan)
+
+    def top_wells(self, k=1, score=None, time=None):
+        """
+        The k wells scoring highest at time, best first
+
+        Parameters
+        ----------
+        k : int
+        score : ndarray, optional
+            wells x times, fluorescence / OD600 (see ratio) if not given
+        time : float, optional
+            the last time if not given
+
+        Returns
+        -------
+        list of (well, score), wells that have no score are never returned
+
+        """
+        score = self.ratio() if score is None else score
+        column = -1 if time is None else int(np.flatnonzero(self.times == time)[0])
+        scores = np.where(np.isnan(score[:, column]), -np.inf, score[:, column])
+        k = min(k, int(np.sum(np.isfinite(scores))))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(self.wells[i], float(scores[i])) for i in best]
+
+
+def fetch_run_data(run_id, project_id, headers=None, org_name=None):
+    """A run's data.json, from Transcriptic or the api_root in the auth file"""
+    import utils
+    response = utils._get_session().get('{}/{}/{}/runs/{}/data.json'.format(
+        utils.TSC_API_ROOT, org_name or utils.ORG_NAME, project_id, run_id),
+        headers=utils.TSC_HEADERS if headers is None else headers)
+    response.raise_for_status()
+    return response.json()
+
+
+def best_well(path, default, blank_wells=None, time=None):
+    """
+    Highest fluorescence / OD600 well of the readings saved at path
+
+    default is returned if nothing has been saved at path yet, so scripts can
+    keep working before the readings are in.
+
+    """
+    if not os.path.exists(os.path.join(path, "index.json")):
+        return default
+    readings = PlateReadings.load(path)
+    if blank_wells:
+        readings = readings.subtract_blank(blank_wells)
+    top = readings.top_wells(1, time=time)
+    return top[0][0] if top else default
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command')
+    fetch = subparsers.add_parser('fetch', help="fetch a run's data.json and save its plate reads")
+    fetch.add_argument('run_id')
+    fetch.add_argument('project_id')
+    fetch.add_argument('out')
+    fetch.add_argument('--test', action='store_true', help='use the test mode auth file')
+    load = subparsers.add_parser('load', help='save the plate reads of a data.json file')
+    load.add_argument('data_json')
+    load.add_argument('out')
+    top = subparsers.add_parser('top', help='rank wells by fluorescence / OD600')
+    top.add_argument('path')
+    top.add_argument('-k', type=int, default=5)
+    top.add_argument('--blank', nargs='*', help='blank wells, subtracted first')
+    top.add_argument('--time', type=float)
+    args = parser.parse_args()
+
+    if args.command == 'fetch':
+        PlateReadings.from_run_data(fetch_run_data(args.run_id, args.project_id)).save(args.out)
+    elif args.command == 'load':
+        with open(args.data_json) as f:
+            PlateReadings.from_run_data(json.load(f)).save(args.out)
+    elif args.command == 'top':
+        readings = PlateReadings.load(args.path)
+        if args.blank:
+            readings = readings.subtract_blank(args.blank)
+        for well, score in readings.top_wells(args.k, time=args.time):
+            print('{:<5} {:.4g}'.format(well, score))
+    else:
+        parser.print_help()
@@ -0,0 +1,236 @@
+"""Primer design over every candidate window of a template at once
+
+Every window (start x length) of the template gets its nearest-neighbor Tm
+(SantaLucia 1998 unified parameters, with salt correction), GC content and the
+stability (dG) of its 3' pentamer from cumulative sums over the template, so all
+candidates are scored with a handful of numpy operations.  Forward primers are
+windows of the top strand, reverse primers the reverse complement of windows
+ending at the end of the product; a window's duplex has the same Tm read either way.
+
+design_primers returns primer pairs best first, with optional Gibson tails (see
+gibson_tails), the Q5 annealing temperature and the touchdown start to pass to
+pcr_builder.q5_touchdown_program or utils.touchdown.
+
+    sequence, _ = read_sequence("../assembled_puc19_sfGFP.dna")
+    pairs = design_primers(sequence, start, end)
+    program = q5_touchdown_program(extension, pairs[0].touchdown_from, pairs[0].anneal)
+
+"""
+
+import numpy as np
+from collections import namedtuple
+from restriction_sites import reverse_complement
+
+PrimerPair = namedtuple('PrimerPair', ['forward', 'reverse', 'forward_start', 'reverse_end', 'forward_tm',
+                                       'reverse_tm', 'anneal', 'touchdown_from', 'product_length', 'penalty'])
+
+_CODE = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+_BYTE_CODE = np.full(256, -1, dtype=int)
+for _base, _code in _CODE.items():
+    _BYTE_CODE[ord(_base)], _BYTE_CODE[ord(_base.lower())] = _code, _code
+
+# SantaLucia 1998 nearest neighbors, 5'->3' dinucleotide of either strand: (dH kcal/mol, dS cal/mol/K)
+_NN = {'AA': (-7.9, -22.2), 'TT': (-7.9, -22.2), 'AT': (-7.2, -20.4), 'TA': (-7.2, -21.3),
+       'CA': (-8.5, -22.7), 'TG': (-8.5, -22.7), 'GT': (-8.4, -22.4), 'AC': (-8.4, -22.4),
+       'CT': (-7.8, -21.0), 'AG': (-7.8, -21.0), 'GA': (-8.2, -22.2), 'TC': (-8.2, -22.2),
+       'CG': (-10.6, -27.2), 'GC': (-9.8, -24.4), 'GG': (-8.0, -19.9), 'CC': (-8.0, -19.9)}
+# initiation, by terminal base pair
+_INIT = {'A': (2.3, 4.1), 'T': (2.3, 4.1), 'G': (0.1, -2.8), 'C': (0.1, -2.8)}
+
+_NN_DH, _NN_DS = np.zeros(16), np.zeros(16)
+for _pair, (_dh, _ds) in _NN.items():
+    _NN_DH[4*_CODE[_pair[0]] + _CODE[_pair[1]]], _NN_DS[4*_CODE[_pair[0]] + _CODE[_pair[1]]] = _dh, _ds
+_INIT_DH = np.array([_INIT[base][0] for base in 'ACGT'])
+_INIT_DS = np.array([_INIT[base][1] for base in 'ACGT'])
+
+R = 1.987               # cal/mol/K
+SODIUM = 0.05           # M
+PRIMER = 0.5e-6         # M, each primer in a Q5 reaction
+Q5_ANNEAL_OFFSET = 3    # NEB: anneal at the lower primer Tm + 3C for Q5
+TOUCHDOWN_SPAN = 15     # touchdown starts this much above the anneal, as pcr.py does (74.8 -> 59.8)
+MAX_ANNEAL = 72
+
+
+def _encode(sequence):
+    codes = _BYTE_CODE[np.frombuffer(sequence.encode('latin-1'), dtype=np.uint8)]
+    if (codes < 0).any():
+        raise ValueError("Templates can only hold A, C, G and T")
+    return codes
+
+
+def window_properties(sequence, lengths, sodium=SODIUM, primer=PRIMER):
+    """
+    Tm, GC fraction and 3' pentamer dG of every window
+
+    Parameters
+    ----------
+    sequence : str
+    lengths : list of int
+
+    Returns
+    -------
+    dict of ndarray, each starts x lengths (nan where the window runs off the end)
+        "tm" (C), "gc" (fraction), "forward_dg3" and "reverse_dg3" (kcal/mol at 37C,
+        of the 3' pentamer as a forward primer, and as a reverse primer)
+
+    """
+    codes = _encode(sequence)
+    n = len(codes)
+    lengths = np.asarray(lengths, dtype=int)
+    dinucleotides = 4 * codes[:-1] + codes[1:]
+    dh = np.r_[0, np.cumsum(_NN_DH[dinucleotides])]
+    ds = np.r_[0, np.cumsum(_NN_DS[dinucleotides])]
+    gc = np.r_[0, np.cumsum((codes == 1) | (codes == 2))]
+    dg37 = dh - 310.15 * ds / 1000
+
+    starts = np.arange(n)[:, None]
+    ends = starts + lengths[None, :]                  # exclusive
+    valid = ends <= n
+    start, end = np.where(valid, starts, 0), np.where(valid, ends, 1)
+
+    # window [start, end) has the nearest neighbors start..end-2
+    window_dh = dh[end - 1] - dh[start] + _INIT_DH[codes[start]] + _INIT_DH[codes[end - 1]]
+    window_ds = ds[end - 1] - ds[start] + _INIT_DS[codes[start]] + _INIT_DS[codes[end - 1]] \
+        + 0.368 * (lengths[None, :] - 1) * np.log(sodium)
+    tm = 1000 * window_dh / (window_ds + R * np.log(primer / 4)) - 273.15
+    gc_fraction = (gc[end] - gc[start]) / lengths[None, :].astype(float)
+    # pentamer dG over its 4 nearest neighbors: forward 3' end is the window's last 5 bases, reverse its first 5
+    forward_dg3 = dg37[end - 1] - dg37[np.maximum(end - 5, 0)]
+    reverse_dg3 = dg37[np.minimum(start + 4, n - 1)] - dg37[start]
+
+    nan = np.where(valid, 1.0, np.nan)
+    return {"tm": tm * nan, "gc": gc_fraction * nan, "forward_dg3": forward_dg3 * nan, "reverse_dg3": reverse_dg3 * nan}
+
+
+def nearest_neighbors(sequence):
+    """(dH kcal/mol, dS cal/mol/K) of each nearest neighbor of sequence paired with its complement"""
+    codes = _encode(sequence)
+    dinucleotides = 4 * codes[:-1] + codes[1:]
+    return _NN_DH[dinucleotides], _NN_DS[dinucleotides]
+
+
+def initiation(sequence):
+    """(dH, dS) initiation each base of sequence adds to a duplex it ends"""
+    codes = _encode(sequence)
+    return _INIT_DH[codes], _INIT_DS[codes]
+
+
+def primer_tm(primer, sodium=SODIUM, primer_concentration=PRIMER):
+    """Nearest-neighbor Tm of one primer (its template-binding part)"""
+    return float(window_properties(primer, [len(primer)], sodium, primer_concentration)["tm"][0, 0])
+
+
+def _penalty(tm, gc, dg3, gc_clamp, target_tm):
+    """Penalty of every candidate: Tm off target, GC outside 40-60%, a loose or too sticky 3' end"""
+    return np.abs(tm - target_tm) \
+        + 20 * np.clip(np.abs(gc - 0.5) - 0.1, 0, None) \
+        + np.clip(-9 - dg3, 0, None) + np.clip(dg3 + 6, 0, None) \
+        + np.where(gc_clamp, 0, 1)
+
+
+def _candidates(props, lengths, allowed, dg3, template, three_prime, target_tm, candidates):
+    """[(start, length, tm, penalty)] of the best allowed windows, three_prime the index of each window's 3' base"""
+    three_prime_base = _encode(template)[three_prime]
+    penalty = _penalty(props["tm"], props["gc"], dg3, (three_prime_base == 1) | (three_prime_base == 2), target_tm)
+    penalty = np.where(allowed & ~np.isnan(penalty), penalty, np.inf)
+    rows, columns = np.unravel_index(np.argsort(penalty, axis=None)[:candidates], penalty.shape)
+    return [(int(row), int(lengths[column]), float(props["tm"][row, column]), float(penalty[row, column]))
+            for row, column in zip(rows, columns) if np.isfinite(penalty[row, column])]
+
+
+def gibson_tails(upstream, downstream, overlap=20):
+    """(forward tail, reverse tail) that overlap upstream's last and downstream's first overlap bases"""
+    return upstream[len(upstream) - overlap:].upper(), reverse_complement(downstream[:overlap])
+
+
+def design_primers(template, start, end, search=0, lengths=range(18, 31), target_tm=62.0,
+                   forward_tail='', reverse_tail='', max_tm_difference=3.0, top=5, candidates=20):
+    """
+    Primer pairs amplifying template[start:end], best first
+
+    Parameters
+    ----------
+    template : str
+    start, end : int
+        the product covers at least template[start:end]
+    search : int
+        forward primers may start up to search bases before start, reverse primers
+        end up to search bases after end; 0 for products with exact ends (Gibson)
+    lengths : range
+        template-binding primer lengths to try
+    target_tm : float
+        C, nearest-neighbor Tm of the template-binding part
+    forward_tail, reverse_tail : str
+        added 5' of the primers, see gibson_tails
+    max_tm_difference : float
+        pairs whose Tms differ by more are dropped
+    top : int
+        pairs returned
+    candidates : int
+        best forward and best reverse primers that are paired up
+
+    Returns
+    -------
+    list of PrimerPair
+
+    """
+    template = template.upper()
+    lengths = np.asarray(list(lengths))
+    props = window_properties(template, lengths)
+    window_starts = np.arange(len(template))[:, None]
+    window_ends = window_starts + lengths[None, :]
+
+    forward = _candidates(props, lengths, (window_starts >= start - search) & (window_starts <= start),
+                          props["forward_dg3"], template, np.minimum(window_ends, len(template)) - 1,
+                          target_tm, candidates)
+    reverse = _candidates(props, lengths, (window_ends >= end) & (window_ends <= end + search),
+                          props["reverse_dg3"], template, np.repeat(window_starts, len(lengths), axis=1),
+                          target_tm, candidates)
+
+    if not forward or not reverse:
+        return []
+    f_start, f_length, f_tm, f_penalty = (np.array(column) for column in zip(*forward))
+    r_start, r_length, r_tm, r_penalty = (np.array(column) for column in zip(*reverse))
+    difference = np.abs(f_tm[:, None] - r_tm[None, :])
+    penalty = np.where(difference <= max_tm_difference, f_penalty[:, None] + r_penalty[None, :] + difference, np.inf)
+    pairs = []
+    for i, j in zip(*np.unravel_index(np.argsort(penalty, axis=None)[:top], penalty.shape)):
+        if not np.isfinite(penalty[i, j]):
+            break
+        anneal = min(min(f_tm[i], r_tm[j]) + Q5_ANNEAL_OFFSET, MAX_ANNEAL)
+        r_end = int(r_start[j] + r_length[j])
+        pairs.append(PrimerPair(forward_tail.upper() + template[f_start[i]:f_start[i] + f_length[i]],
+                                reverse_tail.upper() + reverse_complement(template[r_start[j]:r_end]),
+                                int(f_start[i]), r_end, round(float(f_tm[i]), 1), round(float(r_tm[j]), 1),
+                                round(float(anneal), 1), round(float(anneal) + TOUCHDOWN_SPAN, 1),
+                                r_end - int(f_start[i]) + len(forward_tail) + len(reverse_tail),
+                                round(float(penalty[i, j]), 2)))
+    return pairs
+
+
+if __name__ == '__main__':
+    import argparse
+    from restriction_sites import read_sequence
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('template', help='FASTA or .dna file')
+    parser.add_argument('start', type=int, help='0-based start of the product')
+    parser.add_argument('end', type=int, help='end of the product (exclusive)')
+    parser.add_argument('--search', type=int, default=0)
+    parser.add_argument('--tm', type=float, default=62.0)
+    parser.add_argument('--upstream', help='FASTA or .dna the product is joined after (Gibson tail)')
+    parser.add_argument('--downstream', help='FASTA or .dna the product is joined before (Gibson tail)')
+    parser.add_argument('--overlap', type=int, default=20)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    template, _ = read_sequence(args.template)
+    forward_tail = reverse_tail = ''
+    if args.upstream:
+        forward_tail = gibson_tails(read_sequence(args.upstream)[0], 'N' * args.overlap, args.overlap)[0]
+    if args.downstream:
+        reverse_tail = gibson_tails('', read_sequence(args.downstream)[0], args.overlap)[1]
+    for pair in design_primers(template, args.start, args.end, args.search, target_tm=args.tm,
+                               forward_tail=forward_tail, reverse_tail=reverse_tail, top=args.top):
+        print('{}\n{}\n  Tm {}/{}C, anneal {}C (touchdown from {}C), product {} bp, penalty {}\n'.format(
+            pair.forward, pair.reverse, pair.forward_tm, pair.reverse_tm, pair.anneal, pair.touchdown_from,
+            pair.product_length, pair.penalty))
@@ -0,0 +1,193 @@
+"""Optimization passes over a protocol's instruction list
+
+Each pass takes a list of autoprotocol Instructions and returns a new list of
+instructions plus a dict counting what it removed.  CustomProtocol.optimize runs
+them before the protocol is serialized when --optimize is passed (see
+protocol_writer.dump_protocol).
+
+"""
+
+from autoprotocol import Unit
+from autoprotocol.container import Container, Well, WellGroup
+from autoprotocol.instruction import Pipette, Incubate
+
+# the largest tip holds 900uL, distributes beyond that need allow_carryover
+MAX_TIP_VOLUME = Unit(900, "microliter")
+
+
+def instruction_containers(instruction):
+    """The containers an instruction touches, in the order they are first referenced"""
+    containers = []
+    def visit(value):
+        if isinstance(value, Container):
+            if not any(value is c for c in containers):
+                containers.append(value)
+        elif isinstance(value, Well):
+            visit(value.container)
+        elif isinstance(value, WellGroup):
+            for well in value.wells:
+                visit(well.container)
+        elif isinstance(value, dict):
+            for v in value.values():
+                visit(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                visit(v)
+    visit(instruction.data)
+    return containers
+
+
+def _transfers(group):
+    """The transfer list of a plain transfer group, None for anything else"""
+    if set(group) - {"transfer", "x_tip_type"}:
+        return None
+    return group.get("transfer")
+
+
+def _merge_transfer_groups(group, next_group):
+    """Merge next_group into group if they can share one tip, returns whether they were merged
+
+    Merging gives exactly what transfer(..., one_tip=True) from the same source would
+    have produced.  A transfer with mix_after has had the tip in the destination
+    liquid, so no further transfer may use that tip.
+
+    """
+    transfers, next_transfers = _transfers(group), _transfers(next_group)
+    if not transfers or not next_transfers:
+        return False
+    if group.get("x_tip_type") != next_group.get("x_tip_type"):
+        return False
+    source = transfers[0]["from"]
+    if any(xfer["from"] is not source for xfer in transfers + next_transfers):
+        return False
+    if any("mix_after" in xfer for xfer in transfers):
+        return False
+    transfers.extend(next_transfers)
+    return True
+
+
+def _merge_distribute_groups(group, next_group):
+    """Merge next_group into group if both distribute from the same source with the same options"""
+    if set(group) != {"distribute"} or set(next_group) != {"distribute"}:
+        return False
+    distribute, next_distribute = group["distribute"], next_group["distribute"]
+    if distribute["from"] is not next_distribute["from"]:
+        return False
+    if {k: v for k, v in distribute.items() if k != "to"} != \
+       {k: v for k, v in next_distribute.items() if k != "to"}:
+        return False
+    if not distribute.get("allow_carryover"):
+        total = sum([Unit.fromstring(to["volume"]) for to in distribute["to"] + next_distribute["to"]],
+                    Unit(0, "microliter"))
+        if total > MAX_TIP_VOLUME:
+            return False
+    distribute["to"] = distribute["to"] + next_distribute["to"]
+    return True
+
+
+def coalesce_pipettes(instructions):
+    """Merge adjacent pipette instructions and let compatible adjacent groups share a tip
+
+    Returns
+    -------
+    instructions : list of Instruction
+    removed : dict
+        number of instructions and tips (pipette groups) removed
+
+    """
+    optimized = []
+    removed = {"instructions": 0, "tips": 0}
+    for instruction in instructions:
+        if instruction.op != "pipette":
+            optimized.append(instruction)
+            continue
+
+        if optimized and optimized[-1].op == "pipette":
+            removed["instructions"] += 1
+            groups = optimized[-1].groups
+        else:
+            groups = []
+            optimized.append(Pipette(groups))
+
+        for group in instruction.groups:
+            group = dict(group)
+            if "transfer" in group:
+                group["transfer"] = list(group["transfer"])
+            elif "distribute" in group:
+                group["distribute"] = dict(group["distribute"])
+            if groups and (_merge_transfer_groups(groups[-1], group) or
+                           _merge_distribute_groups(groups[-1], group)):
+                removed["tips"] += 1
+            else:
+                groups.append(group)
+
+    return optimized, removed
+
+
+# plate handling ops that undo each other when nothing touches the plate in between
+_CANCELLING = {("uncover", "cover"), ("cover", "uncover"), ("unseal", "seal"), ("seal", "unseal")}
+
+
+def peephole_plate_handling(instructions):
+    """Drop cancelling plate handling pairs and merge back-to-back incubations
+
+    Only instructions touching the same plate count as "in between", so
+    uncover(A), absorbance(B), cover(A) still cancels.  Dropping a pair can make two
+    incubations adjacent, e.g. cover/incubate/uncover/cover/incubate/uncover becomes
+    cover/incubate/uncover with the durations added up.
+
+    * uncover+cover only cancel when the lid put back is the lid taken off, likewise
+      for unseal+seal and the seal type.
+    * incubations merge when where, shaking and co2 are the same.
+
+    Returns
+    -------
+    instructions : list of Instruction
+    removed : dict
+        number of plate handling instructions and incubations removed
+
+    """
+    optimized = []
+    # per container: indices into optimized of the instructions touching it, and the lids/seals
+    # put on by the kept instructions, last one on top
+    touched = {}
+    covers = {}
+    removed = {"plate_handling": 0, "incubations": 0}
+
+    for instruction in instructions:
+        containers = instruction_containers(instruction)
+        if len(containers) == 1:
+            container = containers[0]
+            history = touched.get(id(container), [])
+            previous = optimized[history[-1]] if history else None
+
+            if previous is not None and (previous.op, instruction.op) in _CANCELLING:
+                put_back = instruction.data.get("lid", instruction.data.get("type"))
+                stack = covers.get(id(container))
+                taken_off = stack[-1] if stack else None
+                if instruction.op not in ("cover", "seal") or \
+                   (taken_off is not None and taken_off == (instruction.op, put_back)):
+                    optimized[history.pop()] = None
+                    if previous.op in ("cover", "seal"):
+                        # the lid dropped with the pair never went on: back to the one before it
+                        stack.pop()
+                    removed["plate_handling"] += 2
+                    continue
+
+            if previous is not None and previous.op == instruction.op == "incubate" and \
+               all(previous.data[k] == instruction.data[k] for k in ["where", "shaking", "co2_percent"]):
+                duration = Unit.fromstring(previous.data["duration"]) + Unit.fromstring(instruction.data["duration"])
+                optimized[history[-1]] = Incubate(previous.data["object"], previous.data["where"], duration,
+                                                  previous.data["shaking"], previous.data["co2_percent"])
+                removed["incubations"] += 1
+                continue
+
+            if instruction.op in ("cover", "seal"):
+                covers.setdefault(id(container), []).append(
+                    (instruction.op, instruction.data.get("lid", instruction.data.get("type"))))
+
+        for container in containers:
+            touched.setdefault(id(container), []).append(len(optimized))
+        optimized.append(instruction)
+
+    return [instruction for instruction in optimized if instruction is not None], removed
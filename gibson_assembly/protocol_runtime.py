@@ -0,0 +1,117 @@
+"""Runtime report for a protocol: total and critical path, overall and per container
+
+The duration of each instruction comes from duration_model.  The total is every
+instruction run back to back.  The critical path of a container is when its last
+instruction would finish if everything not waiting on an earlier instruction on the
+same container (see protocol_scheduler.dependency_graph) could start right away.
+
+Usage:
+    python pcr.py > pcr.json
+    python protocol_runtime.py pcr.json [other_variant.json ...]
+
+reads stdin if no file is given, gzipped json (--gzip output) is fine too.
+
+"""
+
+import sys
+import gzip
+import json
+import argparse
+from duration_model import instruction_duration
+from protocol_optimizer import instruction_containers
+from protocol_scheduler import dependency_graph
+
+
+def json_containers(refs):
+    """Function returning the ref names an instruction dict of emitted json touches"""
+    def containers(instruction):
+        touched = []
+        def visit(value):
+            if isinstance(value, str):
+                name = value.split('/')[0]
+                if name in refs and name not in touched:
+                    touched.append(name)
+            elif isinstance(value, dict):
+                for k, v in value.items():
+                    if k != "dataref":
+                        visit(v)
+            elif isinstance(value, list):
+                for v in value:
+                    visit(v)
+        visit(instruction)
+        return touched
+    return containers
+
+
+def runtime_report(instructions, containers=instruction_containers, duration=instruction_duration):
+    """
+    Parameters
+    ----------
+    instructions : list
+        Instructions, or the instruction dicts of emitted json with json_containers
+    containers : function
+        the containers an instruction touches
+    duration : function
+        seconds an instruction takes
+
+    Returns
+    -------
+    dict
+        "total" and "critical_path" in seconds, "containers" maps each container
+        (its name for Container objects) to {"busy": seconds, "critical_path": seconds}
+
+    """
+    dependencies = dependency_graph(instructions, containers)
+    finish = []
+    per_container = {}
+    for instruction, deps in zip(instructions, dependencies):
+        seconds = duration(instruction)
+        finish.append(seconds + max([finish[dep] for dep in deps] or [0.0]))
+        for container in containers(instruction):
+            name = getattr(container, "name", container)
+            report = per_container.setdefault(name, {"busy": 0.0, "critical_path": 0.0})
+            report["busy"] += seconds
+            report["critical_path"] = max(report["critical_path"], finish[-1])
+
+    return {"total": sum(duration(instruction) for instruction in instructions),
+            "critical_path": max(finish or [0.0]),
+            "containers": per_container}
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return "{}:{:02d}:{:02d}".format(minutes // 60, minutes % 60, seconds)
+
+
+def format_report(report):
+    lines = ["{:<40} {:>10}".format("total", format_duration(report["total"])),
+             "{:<40} {:>10}".format("critical path", format_duration(report["critical_path"])),
+             "",
+             "{:<40} {:>10} {:>14}".format("container", "busy", "critical path")]
+    for name, container in sorted(report["containers"].items(), key=lambda item: -item[1]["critical_path"]):
+        lines.append("{:<40} {:>10} {:>14}".format(name, format_duration(container["busy"]),
+                                                    format_duration(container["critical_path"])))
+    return "\n".join(lines)
+
+
+def load_protocol_json(f):
+    data = f.read()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return json.loads(data.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('protocols', nargs='*', help='protocol json files (default: stdin)')
+    args = parser.parse_args()
+
+    for i, path in enumerate(args.protocols or ['-']):
+        if path == '-':
+            protocol = load_protocol_json(sys.stdin.buffer)
+        else:
+            with open(path, 'rb') as f:
+                protocol = load_protocol_json(f)
+        report = runtime_report(protocol["instructions"], json_containers(protocol.get("refs", {})))
+        print("{}{}\n".format("\n" if i else "", path if path != '-' else 'stdin'))
+        print(format_report(report))
@@ -0,0 +1,189 @@
+"""Critical-path scheduling of a protocol's instructions
+
+Instructions are only ordered with respect to the containers they touch: each
+instruction depends on the previous instruction touching each of its containers
+(and an instruction touching no container at all is a barrier).  Within that partial
+order the instructions are re-emitted longest-remaining-path first, so while one
+plate sits in an incubator the work on other plates moves up instead of waiting
+behind it.
+
+Instructions that follow each other on a container in the source stay together in
+source order (an incubation and the read right after it), only these runs move.  A
+long step (incubate, thermocycle, spin) always starts a new run, so the work on
+other plates can fit in before each incubation.
+
+"""
+
+import heapq
+from bisect import bisect_left
+from protocol_optimizer import instruction_containers
+from duration_model import instruction_duration
+
+
+def long_step_duration(instruction):
+    """Seconds a plate spends off the liquid handler (incubator, thermocycler, centrifuge), 0 otherwise
+
+    Everything else runs on the one liquid handler anyway, so only these steps can
+    overlap with work on other plates.
+
+    """
+    if instruction.data["op"] in ("incubate", "thermocycle", "spin"):
+        return instruction_duration(instruction)
+    return 0
+
+
+def dependency_graph(instructions, containers=instruction_containers):
+    """For every instruction the indices of the instructions it has to wait for
+
+    Parameters
+    ----------
+    instructions : list
+    containers : function
+        the containers (anything hashable) an instruction touches
+
+    Returns
+    -------
+    list of sets
+        dependencies[i] holds the indices of the instructions i depends on
+
+    """
+    dependencies = []
+    last_touch = {}
+    barrier = None
+    since_barrier = []
+    for i, instruction in enumerate(instructions):
+        touched = containers(instruction)
+        if touched:
+            deps = set(last_touch[c] for c in touched if c in last_touch)
+            if barrier is not None:
+                deps.add(barrier)
+            for container in touched:
+                last_touch[container] = i
+            since_barrier.append(i)
+        else:
+            deps = set(since_barrier) if since_barrier else set([barrier] if barrier is not None else [])
+            barrier, since_barrier, last_touch = i, [], {}
+        dependencies.append(deps)
+    return dependencies
+
+
+def adjacent_runs(instructions, containers=instruction_containers, duration=long_step_duration):
+    """Split instruction indices into runs where each instruction shares a container with the one before
+
+    A long step always starts a new run.
+
+    """
+    runs = []
+    previous = set()
+    for i, instruction in enumerate(instructions):
+        touched = set(containers(instruction))
+        if runs and touched & previous and not duration(instruction) > 0:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+        previous = touched
+    return runs
+
+
+def critical_path_order(instructions, duration=long_step_duration):
+    """Order of instruction indices that runs the longest remaining path first
+
+    Runs of instructions adjacent on a container (see adjacent_runs) are kept together.
+    Ties keep the original order, so a protocol without long steps comes back unchanged.
+
+    Parameters
+    ----------
+    instructions : list of Instruction
+    duration : function
+        seconds an instruction takes
+
+    Returns
+    -------
+    order : list of int
+    critical_path : float
+        seconds on the longest dependency chain
+
+    """
+    runs = adjacent_runs(instructions)
+    run_of = {i: r for r, run in enumerate(runs) for i in run}
+    instruction_dependencies = dependency_graph(instructions)
+    dependencies = [set(run_of[dep] for i in run for dep in instruction_dependencies[i]) - {r}
+                    for r, run in enumerate(runs)]
+    dependents = [[] for _ in runs]
+    for r, deps in enumerate(dependencies):
+        for dep in deps:
+            dependents[dep].append(r)
+
+    # longest path from the start of each run to the end of the protocol
+    remaining = [0.0] * len(runs)
+    for r in reversed(range(len(runs))):
+        remaining[r] = (sum(duration(instructions[i]) for i in runs[r]) +
+                        max([remaining[s] for s in dependents[r]] or [0.0]))
+
+    waiting_on = [len(deps) for deps in dependencies]
+    ready = [(-remaining[r], r) for r in range(len(runs)) if not waiting_on[r]]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        _, r = heapq.heappop(ready)
+        order.extend(runs[r])
+        for s in dependents[r]:
+            waiting_on[s] -= 1
+            if not waiting_on[s]:
+                heapq.heappush(ready, (-remaining[s], s))
+
+    return order, max(remaining or [0.0])
+
+
+def moved_instructions(order):
+    """Indices of the fewest instructions that have to move to turn the original order into order
+
+    Everything on a longest increasing subsequence of order stays where it was.
+
+    """
+    tails, tail_positions, previous = [], [], [None] * len(order)
+    for position, i in enumerate(order):
+        k = bisect_left(tails, i)
+        previous[position] = tail_positions[k-1] if k else None
+        if k == len(tails):
+            tails.append(i)
+            tail_positions.append(position)
+        else:
+            tails[k], tail_positions[k] = i, position
+    kept = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        kept.add(order[position])
+        position = previous[position]
+    return sorted(set(order) - kept)
+
+
+def remap_time_constraints(time_constraints, order):
+    """Point instruction marks of time constraints at the instructions' new positions"""
+    new_index = {old: new for new, old in enumerate(order)}
+    remapped = []
+    for constraint in time_constraints:
+        constraint = dict(constraint)
+        for end in ["from", "to"]:
+            constraint[end] = {k: new_index[v] if k.startswith("instruction_") else v
+                               for k, v in constraint[end].items()}
+        remapped.append(constraint)
+    return remapped
+
+
+if __name__ == '__main__':
+    # check: the two plates of gibson_transform_utils.measure_growth take turns in the incubator
+    import utils
+    from custom_protocol import CustomProtocol
+    from gibson_transform_utils import measure_growth
+
+    utils.experiment_name = "schedule_check"
+    p = CustomProtocol()
+    amp_6_flat = p.ref("amp_6_flat", cont_type="6-flat", discard=True)
+    noAB_6_flat = p.ref("noAB_6_flat", cont_type="6-flat", discard=True)
+    measure_growth(p, amp_6_flat, noAB_6_flat)
+    moved = p.schedule()
+
+    plates = [instruction.data["object"] for instruction in p.instructions if instruction.op == "image_plate"]
+    assert plates == [amp_6_flat, noAB_6_flat] * 2, plates
+    print("measure_growth: moved {} instructions, plates imaged in turn".format(len(moved)))
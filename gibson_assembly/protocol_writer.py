@@ -0,0 +1,132 @@
+"""Streaming protocol json writer
+
+`print(json.dumps(p.as_dict(), indent=2))` builds the whole refified protocol and then
+the whole indented string before anything is written.  dump_protocol walks the
+instructions one at a time instead and writes each as soon as it is encoded.  Pretty
+output is byte-identical to the print(json.dumps(...)) version.
+
+"""
+
+import sys
+import json
+import gzip
+from collections import Counter
+
+
+def _prepare(protocol):
+    """Same bookkeeping Protocol.as_dict does before refifying: outs and storage/discard opts"""
+    outs = {}
+    for n, ref in protocol.refs.items():
+        for well in ref.container._wells:
+            if well.name or len(well.properties) > 0:
+                if n not in outs.keys():
+                    outs[n] = {}
+                outs[n][str(well.index)] = {}
+                if well.name:
+                    outs[n][str(well.index)]["name"] = well.name
+                if len(well.properties) > 0:
+                    outs[n][str(well.index)]["properties"] = well.properties
+        if "store" in ref.opts:
+            ref.opts["store"] = {"where": ref.container.storage}
+        if ref.container.storage is None and "discard" not in ref.opts:
+            ref.opts["discard"] = True
+            del ref.opts["store"]
+        elif ref.container.storage is not None and "discard" in ref.opts:
+            ref.opts["store"] = {"where": ref.container.storage}
+            del ref.opts["discard"]
+
+    if outs:
+        setattr(protocol, "outs", outs)
+
+
+def iter_protocol_json(protocol, indent=2, compact=False):
+    """Yield the protocol json in chunks, one instruction at a time
+
+    Parameters
+    ----------
+    protocol : Protocol
+    indent : int
+        indentation for pretty output
+    compact : bool
+        no whitespace at all instead of pretty output
+
+    """
+    _prepare(protocol)
+
+    if compact:
+        indent = None
+        encoder = json.JSONEncoder(separators=(',', ':'))
+    else:
+        encoder = json.JSONEncoder(indent=indent, separators=(',', ': '))
+
+    def newline(level):
+        return '' if indent is None else '\n' + ' ' * (indent * level)
+
+    def encode(value, level):
+        #strings are escaped by the encoder so every newline is a line break to indent
+        return encoder.encode(value).replace('\n', newline(level))
+
+    key_separator = encoder.key_separator
+    sections = [(name, getattr(protocol, name)) for name in ["instructions", "outs", "refs", "time_constraints"]
+                if hasattr(protocol, name)]
+
+    yield '{'
+    for i, (name, value) in enumerate(sections):
+        yield (',' if i else '') + newline(1) + json.dumps(name) + key_separator
+        if name == "instructions" and value:
+            yield '['
+            for j, instruction in enumerate(value):
+                yield (',' if j else '') + newline(2) + encode(protocol._refify(instruction), 2)
+            yield newline(1) + ']'
+        else:
+            yield encode(protocol._refify(value), 1)
+    yield newline(0) + '}'
+
+
+def dump_protocol(protocol, fp=None, indent=2, compact=None, compress=None, optimize=None,
+                  check_volumes=None, schedule=None):
+    """Write a protocol as json to fp (stdout by default), followed by a newline like print
+
+    compact and compress default to whether --compact and --gzip were passed on the command
+    line.  Provisions made with CustomProtocol.provision_as_needed are planned first.
+    Protocols with an optimize method (CustomProtocol) are only optimized with --optimize,
+    and what the optimization removed is reported on stderr.  With --schedule they are
+    rescheduled (CustomProtocol.schedule), reporting the instructions that moved.  With
+    --check-volumes their volumes are validated before anything is written.
+
+    """
+    fp = sys.stdout if fp is None else fp
+    compact = "--compact" in sys.argv if compact is None else compact
+    compress = "--gzip" in sys.argv if compress is None else compress
+    optimize = "--optimize" in sys.argv if optimize is None else optimize
+    check_volumes = "--check-volumes" in sys.argv if check_volumes is None else check_volumes
+    schedule = "--schedule" in sys.argv if schedule is None else schedule
+
+    if getattr(protocol, 'as_needed', None):
+        protocol.plan_provisions()
+
+    if check_volumes and hasattr(protocol, 'validate_volumes'):
+        protocol.validate_volumes()
+
+    if optimize and hasattr(protocol, 'optimize'):
+        removed = protocol.optimize()
+        if any(removed.values()):
+            sys.stderr.write("Optimized protocol: removed {}\n".format(
+                ", ".join("{} {}".format(count, name) for name, count in sorted(removed.items()) if count)))
+
+    if schedule and hasattr(protocol, 'schedule'):
+        moved = Counter(instruction.op for instruction in protocol.schedule())
+        if moved:
+            sys.stderr.write("Scheduled protocol: moved {}\n".format(
+                ", ".join("{} {}".format(count, op) for op, count in sorted(moved.items()))))
+
+    if compress:
+        with gzip.GzipFile(fileobj=getattr(fp, 'buffer', fp), mode='wb') as gz:
+            for chunk in iter_protocol_json(protocol, indent, compact):
+                gz.write(chunk.encode('utf-8'))
+            gz.write(b'\n')
+        return
+
+    for chunk in iter_protocol_json(protocol, indent, compact):
+        fp.write(chunk)
+    fp.write('\n')
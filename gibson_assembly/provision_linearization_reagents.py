@@ -1,7 +1,7 @@
-import json
 from autoprotocol.protocol import Protocol
 import sys
 from utils import ul
+from protocol_writer import dump_protocol
 
 """
 This protoocol will provision restriction enzyme tubes
@@ -83,4 +83,4 @@ p.provision(inv["pUC19"], pUC19_well, pUC19_volume)
 pUC19_well.name = 'pUC19'
 pUC19_well.properties = {'Mass Concentration':'1 ug/ul'} 
 
-print(json.dumps(p.as_dict(), indent=2))
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
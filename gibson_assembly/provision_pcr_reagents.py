@@ -1,12 +1,15 @@
-import json
 import sys
-from autoprotocol.protocol import Protocol
+from custom_protocol import CustomProtocol as Protocol
 
 from utils import ul
+from protocol_writer import dump_protocol
 
 """
 This protoocol will take create tubes with 1.5mL of reagents for PCR
 
+The volumes are stocked for later runs, so they are fixed here rather than
+provisioned as needed (provision_as_needed only sees this protocol's own use).
+
 """
 
 _options = {
@@ -73,4 +76,4 @@ if 'include_exosap' in options:
     exosap_well.name = 'ExoSAP_IT'    
 
 
-print(json.dumps(p.as_dict(), indent=2))
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
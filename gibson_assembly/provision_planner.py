@@ -0,0 +1,78 @@
+"""Back-solve provision volumes from what the rest of the protocol consumes
+
+CustomProtocol.provision_as_needed provisions a placeholder (the well's capacity)
+so the protocol can be built as usual.  Once it is built, plan_provisions replays
+it with volume_ledger and works out the smallest volume that still leaves every
+later aspiration above the container's dead volume, and every mix with enough
+liquid to mix.
+
+"""
+
+import math
+import numpy as np
+from microliters import Microliters
+from volume_ledger import replay
+
+# autoprotocol provisions at most this much per "to" entry
+MAX_PROVISION = Microliters(900)
+
+
+def provision_needs(instructions, as_needed, granularity=Microliters(1)):
+    """
+    Smallest volume for each placeholder provision
+
+    Parameters
+    ----------
+    instructions : list of Instruction
+    as_needed : list of dict
+        the {"well", "volume"} "to" entries of provision instructions holding placeholders
+    granularity : Microliters
+        volumes are rounded up to a multiple of this
+
+    Returns
+    -------
+    needs : list of Microliters
+        one per entry of as_needed
+
+    Raises
+    ------
+    ValueError
+        if a well is provisioned as needed twice, nothing ever uses it, or it would
+        need more than it holds
+
+    """
+    wells = [entry["well"] for entry in as_needed]
+    if len(set(wells)) != len(wells):
+        raise ValueError("A well can only be provisioned as needed once")
+
+    ledger = replay(instructions)
+    keys = {well: k for k, well in enumerate(ledger["wells"])}
+    needs = []
+    for entry in as_needed:
+        well = entry["well"]
+        provision_index = next(i for i, instruction in enumerate(instructions)
+                               if instruction.op == "provision" and any(to is entry for to in instruction.data["to"]))
+        rows = (ledger["keys"] == keys[well]) & (ledger["instruction"] >= provision_index)
+        # volumes as if the placeholder had provisioned nothing
+        short_by = ledger["required"][rows] - (ledger["volume"][rows] - Microliters.of(entry["volume"]).nl)
+        short_by = short_by[~np.isnan(short_by)]
+        if not len(short_by):
+            raise ValueError("{} {} is provisioned as needed but never used".format(
+                well.container.name, well.humanize()))
+
+        need = Microliters.from_nl(int(math.ceil(max(short_by.max(), 0) / granularity.nl)) * granularity.nl)
+        capacity = Microliters.of(well.container.container_type.well_volume_ul)
+        if need > capacity:
+            raise ValueError("{} {} needs {}, it only holds {}".format(
+                well.container.name, well.humanize(), need, capacity))
+        needs.append(need)
+    return needs
+
+
+def split_provision(need):
+    """Volumes of the "to" entries provisioning need, none above MAX_PROVISION"""
+    volumes = []
+    while need > MAX_PROVISION:
+        volumes.append(MAX_PROVISION)
+        need = need - MAX_PROVISION
+    return volumes + [need]
@@ -0,0 +1,230 @@
+"""Restriction sites of a whole enzyme catalog in one pass over a sequence
+
+Enzymes are written the way REBASE and NEB write them: "G^AATTC" cuts both strands
+symmetrically after the ^, "GGTCTC(1/5)" cuts the top strand 1 base and the bottom
+strand 5 bases past the end of the site.  Sites may use IUPAC ambiguity codes.
+
+SiteIndex compiles the catalog once: every site, and the reverse complement of every
+site that isn't palindromic, becomes a row of 4-bit base masks (A=1, C=2, G=4, T=8,
+N=15), grouped by site length.  find_sites then slides over the sequence once per
+site length, matching all the sites of that length at every position with numpy, so
+both strands are screened against the whole catalog in milliseconds.  Circular
+sequences are scanned across the origin.
+
+    sequence, circular = read_sequence("../puc19fsa.txt")
+    sites = find_sites(sequence, circular=circular)
+    sites["EcoRI"]  # [Site(enzyme='EcoRI', position=395, strand=1, cut=396, complement_cut=400)]
+
+Positions are 0-based on the top strand: position is where the site starts (its
+top-strand footprint), cut and complement_cut are the top-strand coordinates the
+two strands are cut before, None if a linear sequence ends first.
+
+"""
+
+import re
+import struct
+import numpy as np
+from collections import namedtuple, OrderedDict
+
+Enzyme = namedtuple('Enzyme', ['name', 'site', 'cut', 'complement_cut'])
+Site = namedtuple('Site', ['enzyme', 'position', 'strand', 'cut', 'complement_cut'])
+
+IUPAC = {'A': 'A', 'C': 'C', 'G': 'G', 'T': 'T', 'R': 'AG', 'Y': 'CT', 'S': 'CG', 'W': 'AT',
+         'K': 'GT', 'M': 'AC', 'B': 'CGT', 'D': 'AGT', 'H': 'ACT', 'V': 'ACG', 'N': 'ACGT'}
+_COMPLEMENT = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'R': 'Y', 'Y': 'R', 'S': 'S', 'W': 'W',
+               'K': 'M', 'M': 'K', 'B': 'V', 'D': 'H', 'H': 'D', 'V': 'B', 'N': 'N'}
+_BIT = {'A': 1, 'C': 2, 'G': 4, 'T': 8}
+
+# sequence letter -> mask, anything but ACGT (N, gaps) matches nothing
+_SEQUENCE_MASK = np.zeros(256, dtype=np.uint8)
+for _base, _bit in _BIT.items():
+    _SEQUENCE_MASK[ord(_base)] = _SEQUENCE_MASK[ord(_base.lower())] = _bit
+
+# commercially available enzymes, mostly NEB
+CATALOG = """
+AatII GACGT^C       Acc65I G^GTACC      AccI GT^MKAC        AclI AA^CGTT        AfeI AGC^GCT
+AflII C^TTAAG       AgeI A^CCGGT        AhdI GACNNN^NNGTC   AleI CACNN^NNGTG    AluI AG^CT
+ApaI GGGCC^C        ApaLI G^TGCAC       AscI GG^CGCGCC      AseI AT^TAAT        AvaI C^YCGRG
+AvaII G^GWCC        AvrII C^CTAGG       BamHI G^GATCC       BanI G^GYRCC        BanII GRGCY^C
+BbsI GAAGAC(2/6)    BbvCI CC^TCAGC      BclI T^GATCA        BglI GCCNNNN^NGGC   BglII A^GATCT
+BlpI GC^TNAGC       BmtI GCTAG^C        BsaI GGTCTC(1/5)    BsaAI YAC^GTR       BsaHI GR^CGYC
+BsiHKAI GWGCW^C     BsiWI C^GTACG       BsmI GAATGC(1/-1)   BsmBI CGTCTC(1/5)   Bsp1286I GDGCH^C
+BspEI T^CCGGA       BspHI T^CATGA       BspQI GCTCTTC(1/4)  BsrI ACTGG(1/-1)    BsrGI T^GTACA
+BssHII G^CGCGC      BstBI TT^CGAA       BstEII G^GTNACC     BstXI CCANNNNN^NTGG BstZ17I GTA^TAC
+BtgZI GCGATG(10/14) ClaI AT^CGAT        CviQI G^TAC         DpnII ^GATC         DraI TTT^AAA
+DraIII CACNNN^GTG   EagI C^GGCCG        EarI CTCTTC(1/4)    EciI GGCGGA(11/9)   EcoNI CCTNN^NNNAGG
+EcoO109I RG^GNCCY   EcoRI G^AATTC       EcoRV GAT^ATC       FseI GGCCGG^CC      FspI TGC^GCA
+HaeII RGCGC^Y       HaeIII GG^CC        HhaI GCG^C          HincII GTY^RAC      HindIII A^AGCTT
+HpaI GTT^AAC        HpyCH4IV A^CGT      KasI G^GCGCC        KpnI GGTAC^C        MboI ^GATC
+MfeI C^AATTG        MluI A^CGCGT        MscI TGG^CCA        MseI T^TAA          MspI C^CGG
+NaeI GCC^GGC        NarI GG^CGCC        NcoI C^CATGG        NdeI CA^TATG        NheI G^CTAGC
+NlaIII CATG^        NotI GC^GGCCGC      NruI TCG^CGA        NsiI ATGCA^T        NspI RCATG^Y
+PacI TTAAT^TAA      PaqCI CACCTGC(4/8)  PciI A^CATGT        PmeI GTTT^AAAC      PmlI CAC^GTG
+PshAI GACNN^NNGTC   PsiI TTA^TAA        PspOMI G^GGCCC      PstI CTGCA^G        PvuI CGAT^CG
+PvuII CAG^CTG       RsaI GT^AC          SacI GAGCT^C        SacII CCGC^GG       SalI G^TCGAC
+SapI GCTCTTC(1/4)   Sau3AI ^GATC        SbfI CCTGCA^GG      ScaI AGT^ACT        SfiI GGCCNNNN^NGGCC
+SfoI GGC^GCC        SmaI CCC^GGG        SmlI C^TYRAG        SpeI A^CTAGT        SphI GCATG^C
+SrfI GCCC^GGGC      StuI AGG^CCT        StyI C^CWWGG        SwaI ATTT^AAAT      TaqI T^CGA
+XbaI T^CTAGA        XhoI C^TCGAG        XmaI C^CCGGG        ZraI GAC^GTC
+"""
+
+
+def reverse_complement(sequence):
+    """Reverse complement, ambiguity codes included"""
+    return ''.join(_COMPLEMENT[base] for base in reversed(sequence.upper()))
+
+
+def parse_enzyme(name, pattern):
+    """Enzyme from "G^AATTC" or "GGTCTC(1/5)" notation"""
+    match = re.match(r'^([A-Za-z^]+)(?:\((-?\d+)/(-?\d+)\))?$', pattern)
+    if match is None or match.group(1).count('^') > 1 or (match.group(2) is None) == ('^' not in pattern):
+        raise ValueError("Can't read the site of {} from {!r}".format(name, pattern))
+    site = match.group(1).replace('^', '').upper()
+    if set(site) - set(IUPAC):
+        raise ValueError("{}: {!r} isn't IUPAC".format(name, site))
+    if match.group(2) is None:
+        cut = match.group(1).index('^')
+        return Enzyme(name, site, cut, len(site) - cut)
+    return Enzyme(name, site, len(site) + int(match.group(2)), len(site) + int(match.group(3)))
+
+
+def parse_catalog(text):
+    """Enzymes of whitespace separated "name site" pairs, like CATALOG"""
+    words = text.split()
+    if len(words) % 2:
+        raise ValueError("Enzyme catalog needs a site for every name")
+    return OrderedDict((name, parse_enzyme(name, pattern)) for name, pattern in zip(words[::2], words[1::2]))
+
+
+ENZYMES = parse_catalog(CATALOG)
+
+
+def read_sequence(path):
+    """
+    (sequence, circular) from a FASTA file or a SnapGene .dna file
+
+    FASTA sequences are circular if the header says topology=circular.
+
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:1] == b'\x09':
+        # SnapGene: segments of type byte, big endian length, payload; type 0 is the sequence
+        i = 0
+        while i < len(data):
+            kind, length = data[i], struct.unpack('>I', data[i+1:i+5])[0]
+            if kind == 0:
+                return data[i+6:i+5+length].decode('ascii').upper(), bool(data[i+5] & 1)
+            i += 5 + length
+        raise ValueError("No sequence in {}".format(path))
+
+    lines = data.decode('latin-1').splitlines()
+    header = lines[0] if lines and lines[0].startswith('>') else ''
+    sequence = re.sub(r'\s', '', ''.join(lines[1:] if header else lines)).upper()
+    return sequence, 'topology=circular' in header
+
+
+class SiteIndex(object):
+
+    def __init__(self, enzymes=None):
+        """
+        Parameters
+        ----------
+        enzymes : dict or list of Enzyme, optional
+            ENZYMES if not given
+        """
+        enzymes = ENZYMES if enzymes is None else enzymes
+        self.enzymes = list(enzymes.values()) if isinstance(enzymes, dict) else list(enzymes)
+
+        # length -> (masks: patterns x length, enzyme index per pattern, strand per pattern)
+        patterns = {}
+        for k, enzyme in enumerate(self.enzymes):
+            reverse = reverse_complement(enzyme.site)
+            strands = [(enzyme.site, 1)] + ([(reverse, -1)] if reverse != enzyme.site else [])
+            for site, strand in strands:
+                masks = [sum(_BIT[base] for base in IUPAC[letter]) for letter in site]
+                patterns.setdefault(len(site), []).append((masks, k, strand))
+        self.patterns = {length: (np.array([masks for masks, _, _ in rows], dtype=np.uint8),
+                                  np.array([k for _, k, _ in rows], dtype=int),
+                                  np.array([strand for _, _, strand in rows], dtype=int))
+                         for length, rows in patterns.items()}
+        self.max_length = max(self.patterns) if self.patterns else 0
+
+    def find_sites(self, sequence, circular=True):
+        """
+        Every site of every enzyme on both strands
+
+        Returns
+        -------
+        sites : OrderedDict
+            enzyme name -> list of Site by position, for every enzyme in the index
+
+        """
+        n = len(sequence)
+        masks = _SEQUENCE_MASK[np.frombuffer(sequence.encode('ascii'), dtype=np.uint8)]
+        if circular:
+            masks = np.concatenate([masks, masks[:self.max_length - 1]])
+
+        hits = []
+        for length, (site_masks, enzyme_index, strands) in self.patterns.items():
+            starts = n if circular else n - length + 1
+            if starts <= 0 or length > n:
+                continue
+            match = np.ones((starts, len(site_masks)), dtype=bool)
+            for j in range(length):
+                match &= (masks[j:j + starts, None] & site_masks[None, :, j]) != 0
+            positions, pattern = np.nonzero(match)
+            hits.append((positions, enzyme_index[pattern], strands[pattern], np.full(len(positions), length)))
+
+        sites = OrderedDict((enzyme.name, []) for enzyme in self.enzymes)
+        if not hits:
+            return sites
+        positions, enzyme_index, strands, lengths = [np.concatenate(column) for column in zip(*hits)]
+        for i in np.lexsort((strands, positions, enzyme_index)):
+            enzyme, position, strand, length = self.enzymes[enzyme_index[i]], int(positions[i]), int(strands[i]), int(lengths[i])
+            if strand == 1:
+                cut, complement_cut = position + enzyme.cut, position + enzyme.complement_cut
+            else:
+                cut, complement_cut = position + length - enzyme.complement_cut, position + length - enzyme.cut
+            if circular:
+                cut, complement_cut = cut % n, complement_cut % n
+            else:
+                cut = cut if 0 <= cut <= n else None
+                complement_cut = complement_cut if 0 <= complement_cut <= n else None
+            sites[enzyme.name].append(Site(enzyme.name, position, strand, cut, complement_cut))
+        return sites
+
+
+_default_index = None
+
+
+def find_sites(sequence, enzymes=None, circular=True):
+    """SiteIndex(enzymes).find_sites(sequence, circular), the index of ENZYMES built once"""
+    global _default_index
+    if enzymes is None:
+        if _default_index is None:
+            _default_index = SiteIndex()
+        index = _default_index
+    else:
+        index = SiteIndex(enzymes)
+    return index.find_sites(sequence, circular)
+
+
+def cutters(sites, times=1):
+    """Names of the enzymes in find_sites' result that cut exactly times times"""
+    return [name for name, enzyme_sites in sites.items() if len(enzyme_sites) == times]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    for path in sys.argv[1:]:
+        sequence, circular = read_sequence(path)
+        start = time.perf_counter()
+        sites = find_sites(sequence, circular=circular)
+        elapsed = time.perf_counter() - start
+        print('{}: {} bp {}, {} enzymes in {:.1f} ms'.format(
+            path, len(sequence), 'circular' if circular else 'linear', len(sites), elapsed * 1000))
+        for name in cutters(sites, 1):
+            site = sites[name][0]
+            print('  {:<10} {:>6} {:>3}  cut {}'.format(name, site.position, '+' if site.strand == 1 else '-', site.cut))
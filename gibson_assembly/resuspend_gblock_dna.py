@@ -1,6 +1,6 @@
-import json
 from autoprotocol.protocol import Protocol
 from utils import ul
+from protocol_writer import dump_protocol
 
 inv = {
     'gblock_dna':'ct18vs7cmjat2c',     # my inventory
@@ -26,4 +26,4 @@ p.mix(dna_sample.well(0),'480:microliter',speed='480:microliter/second',repetiti
 
 p.spin(dna_sample, '3000:g', '3:second')
 
-print(json.dumps(p.as_dict(), indent=2))
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Annealing temperature screen: one primer pair at a gradient of annealing temperatures, see pcr_builder
+
+Usage:
+    python run_anneal_gradient.py [--test] [--bottom 55] [--top 68]
+
+"""
+import sys
+from custom_protocol import CustomProtocol as Protocol
+from utils import expid, init_inventory_wells
+from pcr_builder import anneal_gradient_screen
+from protocol_writer import dump_protocol
+
+
+p = Protocol()
+
+# ---------------------------------------------------
+# Set up experiment
+#
+experiment_name = "sfgfp_anneal_gradient_v1"
+template_length = 726
+
+def _arg(name, default):
+    return float(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+bottom = _arg("--bottom", 55)
+top = _arg("--top", 68)
+
+# ---------------------------------------------------
+# Inventory
+#
+inv = {
+    'pcr_reagent_plate':                 'ct18x95j499zx4', # inventory: A1: Q5 polymerase,
+                                                           # A2: Buffer, A3: Enhancer, B1: dNTP 10mM
+    'water':                             'rs17gmh5wafm5p', # catalog; Autoclaved MilliQ H2O
+    'sfgfp_puc19_primer_forward_10uM':   'ct18x9wbfksyc3', # inventory; micro-1.5, cold_20, 10uM
+    'sfgfp_puc19_primer_reverse_10uM':   'ct18xzb54nd7g3', # inventory; micro-1.5, cold_20, 10uM, hindiii
+    'sfgfp_2nM':                         'ct18vs7cmjat2c', # inventory; sfGFP tube #1, micro-1.5, cold_20, 2.12nM, 1ng/uL
+}
+
+if "--test" in sys.argv:
+    test_inv = {
+        'pcr_reagent_plate':                'ct18x92yfcbhhz',
+        'sfgfp_puc19_primer_forward_10uM':  'ct18x626u9nvne',
+        'sfgfp_puc19_primer_reverse_10uM':  'ct18xkedwwjtwu',
+        'sfgfp_2nM':                        'ct18x62qg8km37',
+    }
+    inv.update(test_inv)
+
+def tube(name):
+    return p.ref(name, id=inv[name], cont_type="micro-1.5", storage="cold_20").well(0)
+
+template = tube('sfgfp_2nM')
+forward, reverse = tube('sfgfp_puc19_primer_forward_10uM'), tube('sfgfp_puc19_primer_reverse_10uM')
+
+pcr_reagent_plate = p.ref("pcr_reagent_plate", id=inv['pcr_reagent_plate'], cont_type="96-pcr", storage="cold_20")
+reagents = {'polymerase': pcr_reagent_plate.wells(["A1"])[0],
+            'buffer':     pcr_reagent_plate.wells(["A2"])[0],
+            'dntp':       pcr_reagent_plate.wells(["B1"])[0]}
+
+init_inventory_wells([template, forward, reverse])
+
+# -----------------------------------------------------
+# Eight annealing temperatures, rows A-H, gel lanes in the same order
+#
+anneal_gradient_screen(p, template, forward, reverse, template_length, reagents, inv['water'],
+                       bottom=bottom, top=top, plate_name=expid("amplified", experiment_name),
+                       dataref=expid("gel", experiment_name))
+
+dump_protocol(p)
@@ -4,11 +4,12 @@ Derived from Brian Naughton @ http://blog.booleanbiotech.com/genetic_engineering
 
 """
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
-from utils import (ul, expid, init_inventory_well, touchdown,
+from utils import (ul, expid, init_inventory_wells, touchdown,
                    dead_volume)
 import numpy
+from protocol_writer import dump_protocol
+from digest import format_lanes
 
 
 p = Protocol()
@@ -61,8 +62,7 @@ p.transfer(pcr_product_well, diluted_product_well2, ul(2),mix_before=True,mix_af
 
 # Initialize all existing inventory
 all_inventory_wells = [pcr_product_well]
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
 
 # --------------------------------------------------------
 # Run a gel
@@ -71,4 +71,8 @@ for well in all_inventory_wells:
 #p.gel_separate([diluted_product_well1,diluted_product_well2],
 p.gel_separate([diluted_product_well2],
                ul(20), "agarose(10,1.2%)", "ladder1", "10:minute", expid("gel", experiment_name))
-print(json.dumps(p.as_dict(), indent=2))
+
+# One band at the amplicon length. --expected-gel draws it next to the ladder
+if "--expected-gel" in sys.argv:
+    sys.stderr.write(format_lanes({"1/20th": [template_length]}, "agarose(10,1.2%)", "ladder1") + "\n")
+dump_protocol(p)
@@ -1,10 +1,10 @@
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
 import utils
-from utils import (ul, expid, init_inventory_well, touchdown,
+from utils import (ul, expid, init_inventory_wells, touchdown,
                    dead_volume )
 from gibson_transform_utils import do_gibson_assembly, get_inventory
+from protocol_writer import dump_protocol
 
 """Full Gibson assembly and transformation protocol for sfGFP and pUC19"""
 
@@ -34,8 +34,7 @@ water_tube       = p.ref("water",     cont_type="micro-1.5", discard=True).well(
 
 all_inventory_wells = [puc19_cut_tube, sfgfp_pcroe_amp_tube]
 
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
     
 assert puc19_cut_tube.volume >= ul(20), puc19_cut_tube.volume
 assert sfgfp_pcroe_amp_tube.volume >= ul(20), sfgfp_pcroe_amp_tube.volume    
@@ -54,5 +53,4 @@ do_gibson_assembly(p, water_tube, clone_plate, puc19_cut_tube, sfgfp_pcroe_amp_t
 # ---------------------------------------------------------------
 # Output protocol
 #
-jprotocol = json.dumps(p.as_dict(), indent=2)
-print(jprotocol)
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
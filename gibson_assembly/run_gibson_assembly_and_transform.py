@@ -1,9 +1,9 @@
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
-from utils import (ul, expid, init_inventory_well, touchdown,
+from utils import (ul, expid, init_inventory_wells, touchdown,
                    dead_volume, experiment_name )
 from gibson_transform_utils import do_gibson_assembly, get_inventory
+from protocol_writer import dump_protocol
 
 """Full Gibson assembly and transformation protocol for sfGFP and pUC19"""
 
@@ -35,8 +35,7 @@ all_inventory_wells = [puc19_cut_tube, sfgfp_pcroe_amp_tube, IPTG_tube]
 assert puc19_cut_tube.volume == ul(66), puc19_cut_tube.volume
 assert sfgfp_pcroe_amp_tube.volume == ul(36), sfgfp_pcroe_amp_tube.volume
 
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
     
 #
 # Provisioning. Water is used all over the protocol. Provision an excess since it's cheap
@@ -54,5 +53,4 @@ do_sanger_seq(p,clone_plate)
 # ---------------------------------------------------------------
 # Output protocol
 #
-jprotocol = json.dumps(p.as_dict(), indent=2)
-print(jprotocol)
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
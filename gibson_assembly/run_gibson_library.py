@@ -0,0 +1,44 @@
+"""Gibson assembly of every vector with every insert in one run, see gibson_library
+
+"""
+from custom_protocol import CustomProtocol as Protocol
+import utils
+from utils import ul, expid, init_inventory_wells
+from gibson_transform_utils import get_inventory
+from gibson_library import LibraryFragment, library_reactions, gibson_library
+from protocol_writer import dump_protocol
+
+
+experiment_name = "sfgfp_puc19_gibson_library_v1"
+utils.experiment_name = experiment_name
+
+p = Protocol()
+
+inv = get_inventory()
+
+replicates = 3
+
+def tube(name):
+    return p.ref(name, id=inv[name], cont_type="micro-1.5", storage="cold_20").well(0)
+
+# name, well, measured ng/uL and length (bp) of every fragment
+vectors = [LibraryFragment('puc19', tube("puc19_ecori_hindiii_puc19_cut"), 20, 2635)]
+inserts = [LibraryFragment('sfgfp', tube("sfgfp_pcr_ecori_hindiii_amplified"), 25, 726)]
+
+init_inventory_wells([fragment.well for fragment in vectors + inserts])
+
+# ---------------------------------------------------------------
+# Generate protocol
+#
+reactions = library_reactions(vectors, inserts, replicates)
+for fragment in vectors + inserts:
+    used = sum(reaction.vector_volume if fragment is reaction.vector else reaction.insert_volume
+               for reaction in reactions if fragment in (reaction.vector, reaction.insert))
+    assert fragment.well.volume >= ul(used), (fragment.name, fragment.well.volume, used)
+
+gibson_library(p, reactions, p.inv["water"], plate_name=expid("library"))
+
+# ---------------------------------------------------------------
+# Output protocol
+#
+dump_protocol(p)
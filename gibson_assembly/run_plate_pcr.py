@@ -0,0 +1,78 @@
+"""Plate-scale PCR: every template with every primer pair, see pcr_builder
+
+"""
+import sys
+from itertools import product
+from custom_protocol import CustomProtocol as Protocol
+from utils import expid, init_inventory_wells
+from pcr_builder import plate_pcr, PCRReaction
+from protocol_writer import dump_protocol
+
+
+p = Protocol()
+
+# ---------------------------------------------------
+# Set up experiment
+#
+experiment_name = "plate_pcr_v1"
+
+_options = {
+    'run_gel'        : True,  # run a gel to see the amplicon sizes
+}
+options = {k for k,v in _options.items() if v is True}
+
+replicates = 3
+
+# ---------------------------------------------------
+# Inventory
+#
+inv = {
+    'pcr_reagent_plate':                 'ct18x95j499zx4', # inventory: A1: Q5 polymerase,
+                                                           # A2: Buffer, A3: Enhancer, B1: dNTP 10mM
+    'water':                             'rs17gmh5wafm5p', # catalog; Autoclaved MilliQ H2O
+    'sfgfp_puc19_primer_forward_10uM':   'ct18x9wbfksyc3', # inventory; micro-1.5, cold_20, 10uM
+    'sfgfp_puc19_primer_reverse_10uM':   'ct18xzb54nd7g3', # inventory; micro-1.5, cold_20, 10uM, hindiii
+    'sfgfp_2nM':                         'ct18vs7cmjat2c', # inventory; sfGFP tube #1, micro-1.5, cold_20, 2.12nM, 1ng/uL
+}
+
+if "--test" in sys.argv:
+    test_inv = {
+        'pcr_reagent_plate':                'ct18x92yfcbhhz',
+        'sfgfp_puc19_primer_forward_10uM':  'ct18x626u9nvne',
+        'sfgfp_puc19_primer_reverse_10uM':  'ct18xkedwwjtwu',
+        'sfgfp_2nM':                        'ct18x62qg8km37',
+    }
+    inv.update(test_inv)
+
+def tube(name):
+    return p.ref(name, id=inv[name], cont_type="micro-1.5", storage="cold_20").well(0)
+
+# template name -> (well, amplicon length)
+templates = {
+    'sfgfp': (tube('sfgfp_2nM'), 726),
+}
+# primer pair name -> (forward well, reverse well)
+primer_pairs = {
+    'sfgfp_puc19': (tube('sfgfp_puc19_primer_forward_10uM'), tube('sfgfp_puc19_primer_reverse_10uM')),
+}
+
+pcr_reagent_plate = p.ref("pcr_reagent_plate", id=inv['pcr_reagent_plate'], cont_type="96-pcr", storage="cold_20")
+reagents = {'polymerase': pcr_reagent_plate.wells(["A1"])[0],
+            'buffer':     pcr_reagent_plate.wells(["A2"])[0],
+            'dntp':       pcr_reagent_plate.wells(["B1"])[0]}
+
+init_inventory_wells([template for template, _ in templates.values()] +
+                     [well for pair in primer_pairs.values() for well in pair])
+
+# -----------------------------------------------------
+# One reaction per template x primer pair x replicate
+#
+reactions = [PCRReaction("{}_{}_{}".format(template_name, pair_name, replicate+1),
+                         template, forward, reverse, length)
+             for (template_name, (template, length)), (pair_name, (forward, reverse)), replicate
+             in product(templates.items(), primer_pairs.items(), range(replicates))]
+
+plate_pcr(p, reactions, reagents, inv['water'], plate_name=expid("amplified", experiment_name),
+          gel='run_gel' in options, dataref=expid("gel", experiment_name))
+
+dump_protocol(p)
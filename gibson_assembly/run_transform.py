@@ -1,11 +1,11 @@
 import sys
-import json
 from custom_protocol import CustomProtocol as Protocol
 from autoprotocol.protocol import Container, Ref
 import utils
-from utils import (ul, expid, init_inventory_well, touchdown,
+from utils import (ul, expid, init_inventory_wells, touchdown,
                    dead_volume)
 from gibson_transform_utils import do_transformation, get_inventory, measure_growth
+from protocol_writer import dump_protocol
 
 """Transform after gibson assembly for sfGFP and pUC19"""
 
@@ -43,8 +43,7 @@ p.refs[expid("noAB_6_flat")] = Ref(expid("noAB_6_flat"),
 
 all_inventory_wells = [clone_plate.well(0)]
 
-for well in all_inventory_wells:
-    init_inventory_well(well)
+init_inventory_wells(all_inventory_wells)
 
 # ---------------------------------------------------------------
 # Generate protocol
@@ -59,5 +58,4 @@ measure_growth(p, amp_6_flat, noAB_6_flat)
 # ---------------------------------------------------------------
 # Output protocol
 #
-jprotocol = json.dumps(p.as_dict(), indent=2)
-print(jprotocol)
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""Local stand-in for the Transcriptic samples API
+
+Serves recorded samples/{id}.json payloads so the inventory code in utils.py can be
+exercised (and benchmarked) without the live service.  Latency, jitter and the error
+rate are configurable, and responses carry an ETag so conditional requests from the
+container cache get 304s.
+
+Recordings are plain json files named {container id}.json, as returned by
+https://secure.transcriptic.com/{org}/samples/{id}.json, and runs/{run id}.json for
+the run data (datasets) served at {org}/{project}/runs/{run id}/data.json
+
+Usage:
+    python stand_in_server.py --recordings ../recordings --port 8000 --latency 50 --jitter 20
+
+and point "api_root" in your auth json at http://localhost:8000
+
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_samples_path = re.compile(r'^/(?P<org>[^/]+)/samples/(?P<container_id>[^/]+)\.json$')
+_run_data_path = re.compile(r'^/(?P<org>[^/]+)/(?P<project>[^/]+)/runs/(?P<run_id>[^/]+)/data\.json$')
+
+
+def make_recording(container_id, num_wells=96, volume_ul=100, label=None):
+    """Synthetic samples json for a container, in the shape Transcriptic returns"""
+    return {"id": container_id,
+            "label": label or container_id,
+            "aliquots": [{"well_idx": i,
+                          "name": None,
+                          "properties": {},
+                          "volume_ul": "{:g}".format(volume_ul)} for i in range(num_wells)]}
+
+
+class StandInServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, recordings=None, recordings_dir=None,
+                 latency=0.0, jitter=0.0, error_rate=0.0, seed=None, run_data=None):
+        """
+        Parameters
+        ----------
+        address : tuple
+            (host, port) to listen on, port 0 picks a free port
+        recordings : dict, optional
+            container id -> samples json, served before anything in recordings_dir
+        recordings_dir : str, optional
+            directory of {container id}.json recordings
+        latency : float
+            seconds added to every response
+        jitter : float
+            up to this many seconds are randomly added on top of latency
+        error_rate : float
+            fraction of requests answered with a 500
+        run_data : dict, optional
+            run id -> data.json, served before anything in recordings_dir/runs
+        """
+        ThreadingHTTPServer.__init__(self, address, _StandInHandler)
+        self.recordings = dict(recordings or {})
+        self.run_data = dict(run_data or {})
+        self.recordings_dir = recordings_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def api_root(self):
+        return 'http://{}:{}'.format(*self.server_address[:2])
+
+    def recording(self, container_id):
+        if container_id in self.recordings:
+            return self.recordings[container_id]
+        if self.recordings_dir:
+            path = os.path.join(self.recordings_dir, '{}.json'.format(container_id))
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        return None
+
+    def recorded_run_data(self, run_id):
+        if run_id in self.run_data:
+            return self.run_data[run_id]
+        if self.recordings_dir:
+            path = os.path.join(self.recordings_dir, 'runs', '{}.json'.format(run_id))
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        return None
+
+    def delay_and_error(self):
+        """Returns (seconds to sleep, whether to fail) for one request"""
+        with self._lock:
+            self.request_count += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            return delay, self._random.random() < self.error_rate
+
+    def start(self):
+        """Serve from a background thread"""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    #headers and body go out in separate writes, don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        delay, fail = self.server.delay_and_error()
+        time.sleep(delay)
+
+        path = self.path.split('?')[0]
+        match, run_match = _samples_path.match(path), _run_data_path.match(path)
+        if fail:
+            return self._send(500, {"error": "stand-in server injected error"})
+        if run_match:
+            run_data = self.server.recorded_run_data(run_match.group('run_id'))
+            if run_data is None:
+                return self._send(404, {"error": "no run data for {}".format(run_match.group('run_id'))})
+            return self._send(200, run_data)
+        if not match:
+            return self._send(404, {"error": "not found"})
+
+        container = self.server.recording(match.group('container_id'))
+        if container is None:
+            return self._send(404, {"error": "no recording for {}".format(match.group('container_id'))})
+
+        body = json.dumps(container).encode('utf-8')
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, None, etag=etag)
+        return self._send(200, body, etag=etag)
+
+    def _send(self, status, body, etag=None):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        body = body or b''
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--recordings', help='directory of {container id}.json recordings')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many extra random milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with a 500')
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), recordings_dir=args.recordings,
+                           latency=args.latency/1000.0, jitter=args.jitter/1000.0,
+                           error_rate=args.error_rate)
+    sys.stderr.write('Serving recordings from {} on {}\n'.format(args.recordings, server.api_root))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
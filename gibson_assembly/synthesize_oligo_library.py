@@ -0,0 +1,39 @@
+"""Synthesize a library of oligos on plates in one run
+
+Usage:
+    python synthesize_oligo_library.py oligos.csv [--plate-type 384-flat] [--no-screen]
+
+oligos.csv has name,sequence,scale,concentration_uM columns, e.g.
+    forward_primer_sfGFP_pUC19_100uM,TTGTAAAACGACGGCCAGTGAATTC...,25nm,100
+
+Oligos are screened for hairpins and 3' dimers first (see oligo_screen), and nothing
+is written if any fails, unless --no-screen is given.
+
+Without a csv the primers of synthesize_forward_primer.py and synthesize_reverse_primer.py
+are made.
+
+"""
+
+import csv
+import argparse
+from oligosynthesis import get_synthesized_oligo_plate_protocol
+from protocol_writer import dump_protocol
+
+parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+parser.add_argument('oligos', nargs='?', help='csv of name,sequence,scale,concentration_uM')
+parser.add_argument('--plate-type', default='96-flat')
+parser.add_argument('--no-screen', action='store_true', help="don't screen for hairpins and 3' dimers")
+args, _ = parser.parse_known_args()
+
+if args.oligos:
+    with open(args.oligos) as f:
+        oligos = [(row['name'], row['sequence'], row['scale'], float(row['concentration_uM']))
+                  for row in csv.DictReader(f)]
+else:
+    oligos = [('forward_primer_sfGFP_pUC19_100uM',
+               'TTGTAAAACGACGGCCAGTGAATTCTCATTTATACAGTTCATCCATTCCATG', '25nm', 100),
+              ('reverse_primer_hindiii_sfGFP_pUC19_100uM',
+               'CTATGACCATGATTACGCCAAGCTTAGGAGGACAGCTATGTCG', '25nm', 100)]
+
+dump_protocol(get_synthesized_oligo_plate_protocol(oligos, cont_type=args.plate_type,
+                                                   screen=not args.no_screen))
@@ -0,0 +1,246 @@
+"""Thermocycle programs as numpy arrays
+
+A ThermocycleProgram keeps its steps in a structured array, one row per step with
+the group it belongs to, its temperature (the bottom of the block for a gradient
+step, top is the other end), duration in seconds and whether the plate is read,
+and the cycles of every group in a second array:
+
+    program = ThermocycleProgram() \\
+        .hold(98, 30) \\
+        .touchdown(74.8, 59.8, [8, 25, 10], stepsize=1) \\
+        .add([(98, 8), ((56, 66), 25), (72, 10)], cycles=20) \\
+        .hold(72, 120)
+    program.validate(plate, ul(25))
+    p.thermocycle(plate, program.groups(), volume=ul(25))
+
+CustomProtocol.thermocycle takes a program directly and validates it.  compress
+merges repeated steps and groups into cycle counts, runtime estimates the
+program's length including the ramps between steps.
+
+autoprotocol has no ramp rate in its groups, the block ramps as fast as it can,
+so ramps only enter through runtime and the HEAT_RATE/COOL_RATE constants.
+
+"""
+
+import numpy as np
+from autoprotocol import Unit
+
+STEP = np.dtype([('group', np.int32), ('temperature', np.float64), ('top', np.float64),
+                 ('duration', np.float64), ('read', np.bool_)])
+
+# thermocycler block limits
+MIN_TEMPERATURE = 4         # celsius
+MAX_TEMPERATURE = 99
+MAX_GRADIENT = 24           # top - bottom, celsius
+HEAT_RATE = 3.0             # celsius per second
+COOL_RATE = 2.0
+START_TEMPERATURE = 25      # where the block is when the plate goes in
+
+
+def _seconds(duration):
+    return float(duration) if isinstance(duration, (int, float)) else \
+        Unit.fromstring(duration).to("second").magnitude
+
+
+def _celsius(temperature):
+    return float(temperature) if isinstance(temperature, (int, float)) else \
+        Unit.fromstring(temperature).to("celsius").magnitude
+
+
+def _temperature_string(celsius):
+    return "{:g}:celsius".format(round(celsius, 6))
+
+
+def _duration_string(seconds):
+    if seconds >= 60 and seconds % 60 == 0:
+        return "{:g}:minute".format(seconds / 60)
+    return "{:g}:second".format(seconds)
+
+
+class ThermocycleProgram(object):
+
+    def __init__(self, steps=None, cycles=None):
+        self.steps = np.zeros(0, dtype=STEP) if steps is None else steps
+        self.cycles = np.zeros(0, dtype=np.int64) if cycles is None else np.asarray(cycles, dtype=np.int64)
+
+    @classmethod
+    def from_groups(cls, groups):
+        """Program from autoprotocol thermocycle groups"""
+        program = cls()
+        for group in groups:
+            steps = []
+            for step in group["steps"]:
+                if "gradient" in step:
+                    temperature = (_celsius(step["gradient"]["bottom"]), _celsius(step["gradient"]["top"]))
+                else:
+                    temperature = _celsius(step["temperature"])
+                steps.append((temperature, _seconds(step["duration"]), step.get("read", False)))
+            program.add(steps, group["cycles"])
+        return program
+
+    def add(self, steps, cycles=1):
+        """
+        Append a group of steps run cycles times
+
+        Parameters
+        ----------
+        steps : list of tuple
+            (temperature, duration) or (temperature, duration, read).  temperature is
+            celsius or a "98:celsius" string, (bottom, top) for a gradient step, duration
+            is seconds or a "30:second" string
+
+        Returns
+        -------
+        self, so programs can be built in one expression
+
+        """
+        rows = np.zeros(len(steps), dtype=STEP)
+        for row, step in zip(rows, steps):
+            temperature, duration = step[0], step[1]
+            bottom, top = temperature if isinstance(temperature, tuple) else (temperature, temperature)
+            row['group'] = len(self.cycles)
+            row['temperature'], row['top'] = _celsius(bottom), _celsius(top)
+            row['duration'] = _seconds(duration)
+            row['read'] = len(step) > 2 and step[2]
+        self.steps = np.concatenate([self.steps, rows])
+        self.cycles = np.r_[self.cycles, int(cycles)]
+        return self
+
+    def hold(self, temperature, duration, read=False):
+        """Append a single step, run once"""
+        return self.add([(temperature, duration, read)])
+
+    def touchdown(self, from_c, to_c, durations, stepsize=2, melt_c=98, ext_c=72, cycles=1):
+        """
+        Append melt, anneal, extend groups with the anneal temperature stepping down
+
+        Anneals from from_c down by stepsize, not including to_c, each for cycles
+        cycles, the same steps as utils.touchdown.
+
+        """
+        anneals = np.arange(from_c, to_c, -stepsize)
+        if not (0 < stepsize < to_c < from_c):
+            raise ValueError("Touchdown needs 0 < stepsize < to_c < from_c")
+        first_group = len(self.cycles)
+        rows = np.zeros(3 * len(anneals), dtype=STEP)
+        rows['group'] = np.repeat(np.arange(first_group, first_group + len(anneals)), 3)
+        rows['temperature'] = np.ravel(np.column_stack([np.full(len(anneals), float(melt_c)), anneals,
+                                                        np.full(len(anneals), float(ext_c))]))
+        rows['top'] = rows['temperature']
+        rows['duration'] = np.tile([_seconds(duration) for duration in durations], len(anneals))
+        self.steps = np.concatenate([self.steps, rows])
+        self.cycles = np.r_[self.cycles, np.full(len(anneals), int(cycles), dtype=np.int64)]
+        return self
+
+    def _group_steps(self):
+        """[(steps of the group without the group column, cycles)]"""
+        bounds = np.searchsorted(self.steps['group'], np.arange(len(self.cycles) + 1))
+        fields = ['temperature', 'top', 'duration', 'read']
+        return [(self.steps[fields][start:end], cycles)
+                for start, end, cycles in zip(bounds[:-1], bounds[1:], self.cycles)]
+
+    def compress(self):
+        """
+        Equivalent program with repeats folded into cycles
+
+        A group that repeats a shorter run of steps becomes that run with more
+        cycles, then consecutive groups with the same steps are merged.
+
+        """
+        groups = []
+        for steps, cycles in self._group_steps():
+            n = len(steps)
+            for period in range(1, n + 1):
+                if n % period == 0 and np.array_equal(np.tile(steps[:period], n // period), steps):
+                    steps, cycles = steps[:period], cycles * (n // period)
+                    break
+            if groups and np.array_equal(groups[-1][0], steps):
+                groups[-1] = (steps, groups[-1][1] + cycles)
+            else:
+                groups.append((steps, cycles))
+
+        compressed = ThermocycleProgram()
+        for steps, cycles in groups:
+            compressed.add([((step['temperature'], step['top']), step['duration'], step['read'])
+                            for step in steps], cycles)
+        return compressed
+
+    def block_temperatures(self):
+        """Mean block temperature of every step (the middle of a gradient)"""
+        return (self.steps['temperature'] + self.steps['top']) / 2
+
+    def runtime(self, heat_rate=HEAT_RATE, cool_rate=COOL_RATE, start=START_TEMPERATURE):
+        """Seconds the program takes: every hold of every cycle, and the ramps between them"""
+        if not len(self.steps):
+            return 0.0
+        def ramp(change):
+            return np.where(change > 0, change / heat_rate, -change / cool_rate)
+
+        temperatures = self.block_temperatures()
+        group = self.steps['group']
+        cycles = self.cycles[group]
+        previous = np.r_[start, temperatures[:-1]]
+        first = np.r_[True, group[1:] != group[:-1]]
+        last = np.searchsorted(group, group, side='right') - 1
+        # a group's first step is reached once from the group before, then from its own last step
+        ramps = np.where(first, ramp(temperatures - previous) + (cycles - 1) * ramp(temperatures - temperatures[last]),
+                         cycles * ramp(temperatures - previous))
+        return float(np.sum(self.steps['duration'] * cycles) + np.sum(ramps))
+
+    def validate(self, container=None, volume=None, dataref=None):
+        """
+        Raise ValueError listing everything the thermocycler can't run
+
+        Temperatures must be in MIN_TEMPERATURE..MAX_TEMPERATURE, gradients at most
+        MAX_GRADIENT wide, durations and cycles positive, read steps need a dataref,
+        and volume has to fit the container's wells.
+
+        """
+        steps, problems = self.steps, []
+        lowest, highest = np.minimum(steps['temperature'], steps['top']), np.maximum(steps['temperature'], steps['top'])
+        for i in np.flatnonzero((lowest < MIN_TEMPERATURE) | (highest > MAX_TEMPERATURE)):
+            problems.append("step {}: {:g}C is outside {}-{}C".format(
+                i, lowest[i] if lowest[i] < MIN_TEMPERATURE else highest[i], MIN_TEMPERATURE, MAX_TEMPERATURE))
+        for i in np.flatnonzero(highest - lowest > MAX_GRADIENT):
+            problems.append("step {}: gradient {:g}-{:g}C is wider than {}C".format(
+                i, lowest[i], highest[i], MAX_GRADIENT))
+        for i in np.flatnonzero(steps['duration'] <= 0):
+            problems.append("step {}: duration must be positive".format(i))
+        for i in np.flatnonzero(self.cycles < 1):
+            problems.append("group {}: cycles must be at least 1".format(i))
+        if steps['read'].any() and not dataref:
+            problems.append("read steps need a dataref")
+        if not len(steps):
+            problems.append("no steps")
+
+        if container is not None:
+            if "thermocycle" not in container.container_type.capabilities:
+                problems.append("{} ({}) can't be thermocycled".format(
+                    container.name, container.container_type.shortname))
+            if volume is not None:
+                capacity = container.container_type.well_volume_ul.to("microliter").magnitude
+                microliters = Unit.fromstring(volume).to("microliter").magnitude \
+                    if isinstance(volume, str) else volume.to("microliter").magnitude
+                if not 0 < microliters <= capacity:
+                    problems.append("volume {:g}uL doesn't fit {} wells of {:g}uL".format(
+                        microliters, container.container_type.shortname, capacity))
+        if problems:
+            raise ValueError("Invalid thermocycle program:\n" + "\n".join(problems))
+
+    def groups(self):
+        """autoprotocol thermocycle groups"""
+        groups = []
+        for steps, cycles in self._group_steps():
+            json_steps = []
+            for step in steps:
+                if step['temperature'] != step['top']:
+                    json_step = {"gradient": {"top": _temperature_string(step['top']),
+                                              "bottom": _temperature_string(step['temperature'])}}
+                else:
+                    json_step = {"temperature": _temperature_string(step['temperature'])}
+                json_step["duration"] = _duration_string(step['duration'])
+                if step['read']:
+                    json_step["read"] = True
+                json_steps.append(json_step)
+            groups.append({"cycles": int(cycles), "steps": json_steps})
+        return groups
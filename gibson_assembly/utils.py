@@ -4,26 +4,19 @@ Derived from Brian Naughton @ http://blog.booleanbiotech.com/genetic_engineering
 
 """
 
-import autoprotocol
-from autoprotocol import Unit
-from autoprotocol.container import Container
-from autoprotocol.protocol import Protocol
-from autoprotocol.protocol import Ref # "Link a ref name (string) to a Container instance."
-import requests
 import logging
 import json
 import sys
-import numpy
-
-#http debugging
-try:
-    import http.client as http_client
-except ImportError:
-    # Python 2
-    import httplib as http_client
-    
+import atexit
+from collections import OrderedDict
+from container_cache import ContainerCache
+from microliters import Microliters
+
+# autoprotocol, requests, http.client and numpy are only imported when first needed
+# and the auth file is only read on the first network call, so importing utils stays cheap
+
 #change this to 2 to show raw http request/responses
-http_client.HTTPConnection.debuglevel = 0
+HTTP_DEBUG_LEVEL = 0
 
 experiment_name = ''
 
@@ -35,32 +28,98 @@ if "--test" in sys.argv:
 else:
     auth_file = '../auth.json'
 
-auth_config = json.load(open(auth_file))
-TSC_HEADERS = {k:v for k,v in auth_config.items() if k in ["X_User_Email","X_User_Token"]}
-
-ORG_NAME = auth_config['org_name']
+# Local cache of container json. --no-cache turns it off, --offline only serves from it,
+# --invalidate-cache drops the containers the protocol changes on exit (pass it when submitting)
+if "--no-cache" in sys.argv:
+    container_cache = None
+else:
+    container_cache = ContainerCache(offline="--offline" in sys.argv)
 
 # Transcriptic-specific dead volumes
 _dead_volume = [("96-pcr",3), ("96-flat",25), ("96-flat-uv",25), ("96-deep",15),
                 ("384-pcr",2), ("384-flat",5), ("384-echo",15),
                 ("micro-1.5",15), ("micro-2.0",15)]
-dead_volume = {k:Unit(v,"microliter") for k,v in _dead_volume}
-
-
-def init_inventory_well(well, headers=TSC_HEADERS, org_name=ORG_NAME):
-    """Initialize well (set volume etc) for Transcriptic"""
-    def _container_url(container_id):
-        return 'https://secure.transcriptic.com/{}/samples/{}.json'.format(org_name, container_id)
 
+def _load_auth_config():
+    with open(auth_file) as f:
+        return json.load(f)
+
+def __getattr__(name):
+    """Settings that need the auth file or autoprotocol are built on first access"""
+    if name == 'auth_config':
+        value = _load_auth_config()
+    elif name == 'TSC_HEADERS':
+        value = {k:v for k,v in _module.auth_config.items() if k in ["X_User_Email","X_User_Token"]}
+    elif name == 'ORG_NAME':
+        value = _module.auth_config['org_name']
+    elif name == 'TSC_API_ROOT':
+        # point "api_root" at a local stand-in server (see stand_in_server.py) to run without Transcriptic
+        value = _module.auth_config.get('api_root', 'https://secure.transcriptic.com')
+    elif name == 'dead_volume':
+        from autoprotocol import Unit
+        value = {k:Unit(v,"microliter") for k,v in _dead_volume}
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
+
+_module = sys.modules[__name__]
+
+
+def _container_url(container_id, org_name=None):
+    return '{}/{}/samples/{}.json'.format(_module.TSC_API_ROOT, org_name or _module.ORG_NAME, container_id)
+
+_session = None
+
+def _get_session(pool_size=10):
+    """Shared keep-alive session so repeated container lookups reuse connections"""
+    global _session
+    if _session is None:
+        import requests
+        import http.client
+        http.client.HTTPConnection.debuglevel = HTTP_DEBUG_LEVEL
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+    return _session
+
+def _fetch_container(container_id, headers=None, org_name=None):
+    """Fetch the sample json for a container from Transcriptic (or the local container cache)"""
+    headers = _module.TSC_HEADERS if headers is None else headers
+    org_name = org_name or _module.ORG_NAME
+    def fetch(extra_headers={}):
+        return _get_session().get(_container_url(container_id, org_name), headers=dict(headers, **extra_headers))
+
+    if container_cache is None:
+        response = fetch()
+        response.raise_for_status()
+        return response.json()
+
+    return container_cache.get(org_name, container_id, fetch)
+
+# wells initialized from the container cache, checked for volume changes on exit with --invalidate-cache
+_initialized_wells = []
+
+def invalidate_changed_containers():
+    """Drop cached containers whose volumes have been changed by the protocol that was generated
+
+    Only run (on exit) with --invalidate-cache: a protocol that is just generated, and never
+    submitted, doesn't change the inventory.
 
-    #only initialize containers that have already been made
-    if not well.container.id:
+    """
+    if container_cache is None:
         return
+    for org_name in set(org_name for org_name, _ in _initialized_wells):
+        container_cache.invalidate_changed_volumes(org_name, [well for org, well in _initialized_wells
+                                                              if org == org_name])
 
-    response = requests.get(_container_url(well.container.id), headers=headers)
-    response.raise_for_status()
+if "--invalidate-cache" in sys.argv:
+    atexit.register(invalidate_changed_containers)
 
-    container = response.json()
+def _init_well_from_container(well, container):
+    """Set name, properties and volume of a well from its container's sample json"""
+    from autoprotocol import Unit
     well_data = list(filter(lambda w: w['well_idx'] == well.index,container['aliquots']))[0]
     well.name = "{}/{}".format(container["label"], well_data['name']) if well_data['name'] is not None else container["label"]
     well.properties = well_data['properties']
@@ -68,25 +127,66 @@ def init_inventory_well(well, headers=TSC_HEADERS, org_name=ORG_NAME):
 
     if 'ERROR' in well.properties:
         raise ValueError("Well {} has ERROR property: {}".format(well, well.properties["ERROR"]))
-    if well.volume < Unit(20, "microliter"):
+    if Microliters.of(well_data['volume_ul']) < Microliters(20):
         logging.warn("Low volume for well {} : {}".format(well.name, well.volume))
 
+def init_inventory_well(well, headers=None, org_name=None):
+    """Initialize well (set volume etc) for Transcriptic"""
+
+    #only initialize containers that have already been made
+    if not well.container.id:
+        return
+
+    org_name = org_name or _module.ORG_NAME
+    _init_well_from_container(well, _fetch_container(well.container.id, headers, org_name))
+    _initialized_wells.append((org_name, well))
+
+    return True
+
+def init_inventory_wells(wells, headers=None, org_name=None, max_workers=8):
+    """Initialize many wells (set volume etc) for Transcriptic in one go
+    
+    Each distinct container is only fetched once and the fetches run concurrently
+    (at most max_workers at a time) over a shared keep-alive session.
+    
+    """
+    #only initialize containers that have already been made
+    wells = [well for well in wells if well.container.id]
+    container_ids = list(OrderedDict.fromkeys(well.container.id for well in wells))
+    if not container_ids:
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    org_name = org_name or _module.ORG_NAME
+    #size the connection pool to the number of workers
+    _get_session(max_workers)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(container_ids))) as executor:
+        containers = dict(zip(container_ids,
+                              executor.map(lambda container_id: _fetch_container(container_id, headers, org_name),
+                                           container_ids)))
+
+    for well in wells:
+        _init_well_from_container(well, containers[well.container.id])
+        _initialized_wells.append((org_name, well))
+
     return True
 
 def touchdown(fromC, toC, durations, stepsize=2, meltC=98, extC=72):
     """Touchdown PCR protocol generator
     
-    Doesn't include the toC as a step.
+    Doesn't include the toC as a step.  Returns autoprotocol groups, see
+    ThermocycleProgram.touchdown to build on a program instead.
     
     """
+    from thermocycle_program import ThermocycleProgram
     assert 0 < stepsize < toC < fromC
-    def td(temp, dur): return {"temperature":"{:2g}:celsius".format(temp), "duration":"{:d}:second".format(dur)}
-
-    return [{"cycles": 1, "steps": [td(meltC, durations[0]), td(C, durations[1]), td(extC, durations[2])]}
-            for C in numpy.arange(fromC, toC, -stepsize)]
+    return ThermocycleProgram().touchdown(fromC, toC, durations, stepsize, meltC, extC).groups()
 
 def convert_ug_to_pmol(ug_dsDNA, num_nts):
-    """Convert ug dsDNA to pmol"""
+    """Convert ug dsDNA to pmol, elementwise (broadcasting) if given arrays"""
+    if hasattr(ug_dsDNA, '__len__') or hasattr(num_nts, '__len__'):
+        import numpy
+        return numpy.asarray(ug_dsDNA, dtype=float) / numpy.asarray(num_nts) * (1e6 / 660.0)
     return float(ug_dsDNA)/num_nts * (1e6 / 660.0)
 
 def expid(val,expt_name=None):
@@ -98,12 +198,19 @@ def expid(val,expt_name=None):
     return "{}_{}".format(expt_name, val)
 
 def ul(microliters):
-    """Unicode function name for creating microliter volumes"""
+    """Unicode function name for creating microliter volumes
+    
+    Returns an autoprotocol Unit, use Microliters for volumes that are only computed
+    with and compared.
+    
+    """
+    from autoprotocol import Unit
     return Unit(microliters,"microliter")
 
 def assert_valid_volume(wells):
     """For wells that we have aspirated volume from, make sure that we haven't requested more volume than could be aspirated
     """
-    assert all([well.volume >= well.container.container_type.dead_volume_ul for well in wells])
+    assert all([Microliters.of(well.volume) >= Microliters.of(well.container.container_type.dead_volume_ul)
+                for well in wells])
     
 
@@ -1,10 +1,17 @@
 """Debugging transformation protocol: Gibson assembly followed by qPCR and a gel
 v2: include v3 Gibson assembly"""
+from collections import OrderedDict
+from custom_protocol import CustomProtocol as Protocol
+import utils
+from utils import ul, expid, init_inventory_wells
+from mastermix import make_mastermix, distribute_mastermix
+from protocol_writer import dump_protocol
 
 p = Protocol()
 options = {}
 
 experiment_name = "debug_sfgfp_puc19_gibson_seq_v2"
+utils.experiment_name = experiment_name
 
 inv = {
     "water"                       : "rs17gmh5wafm5p", # catalog; Autoclaved MilliQ H2O; ambient
@@ -24,13 +31,10 @@ clone_plate2 = p.ref("sfgfp_puc19_gibson_v3_clone", id=inv["sfgfp_puc19_gibson_v
                      cont_type="96-pcr", storage="cold_4", discard=False)
 
 water_tube = p.ref("water", cont_type="micro-1.5", storage="cold_4", discard=True).well(0)
-master_tube = p.ref("master", cont_type="micro-1.5", storage="cold_4", discard=True).well(0)
-primer_tube = p.ref("primer", cont_type="micro-1.5", storage="cold_4", discard=True).well(0)
 
 pcr_plate = p.ref(expid("pcr_plate"), cont_type="96-pcr", storage="cold_4", discard=False)
 
-init_inventory_well(clone_plate1.well("A1"))
-init_inventory_well(clone_plate2.well("A1"))
+init_inventory_wells([clone_plate1.well("A1"), clone_plate2.well("A1")])
 
 seq_wells = ["B2","B4","B6", # clone_plate1
              "D2","D4","D6", # clone_plate2
@@ -43,30 +47,29 @@ assert clone_plate2.well("A1").volume == ul(78), clone_plate2.well("A1").volume
 # --------------------------------------------------------------
 # Provisioning
 #
-p.provision(inv["water"], water_tube, ul(500))
-
-# primers, diluted 2X, discarded at the end
-p.provision(inv["M13_F"], primer_tube, ul(13))
-p.provision(inv["M13_R"], primer_tube, ul(13))
-p.transfer(water_tube, primer_tube, ul(26), mix_after=True, mix_vol=ul(20), repetitions=10)
+p.provision_as_needed(inv["water"], water_tube)
 
 # -------------------------------------------------------------------
-# PCR Master mix -- 10ul SYBR mix, plus 1ul each undiluted primer DNA (100pmol)
-# Also add 15ul of dead volume
+# PCR Master mix -- 10ul SYBR mix, plus 1ul each undiluted primer DNA (100pmol) and 2ul water
+# make_mastermix adds the overage and the tube's dead volume
 #
-p.provision(inv['SensiFAST_SYBR_No-ROX'], master_tube, ul(11+len(seq_wells)*10))
-p.transfer(primer_tube, master_tube, ul(4+len(seq_wells)*4))
-p.mix(master_tube, volume=ul(63), repetitions=10)
-assert master_tube.volume == ul(127) # 15ul dead volume
-
-p.distribute(master_tube, pcr_plate.wells(seq_wells), ul(14), allow_carryover=True)
-p.distribute(water_tube, pcr_plate.wells(seq_wells),
-             [ul(ul) for ul in [5,4,2, 4,2,0, 6,6]],
-             allow_carryover=True)
+recipe = OrderedDict([
+    ('SYBR',    {'source': inv['SensiFAST_SYBR_No-ROX'], 'volume': 10}),
+    ('M13_F',   {'source': inv['M13_F'], 'volume': 1}),
+    ('M13_R',   {'source': inv['M13_R'], 'volume': 1}),
+    ('water',   {'source': inv['water'], 'fill': True}),
+])
+plan, master_tubes = make_mastermix(p, recipe, ul(14), len(seq_wells), name="master")
+distribute_mastermix(p, plan, master_tubes, pcr_plate.wells(seq_wells))
+water_wells = [(well, volume) for well, volume in zip(seq_wells, [5,4,2, 4,2,0, 6,6]) if volume]
+p.transfer(water_tube, pcr_plate.wells([well for well, _ in water_wells]),
+           [ul(volume) for _, volume in water_wells], mix_after=True, mix_vol=ul(10))
 
 # Template -- starting with some small, unknown amount of DNA produced by Gibson
-p.transfer(clone_plate1.well("A1"), pcr_plate.wells(seq_wells[0:3]), [ul(1),ul(2),ul(4)], one_tip=True)
-p.transfer(clone_plate2.well("A1"), pcr_plate.wells(seq_wells[3:6]), [ul(2),ul(4),ul(6)], one_tip=True)
+p.transfer(clone_plate1.well("A1"), pcr_plate.wells(seq_wells[0:3]), [ul(1),ul(2),ul(4)],
+           mix_after=True, mix_vol=ul(10))
+p.transfer(clone_plate2.well("A1"), pcr_plate.wells(seq_wells[3:6]), [ul(2),ul(4),ul(6)],
+           mix_after=True, mix_vol=ul(10))
 
 assert all(pcr_plate.well(w).volume == ul(20) for w in seq_wells)
 assert clone_plate1.well("A1").volume == ul(11)
@@ -97,15 +100,12 @@ p.gel_separate(pcr_plate.wells(seq_wells), ul(20), "agarose(8,0.8%)", "ladder1",
 
 # This appears to be a bug in Transcriptic. The actual volume should be 11ul
 # but it is not updating after running a gel with 20ul.
-# Primer tube should be equal to dead volume, or it's a waste
 assert all(pcr_plate.well(w).volume==ul(31) for w in seq_wells)
-assert primer_tube.volume == ul(16) == dead_volume['micro-1.5'] + ul(1)
-assert water_tube.volume > ul(25)
 
 # ---------------------------------------------------------------
 # Sanger sequencing, TURNED OFF
 # Sequence to make sure assembly worked
-# 500ng plasmid, 1 ul of a 10 M stock primer
+# 500ng plasmid, 1 ul of a 10 uM stock primer
 # "M13_F"       : "rs17tcpqwqcaxe", # catalog; M13 Forward (-41); cold_20 (1ul = 100pmol)
 # "M13_R"       : "rs17tcph6e2qzh", # catalog; M13 Reverse (-48); cold_20 (1ul = 100pmol)
 #
@@ -127,5 +127,4 @@ def do_sanger_seq(p,pcr_plate):
 # ---------------------------------------------------------------
 # Test and run protocol
 #
-jprotocol = json.dumps(p.as_dict(), indent=2)
-print(jprotocol)
\ No newline at end of file
+dump_protocol(p)
\ No newline at end of file
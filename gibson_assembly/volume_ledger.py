@@ -0,0 +1,172 @@
+"""Whole-protocol volume validation
+
+The instruction list is turned into a ledger of volume changes, one row per aspirate,
+dispense or mix, and replayed with numpy: a cumulative sum per well gives the
+volume of every well after every step, and every aspiration is checked against
+the dead volume of its container in one pass.
+
+Starting volumes don't have to be given.  autoprotocol keeps well.volume up to
+date for provision, transfer, distribute and consolidate, so a well's starting
+volume is its final volume minus what those did to it.  Wells whose volume was
+never set can't be checked.
+
+"""
+
+import numpy as np
+import utils
+from microliters import Microliters
+
+# ops whose volume changes autoprotocol does not apply to well.volume
+_UNTRACKED = {"spread", "gel_separate"}
+
+
+def _nl(volume):
+    return float(Microliters.of(volume).nl)
+
+
+def ledger_events(instructions):
+    """One (instruction index, well, change nl, required nl) row per aspirate, dispense or mix
+
+    required is what the well must still hold afterwards: its dead volume for an
+    aspiration, the mix volume for a mix, nan for a dispense.
+
+    """
+    events = []
+    def aspirate(i, well, volume):
+        events.append((i, well, -_nl(volume), _nl(dead_volume(well.container))))
+    def dispense(i, well, volume):
+        events.append((i, well, _nl(volume), np.nan))
+    def mix(i, well, options):
+        if options:
+            events.append((i, well, 0.0, _nl(options["volume"])))
+
+    for i, instruction in enumerate(instructions):
+        data = instruction.data
+        if data["op"] == "provision":
+            for to in data["to"]:
+                dispense(i, to["well"], to["volume"])
+        elif data["op"] == "spread":
+            aspirate(i, data["from"], data["volume"])
+            dispense(i, data["to"], data["volume"])
+        elif data["op"] == "gel_separate":
+            for well in data["objects"]:
+                aspirate(i, well, data["volume"])
+        elif data["op"] == "pipette":
+            for group in data["groups"]:
+                for xfer in group.get("transfer", []):
+                    mix(i, xfer["from"], xfer.get("mix_before"))
+                    aspirate(i, xfer["from"], xfer["volume"])
+                    dispense(i, xfer["to"], xfer["volume"])
+                    mix(i, xfer["to"], xfer.get("mix_after"))
+                if "distribute" in group:
+                    distribute = group["distribute"]
+                    mix(i, distribute["from"], distribute.get("mix_before"))
+                    for to in distribute["to"]:
+                        aspirate(i, distribute["from"], to["volume"])
+                        dispense(i, to["well"], to["volume"])
+                if "consolidate" in group:
+                    consolidate = group["consolidate"]
+                    for source in consolidate["from"]:
+                        aspirate(i, source["well"], source["volume"])
+                        dispense(i, consolidate["to"], source["volume"])
+                    mix(i, consolidate["to"], consolidate.get("mix_after"))
+                for options in group.get("mix", []):
+                    mix(i, options["well"], options)
+    return events
+
+
+def dead_volume(container):
+    """Transcriptic's dead volume for the container type, autoprotocol's if it isn't listed"""
+    volume = utils.dead_volume.get(container.container_type.shortname)
+    return volume if volume is not None else container.container_type.dead_volume_ul
+
+
+def replay(instructions, initial_volumes=None, events=None):
+    """
+    Volume of every well after every row of the ledger
+
+    Parameters
+    ----------
+    instructions : list of Instruction
+    initial_volumes : dict, optional
+        well -> volume before the protocol, derived from the wells' final volumes
+        for wells not in it
+    events : list, optional
+        ledger_events(instructions), if already built
+
+    Returns
+    -------
+    dict
+        "wells" (list, wells by key), and per row grouped by well in instruction order:
+        "keys", "instruction" index, "op", "delta", "volume" after the row and
+        "required" (nl, nan where nothing is required)
+
+    """
+    events = ledger_events(instructions) if events is None else events
+    initial_volumes = initial_volumes or {}
+
+    wells = {}
+    for _, well, _, _ in events:
+        wells.setdefault(well, len(wells))
+    index = np.array([i for i, _, _, _ in events], dtype=int)
+    keys = np.array([wells[well] for _, well, _, _ in events], dtype=int)
+    deltas = np.array([delta for _, _, delta, _ in events], dtype=float)
+    required = np.array([req for _, _, _, req in events], dtype=float)
+    ops = np.array([instructions[i].op for i in index], dtype=object)
+    tracked = ~np.isin(ops, list(_UNTRACKED))
+
+    # starting volume: given, or final minus what autoprotocol added and took away (nan if unknown)
+    net = np.bincount(keys, weights=deltas * tracked, minlength=len(wells))
+    initial = np.array([_nl(initial_volumes[well]) if well in initial_volumes
+                        else _nl(well.volume) - net[k] if well.volume is not None
+                        else np.nan for well, k in wells.items()], dtype=float)
+
+    # group rows by well, keeping their order within a well, and sum within each group
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_deltas = deltas[order]
+    cumulative = np.cumsum(sorted_deltas)
+    group_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if len(order) else np.zeros(0, bool)
+    first = np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))
+    volume_after = initial[sorted_keys] + cumulative - cumulative[first] + sorted_deltas[first]
+
+    return {"wells": list(wells), "keys": sorted_keys, "instruction": index[order], "op": ops[order],
+            "delta": sorted_deltas, "volume": volume_after, "required": required[order]}
+
+
+def check_volumes(instructions, initial_volumes=None):
+    """
+    Replay the instructions and find the first step each well runs short at
+
+    Parameters
+    ----------
+    instructions : list of Instruction
+    initial_volumes : dict, optional
+        well -> volume before the protocol, derived from the wells' final volumes
+        for wells not in it
+
+    Returns
+    -------
+    violations : list of dict
+        one per well in instruction order, each with the "well", the "instruction"
+        index, its "op", the "volume" left (Microliters) and the "required" volume
+
+    """
+    ledger = replay(instructions, initial_volumes)
+    with np.errstate(invalid='ignore'):
+        short = ledger["volume"] < ledger["required"]
+    _, first_short = np.unique(ledger["keys"][short], return_index=True)
+    rows = np.flatnonzero(short)[first_short]
+
+    violations = [{"well": ledger["wells"][ledger["keys"][row]],
+                   "instruction": int(ledger["instruction"][row]),
+                   "op": ledger["op"][row],
+                   "volume": Microliters.from_nl(int(round(ledger["volume"][row]))),
+                   "required": Microliters.from_nl(int(round(ledger["required"][row])))} for row in rows]
+    return sorted(violations, key=lambda violation: violation["instruction"])
+
+
+def format_violations(violations):
+    return "\n".join("instruction {} ({}): {} {} has {}, needs {}".format(
+        v["instruction"], v["op"], v["well"].container.name, v["well"].humanize(),
+        v["volume"], v["required"]) for v in violations)